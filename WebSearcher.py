@@ -6,6 +6,8 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 import config
+from metering import usage_meter
+from tracing import traced
 import logging
 import requests
 import random
@@ -17,7 +19,7 @@ logging.basicConfig(filename="main.log", level=logging.INFO)
 
 openai = OpenAI(
     api_key=config.DEEPINFRA_API_TOKEN,
-    base_url="https://api.deepinfra.com/v1/openai",
+    base_url=config.DEEPINFRA_OPENAI_URL,
 )
 
 class Websearch:
@@ -25,9 +27,10 @@ class Websearch:
     _ua = UserAgent()
     
     @staticmethod
-    def generate_search_query(question: str) -> str:
+    def generate_search_query(question: str, tags: dict = None) -> str:
         """
         Uses OpenAI API to generate a concise search query from a verbose question.
+        tags (org, bot_key) are used to meter the token usage.
         """
         try:
             today = datetime.now().isoformat()
@@ -53,6 +56,8 @@ class Websearch:
                 max_tokens=50
             )
 
+            if response.usage is not None:
+                usage_meter.record_tags(tags, "chat", chat_tokens=response.usage.total_tokens)
             return response.choices[0].message.content.strip()
 
         except Exception as e:
@@ -60,12 +65,13 @@ class Websearch:
             return ""
 
     @staticmethod
-    def search_web(query, limit=10, max_tokens=80000) -> dict:
+    @traced("websearch.search_web", record=("limit",))
+    def search_web(query, limit=10, max_tokens=80000, tags: dict = None) -> dict:
         """
         Search the web and return summarized content fitting within the context limit.
         """
         try:
-            formatted_query = Websearch.generate_search_query(query)
+            formatted_query = Websearch.generate_search_query(query, tags=tags)
             log.info(f"Formatted query: {formatted_query}")
             print(formatted_query)
             headers = {
@@ -74,7 +80,7 @@ class Websearch:
             }
 
             response = requests.get(
-                "https://api.search.brave.com/res/v1/web/search",
+                config.BRAVE_SEARCH_URL,
                 params={"q": formatted_query, "count": limit},
                 headers=headers
             )
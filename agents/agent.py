@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 from memory import Memory
 from utility import pretty_print
 from schemas import executorResult
+from tracing import span, run_with_context
 
 random.seed(time.time())
 
@@ -51,6 +52,7 @@ class Agent():
         self.orgn = ""
         self.uid = ""
         self.bot_key = ""
+        self.context_window_turns = None # opt-in number of past turns sent to the LLM, None sends the whole memory
         self.executor = ThreadPoolExecutor(max_workers=1)
     
     @property
@@ -97,6 +99,10 @@ class Agent():
         self.uid = uid
         return
 
+    def usage_tags(self) -> dict:
+        """Tags of the LLM calls of this agent, used for token usage metering."""
+        return {"org": self.orgn, "bot_key": self.bot_key, "agent": self.type}
+
     def add_tool(self, name: str, tool: Callable) -> None:
         if tool is not Callable:
             raise TypeError("Tool must be a callable object (a method)")
@@ -165,20 +171,29 @@ class Agent():
         end_idx = text.rfind(end_tag)+8
         return text[start_idx:end_idx]
     
-    async def llm_request(self) -> Tuple[str, str]:
+    async def llm_request(self, messages: list = None) -> Tuple[str, str]:
         """
         Asynchronously ask the LLM to process the prompt.
+        Args:
+            messages (list, optional): Messages to send instead of the agent memory.
         """
         self.status_message = "Thinking..."
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, self.sync_llm_request)
+        return await loop.run_in_executor(self.executor, run_with_context(self.sync_llm_request, messages))
     
-    def sync_llm_request(self) -> Tuple[str, str]:
+    def sync_llm_request(self, messages: list = None) -> Tuple[str, str]:
         """
         Ask the LLM to process the prompt and return the answer and the reasoning.
+        Args:
+            messages (list, optional): Messages to send instead of the agent memory, the answer is still pushed to memory.
         """
-        memory = self.memory.get()
-        thought = self.llm.respond(memory, self.verbose)
+        if messages is not None:
+            memory = messages
+        elif self.context_window_turns is not None:
+            memory = self.memory.get_window(self.context_window_turns)
+        else:
+            memory = self.memory.get()
+        thought = self.llm.respond(memory, self.verbose, tags=self.usage_tags())
 
         reasoning = self.extract_reasoning_text(thought)
         answer = self.remove_reasoning_text(thought)
@@ -279,7 +294,8 @@ class Agent():
                 pretty_print(f"Executing {len(blocks)} {name} blocks...", color="status")
                 for block in blocks:
                     self.show_block(block)
-                    output = await asyncio.to_thread(tool.execute, [block])
+                    with span("tool.execute", tool=name, agent=self.type):
+                        output = await asyncio.to_thread(tool.execute, [block])
                     feedback = tool.interpreter_feedback(output) # tool interpreter feedback
                     success = not tool.execution_failure_check(output)
                     self.blocks_result.append(executorResult(block, feedback, success, name))
@@ -10,7 +10,9 @@ from agents.agent import Agent
 from tools.braveSearch import braveSearch
 from browser import Browser
 from logger import Logger
+from tracing import span
 from memory import Memory
+from passage_ranker import PassageRanker
 
 class Action(Enum):
     REQUEST_EXIT = "REQUEST_EXIT"
@@ -19,6 +21,82 @@ class Action(Enum):
     NAVIGATE = "NAVIGATE"
     SEARCH = "SEARCH"
     
+class NavigationState():
+    """
+    Compact working memory of a web navigation run.
+    Each navigation prompt is rebuilt from this state instead of the conversation history,
+    notes and links are bounded so the prompt size does not grow with the number of visited pages.
+    """
+    def __init__(self, goal: str, max_notes_chars: int = 4096, max_links: int = 30):
+        """
+        Args:
+            goal (str): The user request the navigation is trying to satisfy.
+            max_notes_chars (int): Character budget for the notes in the navigation prompt.
+            max_links (int): Maximum number of candidate links shown in the navigation prompt.
+        """
+        self.goal = goal
+        self.max_notes_chars = max_notes_chars
+        self.max_links = max_links
+        self.visited = []
+        self.visited_set = set()
+        self.notes = []
+        self.candidate_links = []
+
+    def visit(self, link: str | None) -> None:
+        """Mark a link as visited."""
+        if link in self.visited_set:
+            return
+        self.visited.append(link)
+        self.visited_set.add(link)
+
+    def is_visited(self, link: str | None) -> bool:
+        return link in self.visited_set
+
+    def add_note(self, note: str) -> None:
+        """Add a note, empty and repeated notes are ignored."""
+        note = note.strip()
+        if not note or note in self.notes:
+            return
+        self.notes.append(note)
+
+    def set_candidates(self, links: List[str]) -> None:
+        """Set the links available from the current page, without duplicates."""
+        self.candidate_links = list(dict.fromkeys(links))
+
+    def unvisited_candidates(self) -> List[str]:
+        return [link for link in self.candidate_links if link not in self.visited_set][:self.max_links]
+
+    def links_prompt(self) -> str:
+        links = self.unvisited_candidates()
+        if not links:
+            return "No links remaining, do a new search."
+        return "\n".join([f"[{i}] {link}" for i, link in enumerate(links)])
+
+    def notes_prompt(self) -> str:
+        """
+        Notes within the character budget.
+        Most recent notes are kept whole, older notes are shortened to their first sentence then dropped.
+        """
+        kept = []
+        budget = self.max_notes_chars
+        for i, note in enumerate(reversed(self.notes)):
+            text = note if i < 3 else note.split('. ')[0]
+            if len(text) > budget:
+                omitted = len(self.notes) - len(kept)
+                kept.append(f"({omitted} earlier notes omitted)")
+                break
+            kept.append(text)
+            budget -= len(text)
+        return '\n'.join(reversed(kept))
+
+    def to_dict(self) -> dict:
+        return {
+            "goal": self.goal,
+            "visited": self.visited,
+            "notes": self.notes,
+            "candidate_links": self.candidate_links
+        }
+
 class BrowserAgent(Agent):
     def __init__(self, name, prompt_path, provider, cid, verbose=False, browser=None):
         """
@@ -32,10 +110,11 @@ class BrowserAgent(Agent):
         self.type = "browser_agent"
         self.browser = browser
         self.current_page = ""
-        self.search_history = []
-        self.navigable_links = []
+        self.state = NavigationState("")
+        self.checkpoint_every = 5 # navigation steps between memory saves to MongoDB
+        self.ranker = PassageRanker()
+        self.page_token_budget = 2048 # page text tokens sent to the LLM per navigation step
         self.last_action = Action.NAVIGATE.value
-        self.notes = []
         self.date = self.get_today_date()
         self.logger = Logger("browser_agent.log")
         self.memory = Memory(self.load_prompt(prompt_path),
@@ -74,8 +153,8 @@ class BrowserAgent(Agent):
                 links_clean.append(link)
         return links_clean
 
-    def get_unvisited_links(self) -> List[str]:
-        return "\n".join([f"[{i}] {link}" for i, link in enumerate(self.navigable_links) if link not in self.search_history])
+    def get_unvisited_links(self) -> str:
+        return self.state.links_prompt()
 
     def make_newsearch_prompt(self, prompt: str, search_result: dict) -> str:
         search_choice = self.stringify_search_results(search_result)
@@ -90,11 +169,10 @@ class BrowserAgent(Agent):
         """
     
     def make_navigation_prompt(self, user_prompt: str, page_text: str) -> str:
-        remaining_links = self.get_unvisited_links() 
-        remaining_links_text = remaining_links if remaining_links is not None else "No links remaining, do a new search." 
+        remaining_links_text = self.get_unvisited_links()
         inputs_form = self.browser.get_form_inputs()
         inputs_form_text = '\n'.join(inputs_form)
-        notes = '\n'.join(self.notes)
+        notes = self.state.notes_prompt()
         self.logger.info(f"Making navigation prompt with page text: {page_text[:100]}...\nremaining links: {remaining_links_text}")
         self.logger.info(f"Inputs form: {inputs_form_text}")
         self.logger.info(f"Notes: {notes}")
@@ -190,7 +268,7 @@ class BrowserAgent(Agent):
     def select_unvisited(self, search_result: List[str]) -> List[str]:
         results_unvisited = []
         for res in search_result:
-            if res["link"] not in self.search_history:
+            if not self.state.is_visited(res["link"]):
                 results_unvisited.append(res) 
         self.logger.info(f"Unvisited links: {results_unvisited}")
         return results_unvisited
@@ -231,16 +309,16 @@ class BrowserAgent(Agent):
                 buffer.append(line.replace("notes:", ''))
             else:
                 links.extend(self.extract_links(line))
-        self.notes.append('. '.join(buffer).strip())
+        self.state.add_note('. '.join(buffer))
         return links
     
     def select_link(self, links: List[str]) -> str | None:
         """
         Select the first unvisited link that is not the current page.
-        Preference is given to links not in search_history.
+        Preference is given to links not yet visited.
         """
         for lk in links:
-            if lk == self.current_page or lk in self.search_history:
+            if lk == self.current_page or self.state.is_visited(lk):
                 self.logger.info(f"Skipping already visited or current link: {lk}")
                 continue
             self.logger.info(f"Selected link: {lk}")
@@ -248,16 +326,27 @@ class BrowserAgent(Agent):
         self.logger.warning("No suitable link selected.")
         return None
     
-    def get_page_text(self, limit_to_model_ctx = False) -> str:
-        """Get the text content of the current page."""
+    def get_page_text(self, limit_to_model_ctx = False, query: str = None) -> str:
+        """
+        Get the text content of the current page.
+        Args:
+            limit_to_model_ctx (bool): Truncate the text to the model context size.
+            query (str, optional): Keep only the passages most relevant to the query, within page_token_budget.
+        """
         page_text = self.browser.get_text()
+        if page_text is None:
+            return ""
+        if query:
+            body = page_text.replace("[Start of page]", "").replace("[End of page]", "").strip()
+            body = self.ranker.select(query, body, self.page_token_budget)
+            page_text = f"[Start of page]\n\n{body}\n\n[End of page]"
         if limit_to_model_ctx:
             #page_text = self.memory.compress_text_to_max_ctx(page_text)
             page_text = self.memory.trim_text_to_max_ctx(page_text)
         return page_text
     
     def conclude_prompt(self, user_query: str) -> str:
-        annotated_notes = [f"{i+1}: {note.lower()}" for i, note in enumerate(self.notes)]
+        annotated_notes = [f"{i+1}: {note.lower()}" for i, note in enumerate(self.state.notes)]
         search_note = '\n'.join(annotated_notes)
         pretty_print(f"AI notes:\n{search_note}", color="success")
         return f"""
@@ -333,13 +422,31 @@ class BrowserAgent(Agent):
         Process the user prompt to conduct an autonomous web search.
         Start with a google search with searxng using web_search tool.
         Then enter a navigation logic to find the answer or conduct required actions.
+        The memory is only saved to MongoDB at checkpoints during navigation.
         Args:
           user_prompt: The user's input query
           speech_module: Optional speech output module
         Returns:
             tuple containing the final answer and reasoning
         """
+        self.state = NavigationState(user_prompt)
+        self.memory.autosave = False
+        try:
+            return await self.navigate(user_prompt, speech_module)
+        finally:
+            self.memory.autosave = True
+            self.save_checkpoint()
+
+    def save_checkpoint(self) -> None:
+        """Save the memory to MongoDB together with the navigation state."""
+        self.memory.save_memory(extra={"navigation_state": self.state.to_dict()})
+
+    async def navigate(self, user_prompt: str, speech_module: type) -> Tuple[str, str]:
+        """
+        Search and navigation loop, each step prompt is built from the navigation state.
+        """
         complete = False
+        step = 0
 
         animate_thinking(f"Thinking...", color="status")
         mem_begin_idx = self.memory.push('user', self.search_prompt(user_prompt))
@@ -349,15 +456,21 @@ class BrowserAgent(Agent):
             return ai_prompt, "" 
         animate_thinking(f"Searching...", color="status")
         self.status_message = "Searching..."
-        search_result_raw = self.tools["web_search"].execute([ai_prompt], False)
+        with span("tool.execute", tool="web_search", agent=self.type):
+            search_result_raw = self.tools["web_search"].execute([ai_prompt], False)
         search_result = self.jsonify_search_results(search_result_raw)[:16]
         self.show_search_results(search_result)
         prompt = self.make_newsearch_prompt(user_prompt, search_result)
         unvisited = [None]
         while not complete and len(unvisited) > 0 and not self.stop:
+            step += 1
             self.memory.clear()
             unvisited = self.select_unvisited(search_result)
+            self.browser.prefetch([res["link"] for res in unvisited if res.get("link")])
             answer, reasoning = await self.llm_decide(prompt, show_reasoning = False)
+            if step % self.checkpoint_every == 0:
+                # the memory only holds this step, the navigation state holds the run so far
+                self.save_checkpoint()
             if self.stop:
                 pretty_print(f"Requested stop.", color="failure")
                 break
@@ -372,14 +485,14 @@ class BrowserAgent(Agent):
                 self.status_message = "Filling web form..."
                 pretty_print(f"Filling inputs form...", color="status")
                 fill_success = self.browser.fill_form(extracted_form)
-                page_text = self.get_page_text(limit_to_model_ctx=True)
+                page_text = self.get_page_text(limit_to_model_ctx=True, query=user_prompt)
                 answer = self.handle_update_prompt(user_prompt, page_text, fill_success)
                 answer, reasoning = await self.llm_decide(prompt)
 
             if Action.FORM_FILLED.value in answer:
                 pretty_print(f"Filled form. Handling page update.", color="status")
-                page_text = self.get_page_text(limit_to_model_ctx=True)
-                self.navigable_links = self.browser.get_navigable()
+                page_text = self.get_page_text(limit_to_model_ctx=True, query=user_prompt)
+                self.state.set_candidates(self.browser.get_navigable())
                 prompt = self.make_navigation_prompt(user_prompt, page_text)
                 continue
 
@@ -388,7 +501,7 @@ class BrowserAgent(Agent):
             if link == self.current_page:
                 pretty_print(f"Already visited {link}. Search callback.", color="status")
                 prompt = self.make_newsearch_prompt(user_prompt, unvisited)
-                self.search_history.append(link)
+                self.state.visit(link)
                 continue
 
             if Action.REQUEST_EXIT.value in answer:
@@ -397,32 +510,33 @@ class BrowserAgent(Agent):
                 complete = True
                 break
 
-            if (link == None and len(extracted_form) < 3) or Action.GO_BACK.value in answer or link in self.search_history:
+            if (link == None and len(extracted_form) < 3) or Action.GO_BACK.value in answer or self.state.is_visited(link):
                 pretty_print(f"Going back to results. Still {len(unvisited)}", color="status")
                 self.status_message = "Going back to search results..."
                 request_prompt = user_prompt
                 if link is None:
                     request_prompt += f"\nYou previously choosen:\n{self.last_answer} but the website is unavailable. Consider other options."
                 prompt = self.make_newsearch_prompt(request_prompt, unvisited)
-                self.search_history.append(link)
+                self.state.visit(link)
                 self.current_page = link
                 continue
 
             animate_thinking(f"Navigating to {link}", color="status")
             if speech_module: speech_module.speak(f"Navigating to {link}")
             nav_ok = self.browser.go_to(link)
-            self.search_history.append(link)
+            self.state.visit(link)
             if not nav_ok:
                 pretty_print(f"Failed to navigate to {link}.", color="failure")
                 prompt = self.make_newsearch_prompt(user_prompt, unvisited)
                 continue
             self.current_page = link
-            page_text = self.get_page_text(limit_to_model_ctx=True)
-            self.navigable_links = self.browser.get_navigable()
+            page_text = self.get_page_text(limit_to_model_ctx=True, query=user_prompt)
+            self.state.set_candidates(self.browser.get_navigable())
             prompt = self.make_navigation_prompt(user_prompt, page_text)
             self.status_message = "Navigating..."
             self.browser.screenshot()
 
+        self.browser.close_prefetched()
         pretty_print("Exited navigation, starting to summarize finding...", color="status")
         prompt = self.conclude_prompt(user_prompt)
         mem_last_idx = self.memory.push('user', prompt)
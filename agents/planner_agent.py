@@ -35,6 +35,7 @@ class PlannerAgent(Agent):
                                 cid=cid,
                                 model_provider=provider.get_model_name())
         self.logger = Logger("planner_agent.log")
+        self.plan_progress = None # goal, tasks, results and step of the current plan, exported with the session state
     
     def get_task_names(self, text: str) -> List[str]:
         """
@@ -231,6 +232,8 @@ class PlannerAgent(Agent):
         agent_prompt = self.make_prompt(task['task'], required_infos)
         pretty_print(f"Agent {task['agent']} started working...", color="status")
         self.logger.info(f"Agent {task['agent']} started working on {task['task']}.")
+        self.agents[task['agent'].lower()].set_org(self.orgn, self.uid)
+        self.agents[task['agent'].lower()].bot_key = self.bot_key
         answer, reasoning = await self.agents[task['agent'].lower()].process(agent_prompt, None)
         self.last_answer = answer
         self.last_reasoning = reasoning
@@ -264,12 +267,21 @@ class PlannerAgent(Agent):
         required_infos = None
         agents_work_result = dict()
 
-        self.status_message = "Making a plan..."
-        agents_tasks = await self.make_plan(goal)
+        progress = self.plan_progress
+        if progress and progress.get("goal") == goal and progress.get("step", 0) < len(progress.get("tasks") or []):
+            # the plan of this goal was interrupted, possibly on another worker (restored with the session state)
+            agents_tasks = [tuple(task) for task in progress["tasks"]]
+            agents_work_result = dict(progress["results"])
+            i = progress["step"]
+            pretty_print(f"Resuming the plan at task {i + 1}/{len(agents_tasks)}.", color="info")
+        else:
+            self.status_message = "Making a plan..."
+            agents_tasks = await self.make_plan(goal)
+            self.plan_progress = {"goal": goal, "tasks": agents_tasks, "results": agents_work_result, "step": 0}
+            i = 0
 
         if agents_tasks == []:
             return "Failed to parse the tasks.", ""
-        i = 0
         steps = len(agents_tasks)
         while i < steps and not self.stop:
             task_name, task = agents_tasks[i][0], agents_tasks[i][1]
@@ -291,5 +303,6 @@ class PlannerAgent(Agent):
             agents_tasks = await self.update_plan(goal, agents_tasks, agents_work_result, task['id'], success)
             steps = len(agents_tasks)
             i += 1
+            self.plan_progress = {"goal": goal, "tasks": agents_tasks, "results": agents_work_result, "step": i}
 
         return answer, ""
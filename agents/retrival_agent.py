@@ -2,6 +2,8 @@ import asyncio
 from memory import Memory
 from agents.agent import Agent
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import execute
 from utility import animate_thinking
 from concurrent.futures import ThreadPoolExecutor
 from langchain_community.vectorstores import Cassandra
@@ -12,8 +14,11 @@ from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy import func, String
 from sqlalchemy import select, exists, literal_column
 from WebSearcher import Websearch
+from metering import usage_meter
+from semantic_cache import SemanticCache
+from tracing import traced
 
-import config, logging, cassio
+import config, logging, cassio, configparser, hashlib
 
 log =  logging.getLogger(__name__)
 logging.basicConfig(filename="main.log",level=logging.INFO)
@@ -24,6 +29,31 @@ embeddings = DeepInfraEmbeddings(
     deepinfra_api_token=config.DEEPINFRA_API_TOKEN,
 )
 
+settings = configparser.ConfigParser()
+settings.read('config.ini')
+
+# answers per bot, namespaced by bot_key and knowledge base version, shared by every session
+response_cache = SemanticCache(
+    "response",
+    max_entries=settings.getint('RETRIEVAL', 'cache_size', fallback=4096),
+    ttl=settings.getfloat('RETRIEVAL', 'cache_ttl', fallback=86400),
+    similarity_threshold=settings.getfloat('RETRIEVAL', 'cache_similarity', fallback=0.95)
+)
+kb_versions = {} # bot_key -> last seen knowledge base version
+history_turns = settings.getint('RETRIEVAL', 'history_turns', fallback=4)
+
+def kb_version(api: CreatingBot, data: list) -> str:
+    """Hash of the bot prompt and of its knowledge base rows, changes when a document is added, updated or removed."""
+    digest = hashlib.sha256(f"{api.prompt}\n{api.training_files}".encode("utf-8"))
+    for kb in sorted(data, key=lambda kb: kb.id):
+        digest.update(f"\n{kb.id}|{kb.file_name}|{kb.last_modified}|{kb.status}|{kb.kb_id}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def invalidate_bot(bot_key: str) -> int:
+    """Drop the cached answers of a bot, e.g. after its knowledge base changed."""
+    kb_versions.pop(bot_key, None)
+    return response_cache.invalidate(f"{bot_key}:", prefix=True)
+
 class ReterivalAgent(Agent):
     def __init__(self, name, prompt_path, provider, cid, verbose=False):
         """
@@ -39,8 +69,12 @@ class ReterivalAgent(Agent):
                                 cid=cid,
                                 model_provider=provider.get_model_name())
         
-    async def retrive_knowledge(self, table_names: list[str], query, top_k:int = 10) -> str:
+    @traced("retrieval.retrive_knowledge", record=("table_names", "top_k"))
+    async def retrive_knowledge(self, table_names: list[str], query, top_k:int = 10, query_embedding: list = None) -> str:
         try:
+            if query_embedding is None:
+                query_embedding = await embeddings.aembed_query(query)
+            query_embedding = [float(x) for x in query_embedding]
             async def run_task(table_name):
                 print(f"Searching Vector: {table_name}")
                 astra_vector_store = Cassandra(
@@ -50,12 +84,14 @@ class ReterivalAgent(Agent):
                     keyspace="default_keyspace",
                 )
                 # Perform the retrieval by row ID
-                result = await astra_vector_store.asimilarity_search(query=query, k=top_k)
+                result = await astra_vector_store.asimilarity_search_by_vector(embedding=query_embedding, k=top_k)
                 print(f"Result Len: {len(result)}")
                 return result
 
         # Execute tasks concurrently using ThreadPoolExecutor
             query_text = ""
+            # the query is embedded once for every table, the embeddings API does not report usage
+            usage_meter.record_tags(self.usage_tags(), "knowledge_base", embed_tokens=len(query) // 4)
             tasks = [run_task(table_name) for table_name in table_names]
             results = await asyncio.gather(*tasks)
             all_docs=[]
@@ -74,26 +110,43 @@ class ReterivalAgent(Agent):
             log.error(f"Error getting chunk from {table_names}: {str(e)}")
             return None
     
-    async def process(self, prompt: str, bot_key: str = None, db: Session | None = None) -> str:
+    async def process(self, prompt: str, bot_key: str = None, db: AsyncSession | Session | None = None) -> str:
         if not bot_key and not db:
             raise "Need DB And Bot key to start retrival"
         myKbs = []
-        api = db.query(CreatingBot).filter(CreatingBot.apikey == bot_key).first()
+        api = (await execute(db, select(CreatingBot).where(CreatingBot.apikey == bot_key))).scalars().first()
 
         if api.training_files:
             myKbs = api.training_files.split(",")
         context = ""
         print(myKbs)
+        data = []
+        if myKbs:
+            myKbIds = [int(i) for i in myKbs]
+            print(f"Entering Kb, {myKbIds}")
+            data = (await execute(db, select(KnowledgeBase).where(KnowledgeBase.id.in_(myKbIds)))).scalars().all()
+            print(len(data))
+        cache_namespace, query_embedding = None, None
+        if self.is_cacheable(api):
+            cache_namespace = f"{bot_key}:{kb_version(api, data)}"
+            if kb_versions.get(bot_key) not in (None, cache_namespace):
+                invalidate_bot(bot_key)
+            kb_versions[bot_key] = cache_namespace
+            cached, query_embedding = await asyncio.to_thread(response_cache.lookup, prompt, cache_namespace, embed=lambda: embeddings.embed_query(prompt))
+            if cached is not None:
+                log.info(f"Response cache hit for bot {bot_key}: {prompt}")
+                answer, reasoning = cached
+                self.memory.push('user', prompt, query=prompt)
+                self.memory.push('assistant', answer)
+                self.last_answer = answer
+                self.status_message = "Ready"
+                return answer, reasoning
         result_text = ""
         if api.default_websearch:
             web = Websearch()
-            search = web.search_web(prompt)
+            search = await asyncio.to_thread(web.search_web, prompt, tags=self.usage_tags())
             result_text = search.get("result")
         if myKbs:
-            myKbIds = [int(i) for i in myKbs]
-            print(f"Entering Kb, {myKbIds}")
-            data = db.query(KnowledgeBase).filter(KnowledgeBase.id.in_(myKbIds)).all()
-            print(len(data))
             doc_names = [d.file_name for d in data if d.file_name is not None]
             print(doc_names)
             K = KBIndexIDs
@@ -105,11 +158,7 @@ class ReterivalAgent(Agent):
                 .correlate(K)  # ensure the subquery is correlated with KBIndexIDs
             )
 
-            filtered = (
-                db.query(KBIndexIDs)
-                .filter(exists(subq))
-                .all()
-            )
+            filtered = (await execute(db, select(KBIndexIDs).where(exists(subq)))).scalars().all()
             filtered_doc_ids = [str(f.id) for f in filtered]
             filter = {
                 "row_id": {
@@ -120,26 +169,48 @@ class ReterivalAgent(Agent):
             print("Getting Table names")
             unique_table_names = await get_table_names(self.orgn, kb_ids, self.uid)
             print(f"Getting context: {unique_table_names}")
-            context = await self.retrive_knowledge(unique_table_names, prompt)
+            context = await self.retrive_knowledge(unique_table_names, prompt, query_embedding=query_embedding)
             print(f"Context: {context}")
-        SYS_PROMPT = """
-            You are the best AI assistant designed to answer questions with precision, specificity, and conciseness. Your responses must strictly adhere to the content and question provided by the user.
-            Instructions:
-                1. Always use the provided content to form your response.
-                2. If the provided content does not match or sufficiently address the question, and if web search results are available, incorporate the relevant web search results into your answer.
-                3. Do not add extra information, context, or opinions beyond what is explicitly stated in the provided content or verified by the web search results.
-                4. Focus on directly addressing the question, staying on topic, and being as clear and concise as possible.
-                5. Also consider the prompt given by the user, but do not go beyond the rules above.
-        """
-        final_query = f"{api.prompt if api.prompt else SYS_PROMPT} \n User Query: {prompt} \n Context: {context} \n Web Search: {result_text if result_text else None}" 
-        # self.memory.push('user', final_query)
-        self.memory.push('user', final_query, context=context, query=prompt)
+        messages = self.build_messages(api, prompt, context, result_text)
+        self.memory.push('user', messages[-1]['content'], context=context, query=prompt)
         animate_thinking("Thinking...", color="status")
-        answer, reasoning = await self.llm_request()
+        answer, reasoning = await self.llm_request(messages)
+        if cache_namespace is not None and answer:
+            response_cache.put(prompt, (answer, reasoning), query_embedding, cache_namespace)
         self.last_answer = answer
         self.status_message = "Ready"
         return answer, reasoning
 
+    def build_messages(self, api: CreatingBot, prompt: str, context: str, web_results: str) -> list:
+        """
+        Build the retrieval prompt as a stable prefix and a variable suffix, so providers caching prompt prefixes can reuse it.
+        The prefix is the agent and bot instructions (identical for every request of a bot) then the last turns of the conversation,
+        past questions without their retrieved context. The final user message holds the context, the web results and the query.
+        Args:
+            api (CreatingBot): The bot.
+            prompt (str): The user query.
+            context (str): The knowledge base context.
+            web_results (str): The web search results.
+        Returns:
+            list: The messages for the provider.
+        """
+        window = self.memory.get_window(history_turns, keep_last_context=False)
+        system_prompt = window[0]['content']
+        if api.prompt:
+            system_prompt += f"\n\nBot instructions:\n{api.prompt}"
+        history = [message for message in window[1:] if message['role'] in ('user', 'assistant')]
+        final_query = f"Context:\n{context}\n\nWeb Search:\n{web_results if web_results else None}\n\nUser Query: {prompt}"
+        return [{'role': 'system', 'content': system_prompt}] + history + [{'role': 'user', 'content': final_query}]
+
+    def is_cacheable(self, api: CreatingBot) -> bool:
+        """
+        Answers are cached only for bots without live web search, and only for the first question of a conversation:
+        a follow-up question depends on the previous turns.
+        """
+        if api.default_websearch:
+            return False
+        return not any(message['role'] == 'user' for message in self.memory.get())
+
 if __name__ == "__main__":
     from db import SessionLocal
     def get_db():
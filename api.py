@@ -3,19 +3,35 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from fastapi import FastAPI, Depends
 from sqlalchemy.orm import Session
-from db import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import SessionLocal, AsyncSessionLocal, get_pool_metrics
 from time import sleep
 import uuid
 import time
 import json, logging
 
 import asyncio
+from contextlib import asynccontextmanager
 from main import initialize_system
 from schemas import QueryRequest as Query
 from interaction import Interaction
 from session_manager import session_manager 
+from metering import usage_meter
+from llm_provider import get_latency_metrics
+from llm_scheduler import llm_scheduler
+from tracing import tracer
+from router import routing_cache
+from agents.retrival_agent import response_cache, invalidate_bot
 
-api = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    session_manager.start_reaper()
+    usage_meter.start()
+    yield
+    await session_manager.shutdown()
+    await asyncio.to_thread(usage_meter.stop)
+
+api = FastAPI(lifespan=lifespan)
 interaction_instance: Interaction = None
 interaction_lock = asyncio.Lock()
 log =  logging.getLogger(__name__)
@@ -28,6 +44,10 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 api.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
 api.add_middleware(
@@ -42,31 +62,71 @@ api.add_middleware(
 async def hello():
     return "Agent is working"
 
+@api.get("/metrics/routing")
+async def routing_metrics():
+    return routing_cache.get_metrics()
+
+@api.get("/metrics/responses")
+async def responses_metrics():
+    return response_cache.get_metrics()
+
+@api.post("/cache/invalidate/{bot_key}")
+async def invalidate_bot_cache(bot_key: str):
+    return {"removed": invalidate_bot(bot_key)}
+
+@api.get("/metrics/sessions")
+async def sessions_metrics():
+    await session_manager.sample_rss()
+    return session_manager.get_metrics()
+
+@api.get("/metrics/usage")
+async def usage_metrics():
+    return usage_meter.get_metrics()
+
+@api.get("/metrics/llm")
+async def llm_metrics():
+    return get_latency_metrics()
+
+@api.get("/metrics/llm_queue")
+async def llm_queue_metrics():
+    return llm_scheduler.get_metrics()
+
+@api.get("/metrics/db")
+async def db_metrics():
+    return get_pool_metrics()
+
 @api.post("/agent")
-async def agent(query: Query, db: Session = Depends(get_db)):
+async def agent(query: Query, db: AsyncSession = Depends(get_async_db)):
     async def stream():
         cid = query.cid if query.cid else str(uuid.uuid5(uuid.NAMESPACE_DNS, str(query.uid) + str(time.time())))
-        interaction_instance = await session_manager.get_session(cid)
-        start = time.time()
-        interaction_instance.set_query(query.query, query.bot_key, db)
-        print(f"Starting the questioning: {query.query}")
-        await interaction_instance.think(query.uid, query.org)
-        yield json.dumps({"status":"RUNNING"})
-        while True:
-            await asyncio.sleep(1)
-            if interaction_instance.last_answer:
-                json_dump = {"status":"SUCCESS", "answer": interaction_instance.last_answer, "thinking": interaction_instance.last_reasoning, "end": int(time.time()) - int(start)}
-                if interaction_instance.last_browser_search:
-                    json_dump["search"] = interaction_instance.last_browser_search
-                if interaction_instance.browser_sources:
-                    json_dump["sources"] = interaction_instance.browser_sources
-                yield json.dumps(json_dump)
-                print("Answer Generated")
-                print("Reasoning: ",interaction_instance.last_reasoning)
-                print("Answer: ",interaction_instance.last_answer)
-                await session_manager.cleanup_sessions()
-                break
-            print("Generating Answer....")
+        async with session_manager.session(cid) as interaction_instance:
+            start = time.time()
+            interaction_instance.set_query(query.query, query.bot_key, db)
+            print(f"Starting the questioning: {query.query}")
+            try:
+                with tracer.trace(cid, "agent.request", org=query.org, bot_key=query.bot_key):
+                    await interaction_instance.think(query.uid, query.org)
+            except Exception as e:
+                log.error(f"Failed to answer for cid {cid}: {str(e)}")
+                yield json.dumps({"status":"FAILED", "error": str(e), "end": int(time.time()) - int(start)})
+                return
+            yield json.dumps({"status":"RUNNING"})
+            while True:
+                await asyncio.sleep(1)
+                if interaction_instance.last_answer:
+                    json_dump = {"status":"SUCCESS", "answer": interaction_instance.last_answer, "thinking": interaction_instance.last_reasoning, "end": int(time.time()) - int(start)}
+                    if interaction_instance.current_agent is not None:
+                        json_dump["agent"] = interaction_instance.current_agent.agent_name
+                    if interaction_instance.last_browser_search:
+                        json_dump["search"] = interaction_instance.last_browser_search
+                    if interaction_instance.browser_sources:
+                        json_dump["sources"] = interaction_instance.browser_sources
+                    yield json.dumps(json_dump)
+                    print("Answer Generated")
+                    print("Reasoning: ",interaction_instance.last_reasoning)
+                    print("Answer: ",interaction_instance.last_answer)
+                    break
+                print("Generating Answer....")
     return StreamingResponse(stream())
 
 if __name__ == "__main__":
@@ -7,7 +7,8 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException, ElementClickInterceptedException
 from selenium.webdriver.common.action_chains import ActionChains
 from typing import List, Tuple, Type, Dict
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from urllib.parse import urlparse
 from fake_useragent import UserAgent
 from selenium_stealth import stealth
@@ -17,11 +18,11 @@ import certifi
 import ssl
 import time
 import random
+import threading
 import os
 import shutil
 import uuid
 import tempfile
-import markdownify
 import sys
 import re
 
@@ -29,6 +30,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utility import pretty_print, animate_thinking
 from logger import Logger
+from tracing import traced
 
 
 def get_chrome_path() -> str:
@@ -121,9 +123,10 @@ def bypass_ssl() -> str:
     pretty_print("Bypassing SSL verification issues, we strongly advice you update your certifi SSL certificate.", color="warning")
     ssl._create_default_https_context = ssl._create_unverified_context
 
-def create_chrome_options(headless=False, stealth_mode=True, crx_path="./crx/nopecha.crx", lang="en", port=9222) -> Options:
+def create_chrome_options(headless=False, stealth_mode=True, crx_path="./crx/nopecha.crx", lang="en", port=9222, page_load_strategy="normal") -> Options:
     """Create Chrome options - separated for reusability."""
     chrome_options = Options()
+    chrome_options.page_load_strategy = page_load_strategy
     chrome_path = get_chrome_path()
     
     if not chrome_path:
@@ -207,7 +210,8 @@ def create_undetected_chromedriver(service, chrome_options) -> webdriver.Chrome:
                 headless=any("--headless" in arg for arg in chrome_options.arguments),
                 stealth_mode=True,  # We're in stealth mode if we reach this point
                 crx_path="./crx/nopecha.crx",  # Default path
-                port=chrome_options.debugger_address.split(":")[-1]
+                port=chrome_options.debugger_address.split(":")[-1],
+                page_load_strategy=chrome_options.page_load_strategy
             )
             driver = uc.Chrome(service=service, options=fresh_options)
         except Exception as e:
@@ -217,14 +221,14 @@ def create_undetected_chromedriver(service, chrome_options) -> webdriver.Chrome:
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})") 
     return driver
 
-def create_driver(headless=False, stealth_mode=True, crx_path="./crx/nopecha.crx", lang="en", port=9222) -> webdriver.Chrome:
+def create_driver(headless=False, stealth_mode=True, crx_path="./crx/nopecha.crx", lang="en", port=9222, page_load_strategy="normal") -> webdriver.Chrome:
     """Create a Chrome WebDriver with specified options."""
     # Warn if trying to run non-headless in Docker
     if not headless and os.path.exists('/.dockerenv'):
         print("[WARNING] Running non-headless browser in Docker may fail!")
         print("[WARNING] Consider setting headless=True or headless_browser=True in config.ini")
     
-    chrome_options = create_chrome_options(headless, stealth_mode, crx_path, lang, port)
+    chrome_options = create_chrome_options(headless, stealth_mode, crx_path, lang, port, page_load_strategy)
     profile_dir = os.path.join(tempfile.gettempdir(), f"chrome_profile_{uuid.uuid4().hex[:8]}")
     os.makedirs(profile_dir, exist_ok=True)
 
@@ -251,14 +255,85 @@ def create_driver(headless=False, stealth_mode=True, crx_path="./crx/nopecha.crx
     else:
         return webdriver.Chrome(service=service, options=chrome_options)
 
+# Navigation profiles for Browser.go_to
+# fast: no artificial delay, return as soon as the DOM is complete and the network is idle.
+# stealth: human-like random delays and scrolling to reduce bot detection, slower.
+NAVIGATION_PROFILES = {
+    "fast": {
+        "pre_delay": (0.0, 0.0),
+        "human_scroll": False,
+        "ready_timeout": 10,
+        "network_idle_ms": 300,
+        "page_load_strategy": "eager",
+    },
+    "stealth": {
+        "pre_delay": (0.4, 2.5),
+        "human_scroll": True,
+        "ready_timeout": 10,
+        "network_idle_ms": 1000,
+        "page_load_strategy": "normal",
+    },
+}
+
+def get_navigation_profile(name: str) -> dict:
+    """
+    Get a navigation profile by name.
+    Raises:
+        ValueError: If the profile does not exist.
+    """
+    profile = NAVIGATION_PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown navigation profile: {name}. Available: {list(NAVIGATION_PROFILES.keys())}")
+    return profile
+
+def driver_locked(method):
+    """
+    Serialize a Browser method with the background prefetch worker.
+    The WebDriver session is not thread safe, every method that send commands to the driver
+    while a prefetch job might be running must hold the browser driver lock.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.driver_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def on_current_page(method):
+    """
+    Driver locked Browser method acting on the current page.
+    A page restored from a saved session is only navigated to before the first such action.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.driver_lock:
+            self.resume_navigation()
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class Browser:
-    def __init__(self, driver, anticaptcha_manual_install=False):
-        """Initialize the browser with optional AntiCaptcha installation."""
+    def __init__(self, driver, anticaptcha_manual_install=False, prefetch_tabs=0, navigation_profile="fast"):
+        """
+        Initialize the browser with optional AntiCaptcha installation.
+        Args:
+            driver: The selenium WebDriver instance.
+            anticaptcha_manual_install (bool): Open the AntiCaptcha extension page on startup.
+            prefetch_tabs (int): Maximum number of pages speculatively loaded in background tabs, 0 disable prefetching.
+            navigation_profile (str): Name of the profile in NAVIGATION_PROFILES used by go_to.
+        """
         self.js_scripts_folder = "./web_scripts/" if not __name__ == "__main__" else "./web_scripts/"
         self.anticaptcha = "https://chrome.google.com/webstore/detail/nopecha-captcha-solver/dknlfmjaanfblgfdfebhijalfmhmjjjo/related"
         self.logger = Logger("browser.log")
         self.screenshot_folder = os.path.join(os.getcwd(), ".screenshots")
         self.tabs = []
+        self.profile = get_navigation_profile(navigation_profile)
+        self.js_cache = {}
+        self.driver_lock = threading.RLock()
+        self.prefetch_tabs = max(0, int(prefetch_tabs))
+        self.prefetched = {} # url -> window handle of the background tab
+        self.prefetch_cache = {} # window handle -> DOM snapshot of the prefetched page
+        self.snapshot = None # DOM snapshot of the current page, reset by every navigation or interaction changing the page
+        self.pending_url = None # page of a restored session, navigated to on the next action needing it
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1)
         try:
             self.driver = driver
             self.wait = WebDriverWait(self.driver, 10)
@@ -278,6 +353,7 @@ class Browser:
             pass
         self.screenshot()
     
+    @driver_locked
     def switch_control_tab(self):
         self.logger.log("Switching to control tab.")
         self.driver.switch_to.window(self.tabs[0])
@@ -298,7 +374,9 @@ class Browser:
             actions.pause(random.uniform(0.1,0.3))
         actions.click().perform()
 
+    @driver_locked
     def human_scroll(self):
+        self.snapshot = None
         for _ in range(random.randint(1, 3)):
             scroll_pixels = random.randint(150, 1200)
             self.driver.execute_script(f"window.scrollBy(0, {scroll_pixels});")
@@ -307,30 +385,217 @@ class Browser:
                 self.driver.execute_script(f"window.scrollBy(0, -{random.randint(50, 300)});")
                 time.sleep(random.uniform(0.3, 1.0))
 
+    def is_page_ready(self, state: dict, progress: dict, idle_window: float) -> bool:
+        """
+        Update the network activity of a page with one page_state.js reading and tell whether the page is ready.
+        Args:
+            state (dict): Page state returned by page_state.js.
+            progress (dict): Resources count and idle_since time of the previous readings of the page, updated in place.
+            idle_window (float): Seconds without new network resource for the network to be idle.
+        Returns:
+            bool: True if the page is complete, network idle and without captcha.
+        """
+        now = time.time()
+        if state["resources"] != progress["resources"]:
+            progress["resources"] = state["resources"]
+            progress["idle_since"] = now
+        return state["readyState"] == "complete" and not state["captcha"] and now - progress["idle_since"] >= idle_window
+
+    @driver_locked
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        """
+        Wait for the current page to be usable.
+        The page is ready once document.readyState is complete, no new network resource was loaded
+        during the profile network idle window and no captcha or browser check is displayed.
+        Args:
+            timeout (float, optional): Maximum seconds to wait, default to the navigation profile ready_timeout.
+        Returns:
+            bool: True if the page is ready, False on timeout.
+        """
+        timeout = self.profile["ready_timeout"] if timeout is None else timeout
+        idle_window = self.profile["network_idle_ms"] / 1000
+        script = self.load_js("page_state.js")
+        deadline = time.time() + timeout
+        progress = {"resources": -1, "idle_since": time.time()}
+        state = None
+        while time.time() < deadline:
+            try:
+                state = self.driver.execute_script(script)
+            except WebDriverException as e:
+                self.logger.warning(f"Error reading page state: {str(e)}")
+                state = None
+            if state is not None and self.is_page_ready(state, progress, idle_window):
+                return True
+            time.sleep(0.1)
+        if state is not None and state["captcha"]:
+            self.logger.warning("Timeout while waiting for page to bypass captcha or 'checking your browser'")
+        else:
+            self.logger.warning("Timeout while waiting for page to be ready")
+        return False
+
+    @driver_locked
     def patch_browser_fingerprint(self) -> None:
         script = self.load_js("spoofing.js")
         self.driver.execute_script(script)
     
+    def prefetch(self, urls: List[str]) -> List[str]:
+        """
+        Speculatively open pages in background tabs so a later go_to can use an already loaded page.
+        The tabs are opened with window.open which does not block, their text is then extracted by a background worker.
+        Args:
+            urls (List[str]): Candidate urls, ordered by preference.
+        Returns:
+            List[str]: The urls for which a new tab was opened.
+        """
+        if self.prefetch_tabs == 0:
+            return []
+        opened = []
+        with self.driver_lock:
+            try:
+                for url in urls:
+                    if len(self.prefetched) >= self.prefetch_tabs:
+                        break
+                    if url is None or url in self.prefetched:
+                        continue
+                    known_handles = set(self.driver.window_handles)
+                    self.driver.execute_script("window.open(arguments[0], '_blank');", url)
+                    new_handles = [h for h in self.driver.window_handles if h not in known_handles]
+                    if not new_handles:
+                        self.logger.warning(f"Failed to open prefetch tab for {url}")
+                        continue
+                    self.prefetched[url] = new_handles[0]
+                    opened.append(url)
+            except WebDriverException as e:
+                self.logger.error(f"Error opening prefetch tabs: {str(e)}")
+        if opened:
+            self.logger.info(f"Prefetching {len(opened)} pages: {opened}")
+            self.prefetch_executor.submit(self.extract_prefetched, opened)
+        return opened
+
+    def extract_prefetched(self, urls: List[str]) -> None:
+        """
+        Background job extracting text and links of prefetched tabs.
+        The driver lock is only held for short slices: one page state reading of a tab, or the extraction of a ready tab.
+        Between slices the lock is released, so the agent never waits for a prefetched page to load.
+        A tab still not ready after the profile ready_timeout is extracted anyway.
+        """
+        script = self.load_js("page_state.js")
+        idle_window = self.profile["network_idle_ms"] / 1000
+        deadline = time.time() + self.profile["ready_timeout"]
+        pending = {url: {"resources": -1, "idle_since": time.time()} for url in urls}
+        while pending:
+            for url in list(pending.keys()):
+                with self.driver_lock:
+                    handle = self.prefetched.get(url, None)
+                    if handle is None or handle in self.prefetch_cache:
+                        # opened by the agent or closed meanwhile
+                        del pending[url]
+                        continue
+                    origin = None
+                    try:
+                        origin = self.driver.current_window_handle
+                        self.driver.switch_to.window(handle)
+                        ready = self.is_page_ready(self.driver.execute_script(script), pending[url], idle_window)
+                        if ready or time.time() >= deadline:
+                            if not ready:
+                                self.logger.warning(f"Prefetched page {url} not fully loaded, extracting anyway.")
+                            self.apply_web_safety()
+                            self.prefetch_cache[handle] = self.take_snapshot()
+                            self.logger.info(f"Prefetched {url}")
+                            del pending[url]
+                    except WebDriverException as e:
+                        self.logger.error(f"Error prefetching {url}: {str(e)}")
+                        del pending[url]
+                    finally:
+                        if origin is not None:
+                            try:
+                                self.driver.switch_to.window(origin)
+                            except WebDriverException as e:
+                                self.logger.error(f"Error switching back from prefetch tab: {str(e)}")
+            if pending:
+                time.sleep(0.1)
+
+    def go_to_prefetched(self, url: str) -> bool:
+        """Switch to the background tab of a prefetched url, closing the tab we leave if it was a prefetch tab."""
+        handle = self.prefetched.pop(url)
+        try:
+            previous = self.driver.current_window_handle
+            self.driver.switch_to.window(handle)
+            if previous != self.tabs[0] and previous != handle and previous not in self.prefetched.values():
+                self.driver.switch_to.window(previous)
+                self.driver.close()
+                self.driver.switch_to.window(handle)
+            self.snapshot = self.prefetch_cache.pop(handle, None)
+            if self.snapshot is None:
+                self.apply_web_safety()
+            self.logger.log(f"Navigated to prefetched page: {url}")
+            return True
+        except WebDriverException as e:
+            self.logger.error(f"Error switching to prefetched tab for {url}: {str(e)}")
+            return False
+
+    @driver_locked
+    def close_prefetched(self) -> None:
+        """Close every prefetch tab that was not navigated to."""
+        try:
+            current = self.driver.current_window_handle
+            for url, handle in self.prefetched.items():
+                if handle == current:
+                    continue
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            self.driver.switch_to.window(current)
+        except WebDriverException as e:
+            self.logger.error(f"Error closing prefetch tabs: {str(e)}")
+        self.prefetched = {}
+        self.prefetch_cache = {}
+
+    def restore_url(self, url: str) -> None:
+        """Set the page of a restored session, the browser navigates to it lazily (see on_current_page)."""
+        self.pending_url = url
+        self.snapshot = None
+
+    @driver_locked
+    def resume_navigation(self) -> None:
+        """Navigate to the pending restored page, a failure is logged and the session continues on the current page."""
+        url = self.pending_url
+        if url is None:
+            return
+        self.pending_url = None
+        try:
+            if not self.go_to(url):
+                self.logger.warning(f"Could not restore the session page {url}")
+        except WebDriverException as e:
+            self.logger.error(f"Error restoring the session page {url}: {str(e)}")
+
+    def close(self) -> None:
+        """Stop the prefetch worker, close the prefetch tabs and quit the WebDriver (Chrome and chromedriver)."""
+        self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        with self.driver_lock:
+            self.close_prefetched()
+            try:
+                self.driver.quit()
+                self.logger.info("Browser closed.")
+            except WebDriverException as e:
+                self.logger.error(f"Error quitting the browser: {str(e)}")
+
+    @traced("browser.go_to", record=("url",))
+    @driver_locked
     def go_to(self, url:str) -> bool:
         """Navigate to a specified URL."""
-        time.sleep(random.uniform(0.4, 2.5))
+        self.snapshot = None
+        self.pending_url = None
+        if url in self.prefetched:
+            return self.go_to_prefetched(url)
+        delay_min, delay_max = self.profile["pre_delay"]
+        if delay_max > 0:
+            time.sleep(random.uniform(delay_min, delay_max))
         try:
-            initial_handles = self.driver.window_handles
             self.driver.get(url)
-            time.sleep(random.uniform(0.01, 0.3))
-            try:
-                wait = WebDriverWait(self.driver, timeout=10)
-                wait.until(
-                    lambda driver: (
-                        not any(keyword in driver.page_source.lower() for keyword in ["checking your browser", "captcha"])
-                    ),
-                    message="stuck on 'checking browser' or verification screen"
-                )
-            except TimeoutException:
-                self.logger.warning("Timeout while waiting for page to bypass 'checking your browser'")
+            self.wait_until_ready()
             self.apply_web_safety()
-            time.sleep(random.uniform(0.01, 0.2))
-            self.human_scroll()
+            if self.profile["human_scroll"]:
+                self.human_scroll()
             self.logger.log(f"Navigated to: {url}")
             return True
         except TimeoutException as e:
@@ -355,29 +620,45 @@ class Browser:
         is_long_enough = word_count > 4
         return (word_count >= 5 and (has_punctuation or is_long_enough))
 
+    def take_snapshot(self) -> dict:
+        """
+        Run the DOM snapshot script on the current page.
+        Returns:
+            dict: url, title, links, text blocks and form inputs of the page in a single WebDriver round trip.
+        """
+        script = self.load_js("dom_snapshot.js")
+        snapshot = self.driver.execute_script(script)
+        self.logger.info(f"Snapshot of {snapshot['url']}: {len(snapshot['links'])} links, {len(snapshot['blocks'])} text blocks, {len(snapshot['inputs'])} inputs.")
+        return snapshot
+
+    @on_current_page
+    def get_snapshot(self) -> dict | None:
+        """Get the DOM snapshot of the current page, taken once per page."""
+        if self.snapshot is None:
+            try:
+                self.snapshot = self.take_snapshot()
+            except WebDriverException as e:
+                self.logger.error(f"Error taking page snapshot: {str(e)}")
+                return None
+        return self.snapshot
+
+    def format_page_text(self, blocks: List[str]) -> str:
+        """Format the text blocks of a snapshot as markdown, keeping only meaningful sentences."""
+        lines = []
+        for block in blocks:
+            for line in block.splitlines():
+                stripped = line.strip()
+                if stripped and self.is_sentence(stripped):
+                    lines.append(' '.join(stripped.split()))
+        return "[Start of page]\n\n" + "\n\n".join(lines) + "\n\n[End of page]"
+
     def get_text(self) -> str | None:
         """Get page text as formatted Markdown"""
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return None
         try:
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            for element in soup(['script', 'style', 'noscript', 'meta', 'link']):
-                element.decompose()
-            markdown_converter = markdownify.MarkdownConverter(
-                heading_style="ATX",
-                strip=['a'],
-                autolinks=False,
-                bullets='•',
-                strong_em_symbol='*',
-                default_title=False,
-            )
-            markdown_text = markdown_converter.convert(str(soup.body))
-            lines = []
-            for line in markdown_text.splitlines():
-                stripped = line.strip()
-                if stripped and self.is_sentence(stripped):
-                    cleaned = ' '.join(stripped.split())
-                    lines.append(cleaned)
-            result = "[Start of page]\n\n" + "\n\n".join(lines) + "\n\n[End of page]"
-            result = re.sub(r'!\[(.*?)\]\(.*?\)', r'[IMAGE: \1]', result)
+            result = self.format_page_text(snapshot["blocks"])
             self.logger.info(f"Extracted text: {result[:100]}...")
             self.logger.info(f"Extracted text length: {len(result)}")
             return result[:32768]
@@ -422,27 +703,21 @@ class Browser:
 
     def get_navigable(self) -> List[str]:
         """Get all navigable links on the current page."""
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return []
         try:
-            links = []
-            elements = self.driver.find_elements(By.TAG_NAME, "a")
-            
-            for element in elements:
-                href = element.get_attribute("href")
-                if href and href.startswith(("http", "https")):
-                    links.append({
-                        "url": href,
-                        "text": element.text.strip(),
-                        "is_displayed": element.is_displayed()
-                    })
-            
+            links = [link for link in snapshot["links"] if link["url"] and link["url"].startswith(("http", "https"))]
             self.logger.info(f"Found {len(links)} navigable links")
-            return [self.clean_url(link['url']) for link in links if (link['is_displayed'] == True and self.is_link_valid(link['url']))]
+            return [self.clean_url(link['url']) for link in links if (link['displayed'] == True and self.is_link_valid(link['url']))]
         except Exception as e:
             self.logger.error(f"Error getting navigable links: {str(e)}")
             return []
 
+    @on_current_page
     def click_element(self, xpath: str) -> bool:
         """Click an element specified by XPath."""
+        self.snapshot = None
         try:
             element = self.wait.until(EC.element_to_be_clickable((By.XPATH, xpath)))
             if not element.is_displayed():
@@ -468,16 +743,20 @@ class Browser:
         
     def load_js(self, file_name: str) -> str:
         """Load javascript from script folder to inject to page."""
+        if file_name in self.js_cache:
+            return self.js_cache[file_name]
         path = os.path.join(self.js_scripts_folder, file_name)
         self.logger.info(f"Loading js at {path}")
         try:
             with open(path, 'r') as f:
-                return f.read()
+                self.js_cache[file_name] = f.read()
+                return self.js_cache[file_name]
         except FileNotFoundError as e:
             raise Exception(f"Could not find: {path}") from e
         except Exception as e:
             raise e
 
+    @on_current_page
     def find_all_inputs(self, timeout=3):
         """Find all inputs elements on the page."""
         try:
@@ -494,31 +773,26 @@ class Browser:
 
     def get_form_inputs(self) -> List[str]:
         """Extract all input from the page and return them."""
-        try:
-            input_elements = self.find_all_inputs()
-            if not input_elements:
-                self.logger.info("No input element on page.")
-                return ["No input forms found on the page."]
-
-            form_strings = []
-            for element in input_elements:
-                input_type = element.get("type") or "text"
-                if input_type in ["hidden", "submit", "button", "image"] or not element["displayed"]:
-                    continue
-                input_name = element.get("text") or element.get("id") or input_type
-                if input_type == "checkbox" or input_type == "radio":
-                    try:
-                        checked_status = "checked" if element.is_selected() else "unchecked"
-                    except Exception as e:
-                        continue
-                    form_strings.append(f"[{input_name}]({checked_status})")
-                else:
-                    form_strings.append(f"[{input_name}]("")")
-            return form_strings
+        snapshot = self.get_snapshot()
+        input_elements = snapshot["inputs"] if snapshot is not None else []
+        if not input_elements:
+            self.logger.info("No input element on page.")
+            return ["No input forms found on the page."]
 
-        except Exception as e:
-            raise e
+        form_strings = []
+        for element in input_elements:
+            input_type = element.get("type") or "text"
+            if input_type in ["hidden", "submit", "button", "image"] or not element["displayed"]:
+                continue
+            input_name = element.get("text") or element.get("id") or input_type
+            if input_type == "checkbox" or input_type == "radio":
+                checked_status = "checked" if element.get("checked") else "unchecked"
+                form_strings.append(f"[{input_name}]({checked_status})")
+            else:
+                form_strings.append(f"[{input_name}]("")")
+        return form_strings
 
+    @on_current_page
     def get_buttons_xpath(self) -> List[str]:
         """
         Find buttons and return their type and xpath.
@@ -535,6 +809,7 @@ class Browser:
         result.sort(key=lambda x: len(x[0]))
         return result
 
+    @driver_locked
     def wait_for_submission_outcome(self, timeout: int = 10) -> bool:
         """
         Wait for a submission outcome (e.g., URL change or new element).
@@ -552,6 +827,7 @@ class Browser:
             self.logger.warning("No submission outcome detected")
             return False
 
+    @on_current_page
     def find_and_click_btn(self, btn_type: str = 'login', timeout: int = 5) -> bool:
         """Find and click a submit button matching the specified type."""
         buttons = self.get_buttons_xpath()
@@ -582,11 +858,13 @@ class Browser:
         self.logger.warning(f"No button matching '{btn_type}' found")
         return False
 
+    @on_current_page
     def tick_all_checkboxes(self) -> bool:
         """
         Find and tick all checkboxes on the page.
         Returns True if successful, False if any issues occur.
         """
+        self.snapshot = None
         try:
             checkboxes = self.driver.find_elements(By.XPATH, "//input[@type='checkbox']")
             if not checkboxes:
@@ -638,8 +916,10 @@ class Browser:
                 return field["xpath"]
         return None
 
+    @on_current_page
     def fill_form_inputs(self, input_list: List[str]) -> bool:
         """Fill inputs based on a list of [name](value) strings."""
+        self.snapshot = None
         if not isinstance(input_list, list):
             self.logger.error("input_list must be a list")
             return False
@@ -686,8 +966,10 @@ class Browser:
             self.logger.error(f"Error filling form inputs: {str(e)}")
             return False
     
+    @on_current_page
     def fill_form(self, input_list: List[str]) -> bool:
         """Fill form inputs based on a list of [name](value) and submit."""
+        self.snapshot = None
         if not isinstance(input_list, list):
             self.logger.error("input_list must be a list")
             return False
@@ -705,16 +987,22 @@ class Browser:
         self.logger.warning("Failed to fill form inputs")
         return False
 
+    @driver_locked
     def get_current_url(self) -> str:
-        """Get the current URL of the page."""
+        """Get the current URL of the page, or the restored page not navigated to yet."""
+        if self.pending_url is not None:
+            return self.pending_url
         return self.driver.current_url
 
+    @on_current_page
     def get_page_title(self) -> str:
         """Get the title of the current page."""
         return self.driver.title
 
+    @on_current_page
     def scroll_bottom(self) -> bool:
         """Scroll to the bottom of the page."""
+        self.snapshot = None # scrolling can lazy load content
         try:
             self.logger.info("Scrolling to the bottom of the page...")
             self.driver.execute_script(
@@ -729,6 +1017,7 @@ class Browser:
     def get_screenshot(self) -> str:
         return self.screenshot_folder + "/updated_screen.png"
 
+    @on_current_page
     def screenshot(self, filename:str = 'updated_screen.png') -> bool:
         """Take a screenshot of the current page, attempt to capture the full page by zooming out."""
         self.logger.info("Taking full page screenshot...")
@@ -749,6 +1038,7 @@ class Browser:
             self.driver.execute_script(f"document.body.style.zoom='1'")
         return True
 
+    @driver_locked
     def apply_web_safety(self):
         """
         Apply security measures to block any website malicious/annoying execution, privacy violation etc..
@@ -51,6 +51,8 @@ LLAMA3_MODEL_NAME = get_env_var('LLAMA3_MODEL_NAME', required=True)
 
 # DeepInfra Configuration
 DEEPINFRA_API_BASE = get_env_var('DEEPINFRA_API_BASE', required=True)
+# OpenAI compatible endpoint of the search query generation, e.g. test/mock_llm_server.py for load tests
+DEEPINFRA_OPENAI_URL = get_env_var('DEEPINFRA_OPENAI_URL', 'https://api.deepinfra.com/v1/openai')
 DEEPINFRA_API_TOKEN = get_env_var('DEEPINFRA_API_TOKEN', required=True)
 BAAI_MODEL_ID = get_env_var('BAAI_MODEL_ID', required=True)
 VISION_MODEL_ID = get_env_var('VISION_MODEL_ID', required=True)
@@ -63,7 +65,14 @@ AWS_SECRET_ACCESS_KEY = get_env_var('AWS_SECRET_ACCESS_KEY', required=True)
 
 # Brave Search API
 BRAVE_API_KEY = get_env_var('BRAVE_API_KEY', required=True)
+# overridden by load tests with the stub search server of test/concurrency.py
+BRAVE_SEARCH_URL = get_env_var('BRAVE_SEARCH_URL', 'https://api.search.brave.com/res/v1/web/search')
 POSTGRES_URL = get_env_var('POSTGRES_URL', required=True)
+# Connection pool per worker process
+POSTGRES_POOL_SIZE = int(get_env_var('POSTGRES_POOL_SIZE', '5'))
+POSTGRES_MAX_OVERFLOW = int(get_env_var('POSTGRES_MAX_OVERFLOW', '10'))
+POSTGRES_POOL_TIMEOUT = float(get_env_var('POSTGRES_POOL_TIMEOUT', '30'))
+POSTGRES_POOL_RECYCLE = int(get_env_var('POSTGRES_POOL_RECYCLE', '300'))
 
 # Legacy token mappings for backward compatibility
 TOKENS = {
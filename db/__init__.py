@@ -1,3 +1,3 @@
-from .postgres import SessionLocal, Base
+from .postgres import SessionLocal, AsyncSessionLocal, Base, execute, get_pool_metrics
 
-__all__ = ["SessionLocal", "Base"]
\ No newline at end of file
+__all__ = ["SessionLocal", "AsyncSessionLocal", "Base", "execute", "get_pool_metrics"]
@@ -1,18 +1,176 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
+from typing import Tuple
+import threading
+import asyncio
 import logging
+import shlex
+import ssl
 import config
 
 log = logging.getLogger(__name__)
 
+# libpq parameters of the psycopg2 URL passed to asyncpg.connect under another name or type
+ASYNCPG_CONNECT_ARGS = {
+    "connect_timeout": ("timeout", float),
+    "target_session_attrs": ("target_session_attrs", str),
+    "krbsrvname": ("krbsrvname", str),
+}
+# libpq parameters sent to the server as settings at connection startup
+ASYNCPG_SERVER_SETTINGS = ("application_name",)
+# libpq parameters building the asyncpg ssl argument
+SSL_PARAMS = ("sslmode", "sslrootcert", "sslcert", "sslkey")
+
+def parse_options(options: str) -> dict:
+    """Server settings of a libpq options parameter, e.g. "-c statement_timeout=5000 -c search_path=app"."""
+    settings = {}
+    tokens = shlex.split(options)
+    for i, token in enumerate(tokens):
+        if token == "-c" and i + 1 < len(tokens):
+            setting = tokens[i + 1]
+        elif token.startswith("-c") and len(token) > 2:
+            setting = token[2:]
+        elif token.startswith("--"):
+            setting = token[2:]
+        else:
+            continue
+        key, sep, value = setting.partition("=")
+        if sep:
+            settings[key.replace("-", "_")] = value
+    return settings
+
+def to_ssl_arg(params: dict):
+    """
+    asyncpg ssl argument from the libpq TLS parameters: the sslmode name,
+    or an SSLContext when certificate files are given (asyncpg does not take them as arguments).
+    """
+    mode = params.get("sslmode", "prefer")
+    if mode == "disable" or not any(params.get(key) for key in ("sslrootcert", "sslcert", "sslkey")):
+        return params.get("sslmode")
+    context = ssl.create_default_context(cafile=params.get("sslrootcert"))
+    context.check_hostname = mode == "verify-full"
+    if not params.get("sslrootcert") and mode not in ("verify-ca", "verify-full"):
+        context.verify_mode = ssl.CERT_NONE
+    if params.get("sslcert"):
+        context.load_cert_chain(params["sslcert"], params.get("sslkey"))
+    return context
+
+def to_async_url(url: str) -> Tuple[URL, dict]:
+    """
+    Convert the psycopg2 Postgres URL to an asyncpg one.
+    asyncpg.connect does not take the libpq parameters: they are mapped explicitly to its connect arguments
+    (sslmode and certificates to ssl, connect_timeout to timeout, application_name and options to server_settings),
+    the unsupported ones are dropped with a warning.
+    Returns:
+        Tuple[URL, dict]: The asyncpg URL without query parameters, and the connect_args of create_async_engine.
+    """
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    async_url = make_url(url).set(drivername="postgresql+asyncpg")
+    query = {key: value[-1] if isinstance(value, tuple) else value for key, value in async_url.query.items()}
+    connect_args, server_settings = {}, {}
+    ssl_arg = to_ssl_arg({key: query[key] for key in SSL_PARAMS if key in query})
+    if ssl_arg is not None:
+        connect_args["ssl"] = ssl_arg
+    for key, value in query.items():
+        if key in SSL_PARAMS:
+            continue
+        if key in ASYNCPG_CONNECT_ARGS:
+            name, cast = ASYNCPG_CONNECT_ARGS[key]
+            connect_args[name] = cast(value)
+        elif key in ASYNCPG_SERVER_SETTINGS:
+            server_settings[key] = value
+        elif key == "options":
+            server_settings.update(parse_options(value))
+        else:
+            log.warning(f"Postgres URL parameter {key} is not supported by asyncpg, ignored by the async engine")
+    if server_settings:
+        connect_args["server_settings"] = server_settings
+    return async_url.set(query={}), connect_args
+
 DATABASE_URL = config.POSTGRES_URL
 engine = create_engine(
     DATABASE_URL,
-    pool_recycle=300,
-    pool_pre_ping=True,
-    poolclass=NullPool
+    poolclass=QueuePool,
+    pool_size=config.POSTGRES_POOL_SIZE,
+    max_overflow=config.POSTGRES_MAX_OVERFLOW,
+    pool_timeout=config.POSTGRES_POOL_TIMEOUT,
+    pool_recycle=config.POSTGRES_POOL_RECYCLE,
+    pool_pre_ping=True
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# async engine for the request path, the queries no longer block the event loop
+ASYNC_DATABASE_URL, ASYNC_CONNECT_ARGS = to_async_url(DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=ASYNC_CONNECT_ARGS,
+    pool_size=config.POSTGRES_POOL_SIZE,
+    max_overflow=config.POSTGRES_MAX_OVERFLOW,
+    pool_timeout=config.POSTGRES_POOL_TIMEOUT,
+    pool_recycle=config.POSTGRES_POOL_RECYCLE,
+    pool_pre_ping=True
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def execute(db: Session | AsyncSession, statement):
+    """
+    Execute a statement with either session type without blocking the event loop,
+    synchronous sessions run in a worker thread.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.execute(statement)
+    return await asyncio.to_thread(db.execute, statement)
+
+pool_stats = {}
+pool_stats_lock = threading.Lock()
+
+def instrument_pool(name: str, sync_engine) -> None:
+    """Count the pool events of an engine under pool_stats[name]."""
+    stats = {"connects": 0, "checkouts": 0, "checkins": 0, "invalidations": 0, "peak_checked_out": 0}
+    pool_stats[name] = stats
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        with pool_stats_lock:
+            stats["connects"] += 1
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with pool_stats_lock:
+            stats["checkouts"] += 1
+            stats["peak_checked_out"] = max(stats["peak_checked_out"], sync_engine.pool.checkedout())
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        with pool_stats_lock:
+            stats["checkins"] += 1
+
+    @event.listens_for(sync_engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        with pool_stats_lock:
+            stats["invalidations"] += 1
+
+instrument_pool("sync", engine)
+instrument_pool("async", async_engine.sync_engine)
+
+def get_pool_metrics() -> dict:
+    """Connection pools usage of this worker process."""
+    pools = {"sync": engine.pool, "async": async_engine.sync_engine.pool}
+    with pool_stats_lock:
+        return {
+            name: {
+                **pool_stats[name],
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "max_overflow": config.POSTGRES_MAX_OVERFLOW
+            }
+            for name, pool in pools.items()
+        }
@@ -1,11 +1,13 @@
 import readline
 from typing import List, Tuple, Type, Dict
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from text_to_speech import Speech
 from utility import pretty_print, animate_thinking
 from router import AgentRouter
 from speech_to_text import AudioTranscriber, AudioRecorder
 import asyncio
+import time
 
 
 class Interaction:
@@ -26,6 +28,7 @@ class Interaction:
         self.agents = agents
         self.tts_enabled = tts_enabled
         self.last_active_time = None
+        self.state_revision = 0 # revision of the stored session state this session is in sync with
         self.stt_enabled = stt_enabled
         self.recover_last_session = recover_last_session
         self.router = AgentRouter(self.agents, supported_language=langs)
@@ -40,7 +43,7 @@ class Interaction:
         self.last_answer = None
         self.last_browser_search = None
         self.browser_agent = next((agent for agent in self.agents if agent.type == "browser_agent"), None)
-        self.db: Session | None = None
+        self.db: AsyncSession | Session | None = None
         if tts_enabled:
             self.initialize_tts()
         if stt_enabled:
@@ -148,7 +151,7 @@ class Interaction:
         self.last_query = query
         return query
     
-    def set_query(self, query: str, bot_key: str = None, db: Session = None) -> None:
+    def set_query(self, query: str, bot_key: str = None, db: AsyncSession | Session = None) -> None:
         """Set the query"""
         self.bot_key = bot_key
         self.is_active = True
@@ -160,23 +163,26 @@ class Interaction:
         push_last_agent_memory = False
         if self.last_query is None or len(self.last_query) == 0:
             return False
-        agent = await asyncio.to_thread(self.router.select_agent, self.last_query)
+        agent = await self.router.aselect_agent(self.last_query)
         if agent is None:
             return False
         agent.set_org(org, uid)
+        agent.bot_key = self.bot_key
         if self.current_agent != agent and self.last_answer is not None:
             push_last_agent_memory = True
         tmp = self.last_answer
         pretty_print(f"Selected :{agent.agent_name} bot key :{self.bot_key}", color="success")
         self.current_agent = agent
         self.is_generating = True
-        if agent.agent_name == "retrieval":
-            retrieval_answer, retrieval_reasoning = await agent.process(self.last_query, bot_key=self.bot_key, db=self.db)
-            self.last_answer = retrieval_answer
-            self.last_reasoning = retrieval_reasoning
-        else:
-            self.last_answer, self.last_reasoning = await agent.process(self.last_query, self.speech)
-        self.is_generating = False
+        try:
+            if agent.agent_name == "retrieval":
+                retrieval_answer, retrieval_reasoning = await agent.process(self.last_query, bot_key=self.bot_key, db=self.db)
+                self.last_answer = retrieval_answer
+                self.last_reasoning = retrieval_reasoning
+            else:
+                self.last_answer, self.last_reasoning = await agent.process(self.last_query, self.speech)
+        finally:
+            self.is_generating = False
         if push_last_agent_memory:
             self.current_agent.memory.push('assistant', self.last_answer)
         if self.last_answer == tmp:
@@ -209,6 +215,60 @@ class Interaction:
         if self.current_agent is not None:
             self.current_agent.show_answer()
 
+    def export_state(self) -> dict:
+        """
+        Serializable state of the session, restored by restore_state on any worker.
+        Returns:
+            dict: Current agent, last exchange, agents memories, planner progress and browser URL.
+        """
+        browser_url = None
+        if self.browser_agent and self.browser_agent.browser:
+            try:
+                browser_url = self.browser_agent.browser.get_current_url()
+            except Exception:
+                browser_url = None
+        planner = next((agent for agent in self.agents if agent.type == "planner_agent"), None)
+        return {
+            "version": 1,
+            "revision": self.state_revision + 1,
+            "current_agent": self.current_agent.type if self.current_agent else None,
+            "last_query": self.last_query,
+            "last_answer": self.last_answer,
+            "last_reasoning": self.last_reasoning,
+            "bot_key": self.bot_key,
+            "browser_sources": self.browser_sources,
+            "last_browser_search": self.last_browser_search,
+            "browser_url": browser_url,
+            "memories": {agent.type: agent.memory.memory for agent in self.agents if agent.memory is not None},
+            "planner_progress": getattr(planner, "plan_progress", None),
+            "saved_at": time.time()
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """
+        Rehydrate the session from a state produced by export_state.
+        Args:
+            state (dict): The exported state.
+        """
+        self.state_revision = state.get("revision", 0)
+        self.current_agent = next((agent for agent in self.agents if agent.type == state.get("current_agent")), None)
+        self.last_query = state.get("last_query")
+        self.last_answer = state.get("last_answer")
+        self.last_reasoning = state.get("last_reasoning")
+        self.bot_key = state.get("bot_key")
+        self.browser_sources = state.get("browser_sources")
+        self.last_browser_search = state.get("last_browser_search")
+        for agent in self.agents:
+            memory = state.get("memories", {}).get(agent.type)
+            if memory and agent.memory is not None:
+                agent.memory.memory = memory
+            if agent.type == "planner_agent" and state.get("planner_progress"):
+                agent.plan_progress = state["planner_progress"]
+        browser_url = state.get("browser_url")
+        if browser_url and browser_url.startswith("http") and self.browser_agent and self.browser_agent.browser:
+            # navigated to on the next browser action, so rehydration does not wait for a page load
+            self.browser_agent.browser.restore_url(browser_url)
+
     def close(self):
         """Close the interaction and the browser."""
         if self.browser_agent and self.browser_agent.browser:
@@ -1,42 +1,85 @@
 from typing import List, Tuple, Type, Dict
 import re
-import langid
+import threading
+from collections import OrderedDict
+from langid.langid import LanguageIdentifier, model as langid_model
 from transformers import MarianMTModel, MarianTokenizer
 
 from utility import pretty_print, animate_thinking
 from logger import Logger
+from onnx_models import resolve_backend, load_translation_model
 
 class LanguageUtility:
     """LanguageUtility for language, or emotion identification"""
-    def __init__(self, supported_language: List[str] = ["en", "fr", "zh"]):
+    def __init__(self, supported_language: List[str] = ["en", "fr", "zh"], backend: str = "torch",
+                 load_translators: bool = True, min_confidence: float = 0.8, translation_cache_size: int = 1024):
         """
         Initialize the LanguageUtility class
         args:
             supported_language: list of languages for translation, determine which Helsinki-NLP model to load
+            backend: torch or onnx (int8 quantized ONNX Runtime translation models)
+            load_translators: load the Marian translation models, not needed when routing with a multilingual classifier
+            min_confidence: below this language detection confidence the text is not translated
+            translation_cache_size: number of memoized translations
         """
-        self.translators_tokenizer = None 
-        self.translators_model = None
+        self.translators_tokenizer = {}
+        self.translators_model = {}
         self.logger = Logger("language.log")
         self.supported_language = supported_language
-        self.load_model()
+        self.backend = resolve_backend(backend)
+        self.min_confidence = min_confidence
+        self.translation_cache = OrderedDict() # (lang, text) -> translation
+        self.translation_cache_size = translation_cache_size
+        self.translation_cache_lock = threading.Lock()
+        # own identifier configured once, langid.set_languages mutates the module global identifier
+        self.identifier = LanguageIdentifier.from_modelstring(langid_model, norm_probs=True)
+        self.identifier.set_languages(supported_language)
+        if load_translators:
+            self.load_model()
     
     def load_model(self) -> None:
         animate_thinking("Loading language utility...", color="status")
-        self.translators_tokenizer = {lang: MarianTokenizer.from_pretrained(f"Helsinki-NLP/opus-mt-{lang}-en") for lang in self.supported_language if lang != "en"}
-        self.translators_model = {lang: MarianMTModel.from_pretrained(f"Helsinki-NLP/opus-mt-{lang}-en") for lang in self.supported_language if lang != "en"}
+        self.translators_tokenizer, self.translators_model = {}, {}
+        for lang in self.supported_language:
+            if lang == "en":
+                continue
+            model_id = f"Helsinki-NLP/opus-mt-{lang}-en"
+            if self.backend == "onnx":
+                try:
+                    self.translators_tokenizer[lang], self.translators_model[lang] = load_translation_model(model_id)
+                    continue
+                except Exception as e:
+                    pretty_print(f"Failed to load ONNX model for {model_id}, using torch: {str(e)}", color="warning")
+                    self.logger.warning(f"ONNX load failed for {model_id}: {str(e)}")
+            self.translators_tokenizer[lang] = MarianTokenizer.from_pretrained(model_id)
+            self.translators_model[lang] = MarianMTModel.from_pretrained(model_id)
     
-    def detect_language(self, text: str) -> str:
+    def detect_language_with_confidence(self, text: str) -> Tuple[str, float]:
         """
-        Detect the language of the given text using langdetect
+        Detect the language of the given text using langid
         Limited to the supported languages list because of the model tendency to mistake similar languages
         Args:
             text: string to analyze
-        Returns: ISO639-1 language code
+        Returns: ISO639-1 language code and normalized confidence
         """
-        langid.set_languages(self.supported_language)
-        lang, score = langid.classify(text)
+        lang, score = self.identifier.classify(text)
         self.logger.info(f"Identified: {text} as {lang} with conf {score}")
-        return lang
+        return lang, score
+
+    def detect_language(self, text: str) -> str:
+        """
+        Detect the language of the given text using langid
+        Args:
+            text: string to analyze
+        Returns: ISO639-1 language code
+        """
+        return self.detect_language_with_confidence(text)[0]
+
+    def needs_translation(self, lang: str, confidence: float) -> bool:
+        """
+        A text is translated only if confidently detected as a non English language
+        """
+        return lang != "en" and confidence >= self.min_confidence
 
     def translate(self, text: str, origin_lang: str) -> str:
         """
@@ -46,16 +89,47 @@ class LanguageUtility:
             origin_lang: ISO language code
         Returns: translated str
         """
-        if origin_lang == "en":
-            return text
-        if origin_lang not in self.translators_tokenizer:
-            pretty_print(f"Language {origin_lang} not supported for translation", color="error")
-            return text
-        tokenizer = self.translators_tokenizer[origin_lang]
-        inputs = tokenizer(text, return_tensors="pt", padding=True)
-        model = self.translators_model[origin_lang]
-        translation = model.generate(**inputs)
-        return tokenizer.decode(translation[0], skip_special_tokens=True)
+        return self.translate_batch([text], [origin_lang])[0]
+
+    def translate_batch(self, texts: List[str], origin_langs: List[str]) -> List[str]:
+        """
+        Translate a batch of texts to English, one generate call per origin language
+        Translations are memoized, only the texts never seen before are translated
+        Args:
+            texts: strings to translate
+            origin_langs: ISO language code of each text
+        Returns: translated strings, in the input order
+        """
+        translated = list(texts)
+        by_lang = {}
+        with self.translation_cache_lock:
+            for i, lang in enumerate(origin_langs):
+                if lang == "en":
+                    continue
+                if lang not in self.translators_tokenizer:
+                    pretty_print(f"Language {lang} not supported for translation", color="error")
+                    continue
+                cached = self.translation_cache.get((lang, texts[i]), None)
+                if cached is not None:
+                    self.translation_cache.move_to_end((lang, texts[i]))
+                    translated[i] = cached
+                    continue
+                by_lang.setdefault(lang, []).append(i)
+        for lang, indexes in by_lang.items():
+            tokenizer = self.translators_tokenizer[lang]
+            inputs = tokenizer([texts[i] for i in indexes], return_tensors="pt", padding=True)
+            translations = self.translators_model[lang].generate(**inputs)
+            for i, translation in zip(indexes, tokenizer.batch_decode(translations, skip_special_tokens=True)):
+                translated[i] = translation
+                self.memoize(lang, texts[i], translation)
+        return translated
+
+    def memoize(self, lang: str, text: str, translation: str) -> None:
+        with self.translation_cache_lock:
+            self.translation_cache[(lang, text)] = translation
+            self.translation_cache.move_to_end((lang, text))
+            while len(self.translation_cache) > self.translation_cache_size:
+                self.translation_cache.popitem(last=False)
 
     def analyze(self, text):
         """
@@ -3,27 +3,113 @@ import platform
 import socket
 import subprocess
 import time
+import random
+import threading
+import configparser
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, CancelledError, wait, FIRST_COMPLETED
 from urllib.parse import urlparse
 
-import httpx
 import requests
 from dotenv import load_dotenv
 from ollama import Client as OllamaClient
-from openai import OpenAI
+from openai import OpenAI, APIStatusError, APITimeoutError, APIConnectionError
 
 from logger import Logger
+from metering import usage_meter
+from llm_scheduler import llm_scheduler
+from mock_llm import MockLLMError, create_mock_llm
+from tracing import span, traced, run_with_context
 from utility import pretty_print, animate_thinking
 
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+class ProviderError(Exception):
+    """Raised when every attempt on every model failed, or on an error another model would not fix (auth, bad request)."""
+    pass
+
+class LatencyHistogram():
+    """
+    Latency histogram of the calls to one model, with a window of recent samples for percentiles.
+    """
+    BUCKETS_MS = [250, 500, 1000, 2000, 5000, 10000, 20000, 40000, 60000, 120000, float("inf")]
+
+    def __init__(self, window: int = 256):
+        self.counts = [0] * len(self.BUCKETS_MS)
+        self.recent = deque(maxlen=window)
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms: float, success: bool = True) -> None:
+        with self.lock:
+            if not success:
+                self.errors += 1
+                return
+            self.counts[bisect_left(self.BUCKETS_MS, latency_ms)] += 1
+            self.recent.append(latency_ms)
+
+    def percentile(self, q: float, min_samples: int = 20) -> float | None:
+        """Percentile of the recent latencies in ms, None until min_samples calls were recorded."""
+        with self.lock:
+            if len(self.recent) < min_samples:
+                return None
+            samples = sorted(self.recent)
+        return samples[int(q * (len(samples) - 1))]
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            buckets = {("+inf" if bound == float("inf") else f"le_{int(bound)}ms"): count for bound, count in zip(self.BUCKETS_MS, self.counts)}
+            calls = sum(self.counts)
+        return {
+            "calls": calls,
+            "errors": self.errors,
+            "buckets": buckets,
+            "p50_ms": self.percentile(0.5, min_samples=1),
+            "p95_ms": self.percentile(0.95, min_samples=1)
+        }
+
+# per model latency, shared by every provider of the process
+latency_histograms = {}
+latency_histograms_lock = threading.Lock()
+
+def get_latency_histogram(model: str) -> LatencyHistogram:
+    with latency_histograms_lock:
+        if model not in latency_histograms:
+            latency_histograms[model] = LatencyHistogram()
+        return latency_histograms[model]
+
+def get_latency_metrics() -> dict:
+    with latency_histograms_lock:
+        histograms = dict(latency_histograms)
+    return {model: histogram.to_dict() for model, histogram in histograms.items()}
+
+# runs the primary and hedged calls when hedging is enabled
+hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+
 class Provider:
     def __init__(self, provider_name, model, server_address="127.0.0.1:5000", is_local=False):
         self.provider_name = provider_name.lower()
         self.model = model
+        # resilience settings, see the [PROVIDER] section of config.ini
+        self.timeout = config.getfloat('PROVIDER', 'timeout', fallback=120)
+        self.deadline = config.getfloat('PROVIDER', 'deadline', fallback=300) # whole respond call, across retries and fallback models
+        self.max_retries = config.getint('PROVIDER', 'max_retries', fallback=2)
+        self.retry_backoff = config.getfloat('PROVIDER', 'retry_backoff', fallback=0.5)
+        self.hedge_after = config.get('PROVIDER', 'hedge_after', fallback="0") # p95, a delay in seconds, or 0 to disable
+        self.fallback_models = config.get('PROVIDER', 'fallback_models', fallback="").split()
+        # an OpenAI compatible endpoint, e.g. test/mock_llm_server.py for load tests
+        self.base_url = config.get('PROVIDER', 'base_url', fallback="https://api.deepinfra.com/v1/openai")
+        self.client = None
+        self.mock_llm = create_mock_llm() if self.provider_name == "mock" else None
         self.is_local = is_local
         self.server_ip = server_address
         self.server_address = server_address
         self.available_providers = {
             "openai": self.openai_fn,
-            "test": self.test_fn
+            "test": self.test_fn,
+            "mock": self.mock_fn
         }
         self.logger = Logger("provider.log")
         self.api_key = None
@@ -34,6 +120,8 @@ class Provider:
         if self.provider_name in self.unsafe_providers and self.is_local == False:
             pretty_print("Warning: you are using an API provider. You data will be sent to the cloud.", color="warning")
             self.api_key = self.get_api_key(self.provider_name)
+            # one client per provider, its connection pool is shared by the hedged calls, retries are handled by respond
+            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
         elif self.provider_name != "ollama":
             pretty_print(f"Provider: {provider_name} initialized at {self.server_ip}", color="success")
 
@@ -56,32 +144,144 @@ class Provider:
             return "http://localhost", False
         return url, True
 
-    def respond(self, history, verbose=True):
+    @traced("provider.respond")
+    def respond(self, history, verbose=True, tags: dict = None):
         """
         Use the choosen provider to generate text.
+        Args:
+            history: The messages
+            verbose: Print the answer
+            tags: org, bot_key and agent of the call, used to meter the token usage and to queue the call fairly per org
         """
         llm = self.available_providers[self.provider_name]
         self.logger.info(f"Using provider: {self.provider_name} at {self.server_ip}")
+        last_error = None
+        models = [self.model] + self.fallback_models
+        deadline = time.monotonic() + self.deadline
+        for model in models:
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ProviderError(f"Provider {self.provider_name} did not answer within {self.deadline}s: {str(last_error)}") from last_error
+                try:
+                    # the slot is released during the retry backoff so other orgs can use it
+                    with llm_scheduler.slot((tags or {}).get("org"), timeout=remaining):
+                        return self.hedged_call(llm, model, history, verbose, tags, deadline)
+                except KeyboardInterrupt:
+                    self.logger.warning("User interrupted the operation with Ctrl+C")
+                    return "Operation interrupted by user. REQUEST_EXIT"
+                except AttributeError as e:
+                    raise NotImplementedError(f"{str(e)}\nIs {self.provider_name} implemented ?")
+                except ModuleNotFoundError as e:
+                    raise ModuleNotFoundError(
+                        f"{str(e)}\nA import related to provider {self.provider_name} was not found. Is it installed ?")
+                except Exception as e:
+                    last_error = e
+                    if not self.is_retryable(e):
+                        if not self.is_model_unavailable(e):
+                            raise ProviderError(f"Provider {self.provider_name} failed with a non retryable error: {str(e)}") from e
+                        self.logger.error(f"Model {model} is unavailable: {str(e)}")
+                        break
+                    if attempt < self.max_retries:
+                        delay = min(random.uniform(0, self.retry_backoff * (2 ** attempt)), max(deadline - time.monotonic(), 0))
+                        self.logger.warning(f"Model {model} attempt {attempt + 1} failed: {str(e)}, retrying in {delay:.2f}s")
+                        time.sleep(delay)
+            if model != models[-1]:
+                self.logger.warning(f"Model {model} exhausted, falling back to the next model.")
+        raise ProviderError(f"Provider {self.provider_name} failed: {str(last_error)}") from last_error
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Timeouts, connection errors, rate limits (429) and server errors (5xx) are retried."""
+        if isinstance(error, (APITimeoutError, APIConnectionError, TimeoutError, ConnectionError)):
+            return True
+        if isinstance(error, (APIStatusError, MockLLMError)):
+            return error.status_code == 429 or error.status_code >= 500
+        message = str(error).lower()
+        return "try again later" in message or "overloaded" in message or "refused" in message
+
+    def is_model_unavailable(self, error: Exception) -> bool:
+        """Unknown or unavailable model (404), the only non retryable error the fallback models can fix."""
+        if isinstance(error, (APIStatusError, MockLLMError)):
+            return error.status_code == 404
+        message = str(error).lower()
+        return "model not found" in message or "model is not available" in message or "does not exist" in message
+
+    def get_hedge_delay(self, model: str) -> float | None:
+        """Seconds after which a duplicate request is sent, None when hedging is disabled or not enough latency samples."""
+        if self.hedge_after == "p95":
+            p95 = get_latency_histogram(model).percentile(0.95)
+            return p95 / 1000 if p95 is not None else None
+        delay = float(self.hedge_after)
+        return delay if delay > 0 else None
+
+    def timed_call(self, llm, model: str, history, verbose, tags, deadline: float, cancel: threading.Event = None) -> str:
+        """Call a model with the time left before the deadline (time.monotonic) as timeout, record its latency."""
+        histogram = get_latency_histogram(model)
+        start = time.perf_counter()
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise TimeoutError(f"Model {model} call started after the deadline")
         try:
-            thought = llm(history, verbose)
-        except KeyboardInterrupt:
-            self.logger.warning("User interrupted the operation with Ctrl+C")
-            return "Operation interrupted by user. REQUEST_EXIT"
-        except ConnectionError as e:
-            raise ConnectionError(f"{str(e)}\nConnection to {self.server_ip} failed.")
-        except AttributeError as e:
-            raise NotImplementedError(f"{str(e)}\nIs {self.provider_name} implemented ?")
-        except ModuleNotFoundError as e:
-            raise ModuleNotFoundError(
-                f"{str(e)}\nA import related to provider {self.provider_name} was not found. Is it installed ?")
-        except Exception as e:
-            if "try again later" in str(e).lower():
-                return f"{self.provider_name} server is overloaded. Please try again later."
-            if "refused" in str(e):
-                return f"Server {self.server_ip} seem offline. Unable to answer."
-            raise Exception(f"Provider {self.provider_name} failed: {str(e)}") from e
+            with span("provider.call", provider=self.provider_name, model=model, agent=(tags or {}).get("agent", "")):
+                thought = llm(history, verbose, tags, model, timeout=min(timeout, self.timeout), cancel=cancel)
+        except Exception:
+            histogram.record((time.perf_counter() - start) * 1000, success=False)
+            raise
+        histogram.record((time.perf_counter() - start) * 1000)
         return thought
 
+    def submit_call(self, calls: dict, llm, model: str, history, verbose, tags, deadline: float):
+        """Run a call in the hedge executor, calls maps the future to the event cancelling the call."""
+        cancel = threading.Event()
+        future = hedge_executor.submit(run_with_context(self.timed_call, llm, model, history, verbose, tags, deadline, cancel))
+        calls[future] = cancel
+        return future
+
+    def close_calls(self, calls: dict) -> None:
+        """Drop the calls not started yet and cancel the ones still running, they stop reading their answer."""
+        for future, cancel in calls.items():
+            future.cancel()
+            cancel.set()
+
+    def hedged_call(self, llm, model: str, history, verbose, tags, deadline: float) -> str:
+        """
+        Call a model, if no answer came after the hedge delay send a duplicate request and return the first success.
+        The duplicate holds its own scheduler slot, it is not sent when the organization has no free slot.
+        Both calls share the provider client and its connection pool, the slower call is cancelled with its cancel event.
+        Args:
+            deadline (float): time.monotonic() deadline of the whole respond call.
+        """
+        hedge_delay = self.get_hedge_delay(model)
+        if hedge_delay is None:
+            return self.timed_call(llm, model, history, verbose, tags, deadline)
+        calls = {}
+        pending = {self.submit_call(calls, llm, model, history, verbose, tags, deadline)}
+        try:
+            done, pending = wait(pending, timeout=min(hedge_delay, max(deadline - time.monotonic(), 0)))
+            if not done and time.monotonic() < deadline:
+                ticket = llm_scheduler.try_acquire((tags or {}).get("org") or "default")
+                if ticket is None:
+                    self.logger.info(f"Model {model} slower than {hedge_delay:.2f}s, no free slot for a hedged request.")
+                else:
+                    self.logger.info(f"Model {model} slower than {hedge_delay:.2f}s, sending hedged request.")
+                    hedge = self.submit_call(calls, llm, model, history, verbose, tags, deadline)
+                    hedge.add_done_callback(lambda _: llm_scheduler.release(ticket))
+                    pending.add(hedge)
+            last_error = None
+            while True:
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    last_error = future.exception()
+                if not pending:
+                    raise last_error
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Model {model} did not answer before the deadline")
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        finally:
+            self.close_calls(calls)
+
     def is_ip_online(self, address: str, timeout: int = 10) -> bool:
         """
         Check if an address is online by sending a ping request.
@@ -106,26 +306,63 @@ class Provider:
         except (subprocess.TimeoutExpired, subprocess.SubprocessError) as e:
             return False
 
-    def openai_fn(self, history, verbose=False):
+    def openai_fn(self, history, verbose=False, tags=None, model=None, timeout=None, cancel=None):
         """
         Use openai to generate text.
+        With a cancel event (hedged calls) the answer is streamed so the call can be aborted between two chunks.
         """
-        client = OpenAI(api_key=self.api_key,  base_url=f"https://api.deepinfra.com/v1/openai")
+        if self.client is None:
+            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
         try:
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=history
-            )
-            if response is None:
-                raise Exception("OpenAI response is empty.")
-            thought = response.choices[0].message.content
+            if cancel is None:
+                response = self.client.chat.completions.create(
+                    model=model or self.model,
+                    messages=history,
+                    timeout=timeout or self.timeout
+                )
+                if response is None:
+                    raise Exception("OpenAI response is empty.")
+                thought, usage = response.choices[0].message.content, response.usage
+            else:
+                thought, usage = self.openai_stream(history, model or self.model, timeout or self.timeout, cancel)
+            if usage is not None:
+                usage_meter.record_tags(tags, "chat", chat_tokens=usage.total_tokens)
             if verbose:
                 print(thought)
             return thought
+        except (APIStatusError, APITimeoutError, APIConnectionError, CancelledError):
+            raise
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}") from e
 
-    def test_fn(self, history, verbose=True):
+    def openai_stream(self, history, model: str, timeout: float, cancel: threading.Event) -> tuple:
+        """
+        Stream a chat completion on the shared client, the response is closed as soon as cancel is set.
+        Only the connection of this response is dropped, the client pool stays usable by the other calls.
+        Returns:
+            tuple: The answer and its usage, None when the endpoint does not report it.
+        """
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=history,
+            timeout=timeout,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        parts, usage = [], None
+        try:
+            for chunk in stream:
+                if cancel.is_set():
+                    raise CancelledError(f"Model {model} call cancelled, another call answered first")
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+        finally:
+            stream.close()
+        return "".join(parts), usage
+
+    def test_fn(self, history, verbose=True, tags=None, model=None, timeout=None, cancel=None):
         """
         This function is used to conduct tests.
         """
@@ -134,6 +371,19 @@ class Provider:
         """
         return thought
 
+    def mock_fn(self, history, verbose=False, tags=None, model=None, timeout=None, cancel=None):
+        """
+        Scripted answers with simulated latency and errors, see the [MOCK] section of config.ini.
+        Used to load test the whole pipeline offline.
+        """
+        agent = tags.get("agent") if tags else None
+        thought = self.mock_llm.complete(history, agent)
+        prompt_tokens, completion_tokens = self.mock_llm.count_tokens(history, thought)
+        usage_meter.record_tags(tags, "chat", chat_tokens=prompt_tokens + completion_tokens)
+        if verbose:
+            print(thought)
+        return thought
+
 
 if __name__ == "__main__":
     provider = Provider("server", "deepseek-r1:32b", " x.x.x.x:8080")
@@ -0,0 +1,189 @@
+import configparser
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from logger import Logger
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+class Ticket():
+    """A call waiting for a slot."""
+    def __init__(self, org: str, finish_tag: float):
+        self.org = org
+        self.finish_tag = finish_tag
+        self.enqueued_at = time.perf_counter()
+
+class LLMScheduler():
+    """
+    Admission control in front of the LLM provider.
+    Limits the concurrent calls globally and per organization, optionally the global call rate (token bucket),
+    and grants free slots by weighted fair queueing so a burst from one organization does not starve the others.
+    Provider calls run in worker threads, the scheduler blocks the calling thread until its call is admitted.
+    """
+    def __init__(self, max_concurrency: int = 16, per_org_concurrency: int = 4,
+                 rate_per_second: float = 0, burst: int = 10, org_weights: Dict[str, float] = None):
+        """
+        Args:
+            max_concurrency (int): Maximum concurrent calls of the process.
+            per_org_concurrency (int): Maximum concurrent calls of one organization.
+            rate_per_second (float): Maximum call rate of the process, 0 to disable the token bucket.
+            burst (int): Token bucket capacity.
+            org_weights (Dict[str, float]): Share of each organization, 1 by default.
+        """
+        self.max_concurrency = max_concurrency
+        self.per_org_concurrency = per_org_concurrency
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.org_weights = org_weights or {}
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.waiting: List[Ticket] = []
+        self.active = 0
+        self.active_per_org: Dict[str, int] = {}
+        self.last_finish: Dict[str, float] = {}
+        self.virtual_time = 0.0
+        self.cond = threading.Condition()
+        self.stats = {"granted": 0, "waited": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0, "max_queue_depth": 0}
+        self.logger = Logger("llm_scheduler.log")
+
+    def refill(self) -> None:
+        if self.rate_per_second <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate_per_second)
+        self.last_refill = now
+
+    def next_ticket(self) -> Ticket | None:
+        """Waiting ticket with the smallest finish tag among organizations under their concurrency limit."""
+        eligible = [ticket for ticket in self.waiting if self.active_per_org.get(ticket.org, 0) < self.per_org_concurrency]
+        return min(eligible, key=lambda ticket: ticket.finish_tag, default=None)
+
+    def acquire(self, org: str, timeout: float | None = None) -> Ticket:
+        """
+        Block until a call of the organization is admitted.
+        Args:
+            org (str): The organization of the call.
+            timeout (float | None): Maximum seconds to wait for a slot, None to wait indefinitely.
+        Returns:
+            Ticket: The admitted ticket, to pass to release().
+        Raises:
+            TimeoutError: If no slot was granted within the timeout.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.cond:
+            weight = self.org_weights.get(org, 1.0)
+            finish_tag = max(self.virtual_time, self.last_finish.get(org, 0.0)) + 1.0 / weight
+            self.last_finish[org] = finish_tag
+            ticket = Ticket(org, finish_tag)
+            self.waiting.append(ticket)
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self.waiting))
+            while True:
+                self.refill()
+                has_token = self.rate_per_second <= 0 or self.tokens >= 1
+                if self.active < self.max_concurrency and has_token and self.next_ticket() is ticket:
+                    break
+                wait = None if has_token else (1 - self.tokens) / self.rate_per_second
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.waiting.remove(ticket)
+                        self.cond.notify_all()
+                        raise TimeoutError(f"Call of org {org} got no slot within {timeout:.1f}s")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.cond.wait(wait)
+            self.waiting.remove(ticket)
+            self.grant(ticket, weight)
+            wait_ms = (time.perf_counter() - ticket.enqueued_at) * 1000
+            self.stats["granted"] += 1
+            self.stats["total_wait_ms"] += wait_ms
+            self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+            if wait_ms > 1:
+                self.stats["waited"] += 1
+            if wait_ms > 1000:
+                self.logger.warning(f"Call of org {org} waited {wait_ms:.0f}ms for a slot, {len(self.waiting)} still queued")
+            # the next ticket may now be eligible
+            self.cond.notify_all()
+        return ticket
+
+    def grant(self, ticket: Ticket, weight: float) -> None:
+        """Count an admitted ticket as active, the condition lock must be held."""
+        self.active += 1
+        self.active_per_org[ticket.org] = self.active_per_org.get(ticket.org, 0) + 1
+        self.virtual_time = max(self.virtual_time, ticket.finish_tag - 1.0 / weight)
+        if self.rate_per_second > 0:
+            self.tokens -= 1
+
+    def try_acquire(self, org: str) -> Ticket | None:
+        """
+        Admit a call only if a slot is free right now and no call is queued, without waiting.
+        Used for optional work such as hedged requests, which must not delay queued calls.
+        Args:
+            org (str): The organization of the call.
+        Returns:
+            Ticket | None: The admitted ticket, to pass to release(), or None when no slot is free.
+        """
+        with self.cond:
+            self.refill()
+            has_token = self.rate_per_second <= 0 or self.tokens >= 1
+            if (self.waiting or not has_token or self.active >= self.max_concurrency
+                    or self.active_per_org.get(org, 0) >= self.per_org_concurrency):
+                return None
+            weight = self.org_weights.get(org, 1.0)
+            # does not advance the fair queueing tags of the org, the call is a duplicate of an admitted one
+            ticket = Ticket(org, self.virtual_time + 1.0 / weight)
+            self.grant(ticket, weight)
+            self.stats["granted"] += 1
+            return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        with self.cond:
+            self.active -= 1
+            self.active_per_org[ticket.org] -= 1
+            if self.active_per_org[ticket.org] <= 0:
+                del self.active_per_org[ticket.org]
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, org: str | None, timeout: float | None = None):
+        """Hold a call slot for the organization for the duration of the block, see acquire for the timeout."""
+        ticket = self.acquire(org or "default", timeout)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def get_metrics(self) -> dict:
+        with self.cond:
+            queue_per_org = {}
+            for ticket in self.waiting:
+                queue_per_org[ticket.org] = queue_per_org.get(ticket.org, 0) + 1
+            return {
+                **self.stats,
+                "mean_wait_ms": self.stats["total_wait_ms"] / self.stats["granted"] if self.stats["granted"] else 0.0,
+                "queue_depth": len(self.waiting),
+                "queue_depth_per_org": queue_per_org,
+                "active": self.active,
+                "active_per_org": dict(self.active_per_org),
+                "max_concurrency": self.max_concurrency,
+                "per_org_concurrency": self.per_org_concurrency
+            }
+
+def parse_weights(text: str) -> Dict[str, float]:
+    """Parse org weights written as org:weight separated by spaces."""
+    weights = {}
+    for item in text.split():
+        org, _, weight = item.rpartition(":")
+        if org:
+            weights[org] = float(weight)
+    return weights
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=config.getint('SCHEDULER', 'max_concurrency', fallback=16),
+    per_org_concurrency=config.getint('SCHEDULER', 'per_org_concurrency', fallback=4),
+    rate_per_second=config.getfloat('SCHEDULER', 'rate_per_second', fallback=0),
+    burst=config.getint('SCHEDULER', 'burst', fallback=10),
+    org_weights=parse_weights(config.get('SCHEDULER', 'org_weights', fallback=""))
+)
@@ -1,7 +1,7 @@
 from router import AgentRouter
 from logger import Logger
 from agents import CasualAgent, BrowserAgent, CoderAgent, FileAgent, PlannerAgent, ReterivalAgent
-from browser import Browser, create_driver
+from browser import Browser, create_driver, get_navigation_profile
 from llm_provider import Provider
 from interaction import Interaction
 from dotenv import load_dotenv
@@ -38,6 +38,8 @@ def initialize_system(cid: str):
     
     # Force headless mode in Docker containers
     headless = config.getboolean('BROWSER', 'headless_browser')
+    navigation_profile = config.get('BROWSER', 'navigation_profile', fallback="fast")
+    page_load_strategy = get_navigation_profile(navigation_profile)["page_load_strategy"]
     if is_running_in_docker() and not headless:
         # Print prominent warning to console (visible in docker-compose output)
         print("\n" + "*" * 70)
@@ -65,8 +67,10 @@ def initialize_system(cid: str):
     import random
     port = random.randint(10000, 65535)
     browser = Browser(
-        create_driver(headless=headless, stealth_mode=stealth_mode, lang=languages[0], port=port),
-        anticaptcha_manual_install=stealth_mode
+        create_driver(headless=headless, stealth_mode=stealth_mode, lang=languages[0], port=port, page_load_strategy=page_load_strategy),
+        anticaptcha_manual_install=stealth_mode,
+        prefetch_tabs=config.getint('BROWSER', 'prefetch_tabs', fallback=0),
+        navigation_profile=navigation_profile
     )
     logger.info("Browser initialized")
 
@@ -97,6 +101,11 @@ def initialize_system(cid: str):
             provider=provider, verbose=False, browser=browser, cid=cid
         )
     ]
+    # agents opting in to a bounded conversation window, the others (e.g. the coder feedback loop) get their whole memory
+    windowed_agents = config.get('MAIN', 'context_window_agents', fallback="").split()
+    for agent in agents:
+        if agent.type in windowed_agents:
+            agent.context_window_turns = config.getint('MAIN', 'context_window_turns', fallback=None)
     logger.info("Agents initialized")
 
     interaction = Interaction(
@@ -6,6 +6,16 @@ from pymongo import MongoClient
 
 from utility import pretty_print, animate_thinking
 from logger import Logger
+from tracing import traced
+
+mongo_client = None
+
+def get_mongo_client() -> MongoClient:
+    """MongoClient shared by every memory of the process, it holds its own connection pool."""
+    global mongo_client
+    if mongo_client is None:
+        mongo_client = MongoClient(config.MONGO_URI)
+    return mongo_client
 
 class Memory():
     """
@@ -18,12 +28,12 @@ class Memory():
                  model_provider: str = "deepseek-r1:14b"):
         self.memory = [{'role': 'system', 'content': system_prompt}]
         self.logger = Logger("memory.log")
+        self.autosave = True # save to MongoDB on every change, disable to only save at checkpoints
         
         # MongoDB setup
-        mongo_uri = config.MONGO_URI
         mongo_db_name = config.MONGO_DB_NAME
         mongo_collection_name = "agents_chat"
-        self.client = MongoClient(mongo_uri)
+        self.client = get_mongo_client()
         self.db = self.client[mongo_db_name]
         self.collection = self.db[mongo_collection_name]
         
@@ -68,14 +78,20 @@ class Memory():
         self.model = AutoModelForSeq2SeqLM.from_pretrained("pszemraj/led-base-book-summary")
         self.logger.info("Memory compression system initialized.")
     
-    def save_memory(self) -> None:
-        """Save the session memory to MongoDB."""
+    @traced("memory.save_memory")
+    def save_memory(self, extra: dict | None = None) -> None:
+        """
+        Save the session memory to MongoDB.
+        Args:
+            extra (dict, optional): Additional fields saved in the session document along with the memory.
+        """
         self.collection.update_one(
             {'cid': self.cid},
             {'$set': {
                 'memory': self.memory,
                 'model_provider': self.model_provider,
-                'last_update': datetime.datetime.now()
+                'last_update': datetime.datetime.now(),
+                **(extra or {})
             }},
             upsert=True
         )
@@ -116,14 +132,16 @@ class Memory():
         if query:
             message['query'] = query
         self.memory.append(message)
-        self.save_memory()
+        if self.autosave:
+            self.save_memory()
         return curr_idx-1
     
     def clear(self) -> None:
         """Clear all memory except system prompt"""
         self.logger.info("Memory clear performed.")
         self.memory = self.memory[:1]
-        self.save_memory()
+        if self.autosave:
+            self.save_memory()
     
     def clear_section(self, start: int, end: int) -> None:
         """
@@ -136,11 +154,44 @@ class Memory():
         start = max(0, start) + 1
         end = min(end, len(self.memory)-1) + 2
         self.memory = self.memory[:start] + self.memory[end:]
-        self.save_memory()
+        if self.autosave:
+            self.save_memory()
     
     def get(self) -> list:
         return self.memory
 
+    def get_window(self, max_turns: int | None = None, strip_context: bool = True, keep_last_context: bool = True) -> list:
+        """
+        Messages to send to the LLM, the persisted memory is left untouched.
+        Only the last max_turns turns (a turn starts at a user message) are kept, plus the summarized messages.
+        Older user messages pushed with a query are replaced by the query, without their retrieved context.
+        Args:
+            max_turns (int, optional): Number of turns to keep, None keeps every turn.
+            strip_context (bool): Replace old user messages by their query.
+            keep_last_context (bool): Keep the full content of the last user message (the current request).
+        Returns:
+            list: The system prompt then the window, as role/content messages.
+        """
+        start = 1 if self.memory and self.memory[0]['role'] == 'system' else 0
+        system, messages = self.memory[:start], self.memory[start:]
+        user_indexes = [i for i, message in enumerate(messages) if message['role'] == 'user']
+        if max_turns is not None and len(user_indexes) > max_turns:
+            cut = user_indexes[-max_turns] if max_turns > 0 else len(messages)
+            messages = [message for message in messages[:cut] if message.get('summarized', False)] + messages[cut:]
+        last_user = max([i for i, message in enumerate(messages) if message['role'] == 'user'], default=-1)
+        window = []
+        for i, message in enumerate(messages):
+            content = message['content']
+            if strip_context and message['role'] == 'user' and 'query' in message and not (keep_last_context and i == last_user):
+                content = message['query']
+            window.append({'role': message['role'], 'content': content})
+        window = [{'role': message['role'], 'content': message['content']} for message in system] + window
+        full_tokens = sum(len(message['content']) for message in self.memory) // 4
+        window_tokens = sum(len(message['content']) for message in window) // 4
+        if full_tokens > window_tokens:
+            self.logger.info(f"Context window: ~{window_tokens} tokens sent instead of ~{full_tokens} ({100 * (full_tokens - window_tokens) // full_tokens}% saved)")
+        return window
+
     def get_cuda_device(self) -> str:
         if torch.backends.mps.is_available():
             return "mps"
@@ -193,6 +244,7 @@ class Memory():
                 continue
             if len(self.memory[i]['content']) > 1024:
                 self.memory[i]['content'] = self.summarize(self.memory[i]['content'])
+                self.memory[i]['summarized'] = True
     
     def trim_text_to_max_ctx(self, text: str) -> str:
         """
@@ -0,0 +1,146 @@
+import configparser
+import threading
+from datetime import date
+from typing import Dict, Tuple
+
+from logger import Logger
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+UsageKey = Tuple[str, str, str, date] # (organization, usage_type, bot_key, usage_date)
+
+class UsageMeter():
+    """
+    Token usage metering.
+    Provider calls record their usage in memory, aggregated per (organization, usage_type, bot_key, day),
+    a background thread flushes the aggregates to TokenMetrics with one batched INSERT ... ON CONFLICT DO UPDATE.
+    No database write happens on the request path.
+    """
+    def __init__(self, flush_interval: float = 30):
+        """
+        Args:
+            flush_interval (float): Seconds between two flushes.
+        """
+        self.flush_interval = flush_interval
+        self.pending: Dict[UsageKey, Dict[str, int]] = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {"records": 0, "skipped": 0, "flushes": 0, "rows_flushed": 0, "flush_errors": 0}
+        self.logger = Logger("metering.log")
+
+    def record(self, org: str, bot_key: str, usage_type: str = "chat",
+               chat_tokens: int = 0, embed_tokens: int = 0, api_calls: int = 1) -> None:
+        """
+        Add usage to the in memory aggregates.
+        Args:
+            org (str): Organization billed.
+            bot_key (str): Bot the usage belongs to.
+            usage_type (str): chat or knowledge_base.
+            chat_tokens (int): Prompt plus completion tokens.
+            embed_tokens (int): Embedded tokens.
+            api_calls (int): Number of provider calls.
+        """
+        if not org or not bot_key:
+            with self.lock:
+                self.stats["skipped"] += 1
+            return
+        key = (org, usage_type, bot_key, date.today())
+        with self.lock:
+            totals = self.pending.setdefault(key, {"chat_tokens": 0, "embed_tokens": 0, "api_calls": 0})
+            totals["chat_tokens"] += chat_tokens
+            totals["embed_tokens"] += embed_tokens
+            totals["api_calls"] += api_calls
+            self.stats["records"] += 1
+
+    def record_tags(self, tags: dict | None, usage_type: str = "chat", **usage) -> None:
+        """Record usage for the org and bot_key of a provider call tags."""
+        if not tags:
+            return
+        self.record(tags.get("org"), tags.get("bot_key"), usage_type, **usage)
+
+    def drain(self) -> Dict[UsageKey, Dict[str, int]]:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def restore(self, pending: Dict[UsageKey, Dict[str, int]]) -> None:
+        """Merge back aggregates that failed to flush, they are retried on the next flush."""
+        with self.lock:
+            for key, usage in pending.items():
+                totals = self.pending.setdefault(key, {"chat_tokens": 0, "embed_tokens": 0, "api_calls": 0})
+                for name, value in usage.items():
+                    totals[name] += value
+
+    def flush(self) -> int:
+        """
+        Write the pending aggregates with a single batched upsert.
+        Returns:
+            int: Number of rows written.
+        """
+        pending = self.drain()
+        if not pending:
+            return 0
+        from sqlalchemy.dialects.postgresql import insert
+        from db import SessionLocal
+        from models import TokenMetrics
+        rows = [
+            {
+                "organization": org,
+                "usage_type": usage_type,
+                "bot_key": bot_key,
+                "usage_date": usage_date,
+                **usage
+            }
+            for (org, usage_type, bot_key, usage_date), usage in pending.items()
+        ]
+        statement = insert(TokenMetrics).values(rows)
+        statement = statement.on_conflict_do_update(
+            constraint="unique_usage_per_day_per_bot",
+            set_={
+                "chat_tokens": TokenMetrics.chat_tokens + statement.excluded.chat_tokens,
+                "embed_tokens": TokenMetrics.embed_tokens + statement.excluded.embed_tokens,
+                "api_calls": TokenMetrics.api_calls + statement.excluded.api_calls
+            }
+        )
+        try:
+            with SessionLocal() as db:
+                db.execute(statement)
+                db.commit()
+        except Exception as e:
+            self.restore(pending)
+            with self.lock:
+                self.stats["flush_errors"] += 1
+            self.logger.error(f"Failed to flush {len(rows)} usage rows: {str(e)}")
+            return 0
+        with self.lock:
+            self.stats["flushes"] += 1
+            self.stats["rows_flushed"] += len(rows)
+        self.logger.info(f"Flushed {len(rows)} usage rows")
+        return len(rows)
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def start(self) -> None:
+        """Start the background flush thread, once."""
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, name="usage-meter", daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the flush thread and write the remaining usage."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval)
+            self.thread = None
+        self.flush()
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            return {**self.stats, "pending_rows": len(self.pending)}
+
+usage_meter = UsageMeter(flush_interval=config.getfloat('METERING', 'flush_interval', fallback=30))
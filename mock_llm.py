@@ -0,0 +1,211 @@
+import configparser
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterator, List
+
+from logger import Logger
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# default scripted answers, enough for every agent to complete a turn without tools looping
+DEFAULT_SCRIPTS = {
+    "casual_agent": [
+        {"response": "Hello! This is a mock answer from the casual agent."}
+    ],
+    "code_agent": [
+        {"response": "Here is the computation:\n```python\nprint(sum(range(10)))\n```"}
+    ],
+    "file_agent": [
+        {"response": "```bash\nls\n```"}
+    ],
+    "planner_agent": [
+        {"response": "```json\n{\n  \"plan\": [\n    {\"agent\": \"Casual\", \"id\": \"1\", \"need\": null, \"task\": \"Give a short introduction to the topic.\"},\n    {\"agent\": \"Casual\", \"id\": \"2\", \"need\": [\"1\"], \"task\": \"Summarize the introduction in one sentence.\"}\n  ]\n}\n```"}
+    ],
+    "browser_agent": [
+        {"match": "search engine query", "response": "mock search query"},
+        {"match": "Based on the search result", "response": "Note: the search results answer the request.\nREQUEST_EXIT"},
+        {"response": "Summary of the mock findings."}
+    ],
+    "retrival_agent": [
+        {"response": "According to the provided context, this is a mock answer."}
+    ],
+    "mcp_agent": [
+        {"response": "This is a mock answer from the MCP agent."}
+    ],
+    "default": [
+        {"response": "This is a mock answer."}
+    ]
+}
+
+# system prompt file of each agent, used to recognize the agent of a request received over HTTP
+PROMPT_AGENTS = {
+    "casual_agent.txt": "casual_agent",
+    "coder_agent.txt": "code_agent",
+    "file_agent.txt": "file_agent",
+    "planner_agent.txt": "planner_agent",
+    "browser_agent.txt": "browser_agent",
+    "retrival_agent.txt": "retrival_agent",
+    "mcp_agent.txt": "mcp_agent"
+}
+
+class MockLLMError(Exception):
+    """Injected provider failure, status_code is the HTTP status the mock server answers with."""
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+class MockLLM():
+    """
+    Stand-in LLM for load and latency testing.
+    Answers are scripted per agent, the time to first token follows a configurable distribution
+    and the answer is produced at a fixed token rate. Errors (429, 5xx, timeouts) are injected at a configurable rate.
+    """
+    def __init__(self, latency: str = "lognormal", ttft_ms: float = 400, latency_sigma: float = 0.5,
+                 tokens_per_second: float = 60, error_rate: float = 0, errors: List[str] = None,
+                 scripts: Dict[str, List[dict]] = None, seed: int | None = None, timeout: float = 120):
+        """
+        Args:
+            latency (str): Distribution of the time to first token: fixed, uniform, exponential or lognormal.
+            ttft_ms (float): Median time to first token in ms.
+            latency_sigma (float): Spread of the distribution (sigma of lognormal, relative half width of uniform).
+            tokens_per_second (float): Generation rate, 0 to answer instantly.
+            error_rate (float): Probability of a failed call.
+            errors (List[str]): Kinds of injected errors, among 429, 500, 503 and timeout.
+            scripts (Dict[str, List[dict]]): Answers per agent, each a list of {"match": regex, "response": text},
+                                              the first entry matching the last user message is used, an entry without match always matches.
+            seed (int | None): Seed of the random generator, for reproducible runs.
+            timeout (float): Seconds a timeout error hangs before failing.
+        """
+        self.latency = latency
+        self.ttft_ms = ttft_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.errors = errors or ["429", "503", "timeout"]
+        self.scripts = {**DEFAULT_SCRIPTS, **(scripts or {})}
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.prompt_fingerprints = self.load_prompt_fingerprints()
+        self.logger = Logger("mock_llm.log")
+
+    def load_prompt_fingerprints(self, directory: str = "prompts/base") -> Dict[str, str]:
+        fingerprints = {}
+        for filename, agent in PROMPT_AGENTS.items():
+            try:
+                with open(os.path.join(directory, filename), 'r', encoding="utf-8") as f:
+                    fingerprints[agent] = f.read(200).strip()
+            except OSError:
+                continue
+        return fingerprints
+
+    def detect_agent(self, messages: List[dict]) -> str:
+        """Agent of a request, recognized from its system prompt."""
+        system_prompt = next((message['content'] for message in messages if message['role'] == 'system'), "")
+        for agent, fingerprint in self.prompt_fingerprints.items():
+            if fingerprint and fingerprint in system_prompt:
+                return agent
+        return "default"
+
+    def sample_ttft(self) -> float:
+        """Time to first token in seconds."""
+        with self.lock:
+            if self.latency == "fixed":
+                ttft_ms = self.ttft_ms
+            elif self.latency == "uniform":
+                ttft_ms = self.random.uniform(self.ttft_ms * (1 - self.latency_sigma), self.ttft_ms * (1 + self.latency_sigma))
+            elif self.latency == "exponential":
+                ttft_ms = self.random.expovariate(1 / self.ttft_ms) if self.ttft_ms > 0 else 0
+            else:
+                ttft_ms = self.random.lognormvariate(math.log(max(self.ttft_ms, 1)), self.latency_sigma)
+        return max(ttft_ms, 0) / 1000
+
+    def sample_error(self) -> str | None:
+        with self.lock:
+            if self.error_rate <= 0 or self.random.random() >= self.error_rate:
+                return None
+            return self.random.choice(self.errors)
+
+    def script_response(self, messages: List[dict], agent: str | None = None) -> str:
+        """
+        Scripted answer for the agent, chosen on the last user message.
+        Args:
+            messages (List[dict]): The conversation sent to the provider.
+            agent (str | None): The agent type, detected from the system prompt when None.
+        Returns:
+            str: The answer.
+        """
+        agent = agent if agent in self.scripts else self.detect_agent(messages)
+        last_user = next((message['content'] for message in reversed(messages) if message['role'] == 'user'), "")
+        for entry in self.scripts.get(agent, self.scripts["default"]):
+            if entry.get("match") is None or re.search(entry["match"], last_user):
+                return entry["response"]
+        return self.scripts["default"][0]["response"]
+
+    def raise_error(self, error: str) -> None:
+        if error == "timeout":
+            time.sleep(self.timeout)
+            raise TimeoutError(f"Mock LLM did not answer within {self.timeout}s")
+        if error == "429":
+            raise MockLLMError(429, "Mock LLM rate limit exceeded (429), try again later")
+        raise MockLLMError(int(error), f"Mock LLM server overloaded ({error})")
+
+    def stream(self, messages: List[dict], agent: str | None = None) -> Iterator[str]:
+        """
+        Produce the answer chunk by chunk at the configured pace.
+        Args:
+            messages (List[dict]): The conversation sent to the provider.
+            agent (str | None): The agent type.
+        Returns:
+            Iterator[str]: The answer chunks (words with their trailing space).
+        """
+        error = self.sample_error()
+        time.sleep(self.sample_ttft())
+        if error is not None:
+            self.logger.info(f"Injecting error {error}")
+            self.raise_error(error)
+        text = self.script_response(messages, agent)
+        chunks = re.findall(r"\S+\s*|\s+", text)
+        # about 4 characters per token
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay * max(1, len(chunk) / 4))
+            yield chunk
+
+    def complete(self, messages: List[dict], agent: str | None = None) -> str:
+        """Full answer, after the time to first token and the generation time."""
+        return "".join(self.stream(messages, agent))
+
+    @staticmethod
+    def count_tokens(messages: List[dict], text: str) -> tuple[int, int]:
+        """Estimated prompt and completion tokens, 4 characters per token."""
+        prompt_tokens = sum(len(message.get('content') or "") for message in messages) // 4
+        return prompt_tokens, len(text) // 4
+
+def load_scripts(path: str) -> Dict[str, List[dict]]:
+    if not path:
+        return {}
+    with open(path, 'r', encoding="utf-8") as f:
+        return json.load(f)
+
+def create_mock_llm() -> MockLLM:
+    """MockLLM configured from the [MOCK] section of config.ini."""
+    seed = config.get('MOCK', 'seed', fallback="")
+    return MockLLM(
+        latency=config.get('MOCK', 'latency', fallback="lognormal"),
+        ttft_ms=config.getfloat('MOCK', 'ttft_ms', fallback=400),
+        latency_sigma=config.getfloat('MOCK', 'latency_sigma', fallback=0.5),
+        tokens_per_second=config.getfloat('MOCK', 'tokens_per_second', fallback=60),
+        error_rate=config.getfloat('MOCK', 'error_rate', fallback=0),
+        errors=config.get('MOCK', 'errors', fallback="429 503 timeout").split(),
+        scripts=load_scripts(config.get('MOCK', 'scripts', fallback="")),
+        seed=int(seed) if seed else None,
+        timeout=config.getfloat('PROVIDER', 'timeout', fallback=120)
+    )
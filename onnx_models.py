@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+from typing import Tuple
+
+from transformers import AutoTokenizer, pipeline
+
+from utility import pretty_print, animate_thinking
+from logger import Logger
+
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "./.onnx_models")
+
+logger = Logger("onnx_models.log")
+
+def is_onnx_available() -> bool:
+    try:
+        import onnxruntime
+        import optimum.onnxruntime
+        return True
+    except ImportError:
+        return False
+
+def get_quantization_config():
+    """
+    Dynamic int8 quantization config matching the CPU instruction set.
+    Returns:
+        QuantizationConfig: avx512_vnni, avx512 or avx2 dynamic quantization.
+    """
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    flags = ""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        pass
+    if "avx512_vnni" in flags:
+        return AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    if "avx512f" in flags:
+        return AutoQuantizationConfig.avx512(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+def export_quantized(model_cls, model_id: str) -> str:
+    """
+    Export a Hugging Face model to ONNX and quantize every graph to int8, once.
+    The quantized files are written next to the export as <name>_quantized.onnx.
+    The export is built in a temporary directory, the .quantized marker is written last and the directory
+    is moved into place with os.replace, so an interrupted or concurrent export never leaves a partial model in the cache.
+    Args:
+        model_cls: The optimum ORTModel class for the task.
+        model_id (str): Hugging Face model id.
+    Returns:
+        str: The directory of the exported model.
+    """
+    from optimum.onnxruntime import ORTQuantizer
+    name = model_id.replace("/", "--")
+    export_dir = os.path.join(ONNX_CACHE_DIR, name)
+    if os.path.exists(os.path.join(export_dir, ".quantized")):
+        return export_dir
+    animate_thinking(f"Exporting {model_id} to ONNX (first run only)...", color="status")
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{name}.", dir=ONNX_CACHE_DIR)
+    try:
+        model = model_cls.from_pretrained(model_id, export=True)
+        model.save_pretrained(tmp_dir)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(tmp_dir)
+        qconfig = get_quantization_config()
+        graphs = [f for f in os.listdir(tmp_dir) if f.endswith(".onnx") and not f.endswith("_quantized.onnx")]
+        for graph in graphs:
+            quantizer = ORTQuantizer.from_pretrained(tmp_dir, file_name=graph)
+            quantizer.quantize(save_dir=tmp_dir, quantization_config=qconfig)
+        open(os.path.join(tmp_dir, ".quantized"), "w").close()
+        if os.path.exists(os.path.join(export_dir, ".quantized")):
+            # another process finished the same export first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return export_dir
+        if os.path.exists(export_dir):
+            # partial export of an older version without the marker
+            shutil.rmtree(export_dir)
+        try:
+            os.replace(tmp_dir, export_dir)
+        except OSError:
+            # another process moved its export in place meanwhile
+            if not os.path.exists(os.path.join(export_dir, ".quantized")):
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return export_dir
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    logger.info(f"Exported and quantized {model_id} to {export_dir}: {graphs}")
+    return export_dir
+
+def load_zero_shot_pipeline(model_id: str):
+    """
+    Load an int8 ONNX Runtime zero-shot classification pipeline.
+    Args:
+        model_id (str): Hugging Face model id, e.g. facebook/bart-large-mnli.
+    Returns:
+        Pipeline: A zero-shot-classification pipeline with the same call interface as the torch one.
+    """
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    export_dir = export_quantized(ORTModelForSequenceClassification, model_id)
+    model = ORTModelForSequenceClassification.from_pretrained(export_dir, file_name="model_quantized.onnx")
+    tokenizer = AutoTokenizer.from_pretrained(export_dir)
+    return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer)
+
+def load_translation_model(model_id: str) -> Tuple[object, object]:
+    """
+    Load an int8 ONNX Runtime seq2seq model and its tokenizer, a drop in for MarianMTModel.generate.
+    Args:
+        model_id (str): Hugging Face model id, e.g. Helsinki-NLP/opus-mt-fr-en.
+    Returns:
+        Tuple: (tokenizer, model)
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    export_dir = export_quantized(ORTModelForSeq2SeqLM, model_id)
+    files = {
+        "encoder_file_name": "encoder_model_quantized.onnx",
+        "decoder_file_name": "decoder_model_quantized.onnx",
+        "decoder_with_past_file_name": "decoder_with_past_model_quantized.onnx"
+    }
+    files = {k: v for k, v in files.items() if os.path.exists(os.path.join(export_dir, v))}
+    model = ORTModelForSeq2SeqLM.from_pretrained(export_dir, **files)
+    tokenizer = AutoTokenizer.from_pretrained(export_dir)
+    return tokenizer, model
+
+def resolve_backend(backend: str) -> str:
+    """
+    Check the requested inference backend can be used, fall back to torch otherwise.
+    Args:
+        backend (str): torch or onnx.
+    Returns:
+        str: The backend to use.
+    """
+    if backend == "onnx" and not is_onnx_available():
+        pretty_print("ONNX backend requested but optimum[onnxruntime] is not installed, using torch.", color="warning")
+        logger.warning("optimum[onnxruntime] not installed, falling back to torch backend.")
+        return "torch"
+    if backend not in ["torch", "onnx"]:
+        pretty_print(f"Unknown inference backend {backend}, using torch.", color="warning")
+        return "torch"
+    return backend
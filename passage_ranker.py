@@ -0,0 +1,130 @@
+import math
+import re
+from collections import Counter
+from typing import List
+
+from logger import Logger
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when",
+    "where", "which", "who", "why", "with", "you", "your"
+}
+
+class PassageRanker():
+    """
+    Rank the passages of a text against a query with Okapi BM25.
+    Used to send only the query relevant part of a long web page to the LLM, within a token budget.
+    Pure python, runs on CPU in a few milliseconds for a page.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75, passage_chars: int = 600):
+        """
+        Args:
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 passage length normalization.
+            passage_chars (int): Maximum size of a passage, longer paragraphs are split on sentences.
+        """
+        self.k1 = k1
+        self.b = b
+        self.passage_chars = passage_chars
+        self.logger = Logger("passage_ranker.log")
+
+    def tokenize(self, text: str) -> List[str]:
+        return [word for word in re.findall(r'\w+', text.lower(), re.UNICODE) if word not in STOP_WORDS]
+
+    def estimate_tokens(self, text: str) -> int:
+        return len(text) // 4
+
+    def split_passages(self, text: str) -> List[str]:
+        """Split a text on blank lines, paragraphs longer than passage_chars are split on sentences."""
+        passages = []
+        for paragraph in text.split("\n\n"):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if len(paragraph) <= self.passage_chars:
+                passages.append(paragraph)
+                continue
+            buffer = ""
+            for sentence in re.split(r'(?<=[.!?。！？])\s+', paragraph):
+                if buffer and len(buffer) + len(sentence) > self.passage_chars:
+                    passages.append(buffer)
+                    buffer = ""
+                buffer = f"{buffer} {sentence}" if buffer else sentence
+            if buffer:
+                passages.append(buffer)
+        return passages
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        """
+        BM25 score of each passage for the query.
+        Args:
+            query (str): The user query.
+            passages (List[str]): The passages to score.
+        Returns:
+            List[float]: One score per passage, 0 when no query term appears.
+        """
+        query_terms = set(self.tokenize(query))
+        tokenized = [self.tokenize(passage) for passage in passages]
+        if not query_terms or not tokenized:
+            return [0.0] * len(passages)
+        avg_len = sum(len(tokens) for tokens in tokenized) / len(tokenized) or 1
+        doc_freq = Counter()
+        for tokens in tokenized:
+            doc_freq.update(query_terms.intersection(tokens))
+        n = len(tokenized)
+        scores = []
+        for tokens in tokenized:
+            freqs = Counter(tokens)
+            norm = self.k1 * (1 - self.b + self.b * len(tokens) / avg_len)
+            score = 0.0
+            for term in query_terms:
+                tf = freqs.get(term, 0)
+                if tf == 0:
+                    continue
+                idf = math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def select(self, query: str, text: str, max_tokens: int) -> str:
+        """
+        Select the most query relevant passages of a text within a token budget.
+        The first passage (usually the page title) is always kept and the selected passages keep their original order.
+        Passages without any query term are dropped, if no passage match the query the head of the text is returned.
+        Args:
+            query (str): The user query.
+            text (str): The text to filter.
+            max_tokens (int): Token budget for the returned text.
+        Returns:
+            str: The selected passages, or the text unchanged if it already fits in the budget.
+        """
+        if self.estimate_tokens(text) <= max_tokens:
+            return text
+        passages = self.split_passages(text)
+        if not passages:
+            return text
+        scores = self.score(query, passages)
+        if max(scores) == 0:
+            return text[:max_tokens * 4]
+        ranking = [0] + sorted([i for i in range(1, len(passages)) if scores[i] > 0], key=lambda i: scores[i], reverse=True)
+        selected = []
+        budget = max_tokens
+        for idx in ranking:
+            cost = self.estimate_tokens(passages[idx])
+            if cost > budget:
+                continue
+            selected.append(idx)
+            budget -= cost
+        self.logger.info(f"Selected {len(selected)}/{len(passages)} passages for query: {query[:64]}")
+        return "\n\n".join(passages[i] for i in sorted(selected))
+
+if __name__ == "__main__":
+    ranker = PassageRanker()
+    page = "\n\n".join([
+        "# Best laptops",
+        "Our team tested 40 laptops over the last six months to find the best options for students.",
+        "The RTX 4090 laptop delivers the fastest machine learning training in our benchmark.",
+        "Subscribe to our newsletter to receive the latest deals every week.",
+    ])
+    print(ranker.select("best laptop for machine learning", page, max_tokens=40))
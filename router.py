@@ -2,7 +2,13 @@ import os
 import sys
 import torch
 import random
+import shutil
+import hashlib
+import asyncio
+import threading
+import configparser
 from typing import List, Tuple, Type, Dict
+import numpy as np
 
 from transformers import pipeline
 from adaptive_classifier import AdaptiveClassifier
@@ -13,24 +19,118 @@ from agents.casual_agent import CasualAgent
 from agents.planner_agent import FileAgent
 from agents.browser_agent import BrowserAgent
 from language import LanguageUtility
+from onnx_models import resolve_backend, load_zero_shot_pipeline
+from semantic_cache import SemanticCache
 from utility import pretty_print, animate_thinking, timer_decorator
 from logger import Logger
+from tracing import traced
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# routing decisions shared by the routers of every session
+routing_cache = SemanticCache(
+    "routing",
+    max_entries=config.getint('ROUTER', 'cache_size', fallback=2048),
+    ttl=config.getfloat('ROUTER', 'cache_ttl', fallback=3600),
+    similarity_threshold=config.getfloat('ROUTER', 'cache_similarity', fallback=0.95)
+)
+
+LLM_ROUTER_PATH = "./llm_router"
+ROUTER_STATE_DIR = os.path.join(LLM_ROUTER_PATH, "cache")
+
+# routing models loaded once per process, keyed by supported languages
+shared_models = {}
+shared_models_lock = threading.Lock()
+
+class SentenceEncoder():
+    """
+    Mean pooled sentence embeddings from the transformer of the LLM router (its public model and tokenizer),
+    the weights are shared with the router. Used for the semantic tier of the routing cache.
+    """
+    def __init__(self, model, tokenizer, max_length: int = 128):
+        """
+        Args:
+            model: The transformer of the LLM router.
+            tokenizer: Its tokenizer.
+            max_length (int): Maximum tokens per sentence.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of sentences in one forward pass.
+        Returns:
+            np.ndarray: One embedding per row.
+        """
+        device = next(self.model.parameters()).device
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="pt").to(device)
+        with torch.no_grad():
+            hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        return ((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)).float().cpu().numpy()
 
 class AgentRouter:
     """
     AgentRouter is a class that selects the appropriate agent based on the user query.
     """
-    def __init__(self, agents: list, supported_language: List[str] = ["en", "fr", "zh"]):
+    def __init__(self, agents: list, supported_language: List[str] = ["en", "fr", "zh"], inference_backend: str = None):
         self.agents = agents
         self.logger = Logger("router.log")
-        self.lang_analysis = LanguageUtility(supported_language=supported_language)
-        self.pipelines = self.load_pipelines()
-        self.talk_classifier = self.load_llm_router()
-        self.complexity_classifier = self.load_llm_router()
-        self.learn_few_shots_tasks()
-        self.learn_few_shots_complexity()
+        self.lang_analysis = None
+        self.pipelines = None
+        self.talk_classifier = None
+        self.complexity_classifier = None
+        self.encoder = None
+        # torch or onnx (int8 quantized ONNX Runtime BART and Marian), the adaptive classifiers always run on torch
+        self.inference_backend = resolve_backend(inference_backend or config.get('ROUTER', 'inference_backend', fallback="torch"))
+        # translate: non English queries are translated with Marian before classification
+        # multilingual: non English queries skip translation and are classified by a multilingual zero-shot model only
+        self.routing_mode = config.get('ROUTER', 'routing_mode', fallback="translate")
+        default_zero_shot = "MoritzLaurer/mDeBERTa-v3-base-mnli-xnli" if self.routing_mode == "multilingual" else "facebook/bart-large-mnli"
+        self.zero_shot_model = config.get('ROUTER', 'zero_shot_model', fallback=default_zero_shot)
+        self.models_key = (tuple(sorted(supported_language)), self.inference_backend, self.routing_mode, self.zero_shot_model)
+        self.load_shared_models(supported_language)
         self.asked_clarify = False
+        self.cache = routing_cache
+        # skip BART when the LLM router confidence reach this threshold, None always vote
+        self.cascade_threshold = config.getfloat('ROUTER', 'cascade_threshold', fallback=None)
+        self.vote_stats = {"bart_calls": 0, "bart_skipped": 0}
     
+    def load_shared_models(self, supported_language: List[str]) -> None:
+        """
+        Load the routing models, shared by the routers of every session in the process.
+        The first router loads the models and learn the few shots examples, the next ones reuse them.
+        Args:
+            supported_language (List[str]): Languages for the translation models.
+        """
+        with shared_models_lock:
+            if self.models_key not in shared_models:
+                self.lang_analysis = LanguageUtility(
+                    supported_language=supported_language,
+                    backend=self.inference_backend,
+                    load_translators=self.routing_mode != "multilingual",
+                    min_confidence=config.getfloat('ROUTER', 'language_confidence', fallback=0.8)
+                )
+                self.pipelines = self.load_pipelines()
+                self.talk_classifier = self.load_trained_router("tasks", self.few_shots_tasks())
+                self.complexity_classifier = self.load_trained_router("complexity", self.few_shots_complexity())
+                shared_models[self.models_key] = {
+                    "lang_analysis": self.lang_analysis,
+                    "pipelines": self.pipelines,
+                    "talk_classifier": self.talk_classifier,
+                    "complexity_classifier": self.complexity_classifier,
+                    "encoder": SentenceEncoder(self.talk_classifier.model, self.talk_classifier.tokenizer)
+                }
+            models = shared_models[self.models_key]
+        self.lang_analysis = models["lang_analysis"]
+        self.pipelines = models["pipelines"]
+        self.talk_classifier = models["talk_classifier"]
+        self.complexity_classifier = models["complexity_classifier"]
+        self.encoder = models["encoder"]
+
     def load_pipelines(self) -> Dict[str, Type[pipeline]]:
         """
         Load the pipelines for the text classification used for routing.
@@ -38,8 +138,16 @@ class AgentRouter:
             Dict[str, Type[pipeline]]: The loaded pipelines
         """
         animate_thinking("Loading zero-shot pipeline...", color="status")
+        if self.inference_backend == "onnx":
+            try:
+                return {
+                    "zero_shot": load_zero_shot_pipeline(self.zero_shot_model)
+                }
+            except Exception as e:
+                pretty_print(f"Failed to load ONNX zero-shot pipeline, using torch: {str(e)}", color="warning")
+                self.logger.warning(f"ONNX zero-shot pipeline load failed: {str(e)}")
         return {
-            "bart": pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+            "zero_shot": pipeline("zero-shot-classification", model=self.zero_shot_model)
         }
 
     def load_llm_router(self) -> AdaptiveClassifier:
@@ -50,7 +158,7 @@ class AgentRouter:
         exceptions:
             Exception: If the safetensors fails to load
         """
-        path = "./llm_router"
+        path = LLM_ROUTER_PATH
         try:
             animate_thinking("Loading LLM router model...", color="status")
             talk_classifier = AdaptiveClassifier.from_pretrained(path)
@@ -66,12 +174,71 @@ class AgentRouter:
         else:
             return "cpu"
     
-    def learn_few_shots_complexity(self) -> None:
+    def router_state_path(self, kind: str, few_shots: List[Tuple[str, str]]) -> str:
+        """
+        Path of a trained router state, keyed by a hash of the few shots examples and of the base router weights.
+        Args:
+            kind (str): tasks or complexity
+            few_shots (List[Tuple[str, str]]): The (text, label) examples
+        Returns:
+            str: The state directory
+        """
+        digest = hashlib.sha256()
+        for text, label in sorted(few_shots):
+            digest.update(f"{label}\t{text}\n".encode("utf-8"))
+        for name in ["config.json", "model.safetensors"]:
+            with open(os.path.join(LLM_ROUTER_PATH, name), "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        return os.path.join(ROUTER_STATE_DIR, f"{kind}-{digest.hexdigest()[:16]}")
+
+    def load_trained_router(self, kind: str, few_shots: List[Tuple[str, str]]) -> AdaptiveClassifier:
+        """
+        Load a router trained on the few shots examples from disk, train and save it if the examples or the base weights changed.
+        The saved safetensors are memory mapped on load.
+        Args:
+            kind (str): tasks or complexity
+            few_shots (List[Tuple[str, str]]): The (text, label) examples
+        Returns:
+            AdaptiveClassifier: The trained router
+        """
+        path = self.router_state_path(kind, few_shots)
+        if os.path.exists(os.path.join(path, "model.safetensors")):
+            try:
+                animate_thinking(f"Loading trained {kind} router...", color="status")
+                classifier = AdaptiveClassifier.from_pretrained(path)
+                self.logger.info(f"Loaded trained {kind} router from {path}")
+                return classifier
+            except Exception as e:
+                self.logger.warning(f"Failed to load trained {kind} router from {path}, retraining: {str(e)}")
+        classifier = self.load_llm_router()
+        self.learn_few_shots(classifier, few_shots)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        try:
+            os.makedirs(ROUTER_STATE_DIR, exist_ok=True)
+            classifier.save(tmp_path)
+            os.replace(tmp_path, path)
+            self.logger.info(f"Saved trained {kind} router to {path}")
+        except Exception as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            self.logger.warning(f"Failed to save trained {kind} router to {path}: {str(e)}")
+        return classifier
+
+    def learn_few_shots(self, classifier: AdaptiveClassifier, few_shots: List[Tuple[str, str]]) -> None:
+        """
+        Few shot learning with the build in add_examples method of the Adaptive_classifier.
+        """
+        few_shots = list(few_shots)
+        random.shuffle(few_shots)
+        texts = [text for text, _ in few_shots]
+        labels = [label for _, label in few_shots]
+        classifier.add_examples(texts, labels)
+
+    def few_shots_complexity(self) -> List[Tuple[str, str]]:
         """
-        Few shot learning for complexity estimation.
-        Use the build in add_examples method of the Adaptive_classifier.
+        Few shot examples for complexity estimation.
         """
-        few_shots = [
+        return [
             ("hi", "LOW"),
             ("How it's going ?", "LOW"),
             ("What’s the weather like today?", "LOW"),
@@ -195,17 +362,12 @@ class AgentRouter:
             ("Create a Node.js app to query a public API for event listings and display them", "HIGH"),
             ("Find a file named ‘budget.xlsx’, analyze its data, and generate a chart", "HIGH"),
         ]
-        random.shuffle(few_shots)
-        texts = [text for text, _ in few_shots]
-        labels = [label for _, label in few_shots]
-        self.complexity_classifier.add_examples(texts, labels)
 
-    def learn_few_shots_tasks(self) -> None:
+    def few_shots_tasks(self) -> List[Tuple[str, str]]:
         """
-        Few shot learning for tasks classification.
-        Use the build in add_examples method of the Adaptive_classifier.
+        Few shot examples for tasks classification.
         """
-        few_shots = [
+        return [
             ("Write a python script to check if the device on my network is connected to the internet", "coding"),
             ("Hey could you search the web for the latest news on the tesla stock market ?", "web"),
             ("I would like you to search for weather api", "web"),
@@ -390,10 +552,6 @@ class AgentRouter:
             ("Get me all text snippets mentioning 'performance report'.", "retrieval"),
             ("Current dispute between thailand and combodia", "retrieval")
         ]
-        random.shuffle(few_shots)
-        texts = [text for text, _ in few_shots]
-        labels = [label for _, label in few_shots]
-        self.talk_classifier.add_examples(texts, labels)
 
     def llm_router(self, text: str) -> tuple:
         """
@@ -401,10 +559,22 @@ class AgentRouter:
         Args:
             text: The input text
         """
-        predictions = self.talk_classifier.predict(text)
-        predictions = [pred for pred in predictions if pred[0] not in ["HIGH", "LOW"]]
-        predictions = sorted(predictions, key=lambda x: x[1], reverse=True)
-        return predictions[0]
+        return self.llm_router_batch([text])[0]
+
+    def llm_router_batch(self, texts: List[str]) -> List[tuple]:
+        """
+        Batched inference of the LLM router model.
+        Args:
+            texts: The input texts
+        Returns:
+            List[tuple]: The best (label, confidence) for each text
+        """
+        results = []
+        for predictions in self.talk_classifier.predict_batch(texts):
+            predictions = [pred for pred in predictions if pred[0] not in ["HIGH", "LOW"]]
+            predictions = sorted(predictions, key=lambda x: x[1], reverse=True)
+            results.append(predictions[0])
+        return results
     
     def router_vote(self, text: str, labels: list, log_confidence:bool = False) -> str:
         """
@@ -415,18 +585,50 @@ class AgentRouter:
         Returns:
             str: The selected label
         """
-        if len(text) <= 8:
-            return "talk"
-        result_bart = self.pipelines['bart'](text, labels)
-        result_llm_router = self.llm_router(text)
-        bart, confidence_bart = result_bart['labels'][0], result_bart['scores'][0]
-        llm_router, confidence_llm_router = result_llm_router[0], result_llm_router[1]
-        final_score_bart = confidence_bart / (confidence_bart + confidence_llm_router)
-        final_score_llm = confidence_llm_router / (confidence_bart + confidence_llm_router)
-        self.logger.info(f"Routing Vote for text {text}: BART: {bart} ({final_score_bart}) LLM-router: {llm_router} ({final_score_llm})")
-        if log_confidence:
-            pretty_print(f"Agent choice -> BART: {bart} ({final_score_bart}) LLM-router: {llm_router} ({final_score_llm})")
-        return bart if final_score_bart > final_score_llm else llm_router
+        return self.router_vote_batch([text], labels, log_confidence)[0]
+
+    def router_vote_batch(self, texts: List[str], labels: list, log_confidence:bool = False, zero_shot_only: List[bool] = None) -> List[str]:
+        """
+        Vote between the LLM router and BART model for a batch of texts, one forward pass per model.
+        The LLM router runs first, in cascade mode BART is only invoked for the texts where the LLM router confidence is below cascade_threshold.
+        Args:
+            texts: The input texts
+            labels: The labels to classify
+            zero_shot_only: Texts only classified by the zero-shot model, e.g. non English texts in multilingual mode
+        Returns:
+            List[str]: The selected label for each text
+        """
+        selected = ["talk" if len(text) <= 8 else None for text in texts]
+        zero_shot_only = zero_shot_only or [False] * len(texts)
+        to_route = [i for i, label in enumerate(selected) if label is None and not zero_shot_only[i]]
+        to_vote = [(i, None, 0.0) for i, label in enumerate(selected) if label is None and zero_shot_only[i]]
+        results_llm_router = self.llm_router_batch([texts[i] for i in to_route]) if to_route else []
+        for i, (llm_router, confidence_llm_router) in zip(to_route, results_llm_router):
+            if self.cascade_threshold is not None and confidence_llm_router >= self.cascade_threshold:
+                self.vote_stats["bart_skipped"] += 1
+                self.logger.info(f"Routing cascade for text {texts[i]}: LLM-router: {llm_router} ({confidence_llm_router}), BART skipped")
+                selected[i] = llm_router
+            else:
+                to_vote.append((i, llm_router, confidence_llm_router))
+        if not to_vote:
+            return selected
+        self.vote_stats["bart_calls"] += len(to_vote)
+        results_bart = self.pipelines['zero_shot']([texts[i] for i, _, _ in to_vote], labels, batch_size=min(32, len(to_vote) * len(labels)))
+        if isinstance(results_bart, dict):
+            results_bart = [results_bart]
+        for (i, llm_router, confidence_llm_router), result_bart in zip(to_vote, results_bart):
+            bart, confidence_bart = result_bart['labels'][0], result_bart['scores'][0]
+            if llm_router is None:
+                self.logger.info(f"Zero-shot only routing for text {texts[i]}: {bart} ({confidence_bart})")
+                selected[i] = bart
+                continue
+            final_score_bart = confidence_bart / (confidence_bart + confidence_llm_router)
+            final_score_llm = confidence_llm_router / (confidence_bart + confidence_llm_router)
+            self.logger.info(f"Routing Vote for text {texts[i]}: BART: {bart} ({final_score_bart}) LLM-router: {llm_router} ({final_score_llm})")
+            if log_confidence:
+                pretty_print(f"Agent choice -> BART: {bart} ({final_score_bart}) LLM-router: {llm_router} ({final_score_llm})")
+            selected[i] = bart if final_score_bart > final_score_llm else llm_router
+        return selected
     
     def find_first_sentence(self, text: str) -> str:
         first_sentence = None
@@ -445,24 +647,37 @@ class AgentRouter:
         Returns:
         str: The estimated complexity
         """
+        return self.estimate_complexity_batch([text])[0]
+
+    def estimate_complexity_batch(self, texts: List[str]) -> List[str]:
+        """
+        Estimate the complexity of a batch of texts in one forward pass.
+        Args:
+            texts: The input texts
+        Returns:
+            List[str]: The estimated complexity for each text
+        """
         try:
-            predictions = self.complexity_classifier.predict(text)
+            batch_predictions = self.complexity_classifier.predict_batch(texts)
         except Exception as e:
             pretty_print(f"Error in estimate_complexity: {str(e)}", color="failure")
-            return "LOW"
-        predictions = sorted(predictions, key=lambda x: x[1], reverse=True)
-        if len(predictions) == 0:
-            return "LOW"
-        complexity, confidence = predictions[0][0], predictions[0][1]
-        if confidence < 0.5:
-            self.logger.info(f"Low confidence in complexity estimation: {confidence}")
-            return "HIGH"
-        if complexity == "HIGH":
-            return "HIGH"
-        elif complexity == "LOW":
-            return "LOW"
-        pretty_print(f"Failed to estimate the complexity of the text.", color="failure")
-        return "LOW"
+            return ["LOW"] * len(texts)
+        complexities = []
+        for predictions in batch_predictions:
+            predictions = sorted(predictions, key=lambda x: x[1], reverse=True)
+            if len(predictions) == 0:
+                complexities.append("LOW")
+                continue
+            complexity, confidence = predictions[0][0], predictions[0][1]
+            if confidence < 0.5:
+                self.logger.info(f"Low confidence in complexity estimation: {confidence}")
+                complexities.append("HIGH")
+            elif complexity in ["HIGH", "LOW"]:
+                complexities.append(complexity)
+            else:
+                pretty_print(f"Failed to estimate the complexity of the text.", color="failure")
+                complexities.append("LOW")
+        return complexities
     
     def find_planner_agent(self) -> Agent:
         """
@@ -477,31 +692,108 @@ class AgentRouter:
         self.logger.error("Planner agent not found.")
         return None
     
-    def select_agent(self, text: str) -> Agent:
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
         """
-        Select the appropriate agent based on the text.
+        Sentence embeddings from the shared encoder, used for the semantic tier of the routing cache.
+        """
+        return self.encoder.encode(texts)
+
+    def classify(self, text: str) -> str:
+        """
+        Run the routing models on a query.
         Args:
-            text (str): The text to select the agent from
+            text (str): The first sentence of the user query
         Returns:
-            Agent: The selected agent
+            str: The role of the selected agent
         """
-        assert len(self.agents) > 0, "No agents available."
-        if len(self.agents) == 1:
-            return self.agents[0]
-        lang = self.lang_analysis.detect_language(text)
-        text = self.find_first_sentence(text)
-        text = self.lang_analysis.translate(text, lang)
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: List[str]) -> List[str]:
+        """
+        Run the routing models on a batch of queries, one batched forward pass per model.
+        Args:
+            texts (List[str]): The first sentence of each user query
+        Returns:
+            List[str]: The role of the selected agent for each query
+        """
+        detections = [self.lang_analysis.detect_language_with_confidence(text) for text in texts]
+        foreign = [self.lang_analysis.needs_translation(lang, confidence) for lang, confidence in detections]
+        if self.routing_mode != "multilingual":
+            texts = self.lang_analysis.translate_batch(texts, [lang if translate else "en" for (lang, _), translate in zip(detections, foreign)])
+            foreign = [False] * len(texts)
         labels = [agent.role for agent in self.agents]
-        complexity = self.estimate_complexity(text)
-        if complexity == "HIGH":
-            pretty_print(f"Complex task detected, routing to planner agent.", color="info")
-            return self.find_planner_agent()
-        try:
-            best_agent = self.router_vote(text, labels, log_confidence=False)
-        except Exception as e:
-            raise e
+        complexities = self.estimate_complexity_batch(texts)
+        roles = [None] * len(texts)
+        planner = self.find_planner_agent() if "HIGH" in complexities else None
+        for i, complexity in enumerate(complexities):
+            if complexity == "HIGH":
+                pretty_print(f"Complex task detected, routing to planner agent.", color="info")
+                roles[i] = planner.role if planner else None
+        to_vote = [i for i, complexity in enumerate(complexities) if complexity != "HIGH"]
+        if to_vote:
+            votes = self.router_vote_batch([texts[i] for i in to_vote], labels, log_confidence=False, zero_shot_only=[foreign[i] for i in to_vote])
+            for i, role in zip(to_vote, votes):
+                roles[i] = role
+        return roles
+
+    @property
+    def batch_key(self) -> tuple:
+        """Routers with the same batch key share models and labels, their queries can be routed in the same batch."""
+        return (self.models_key, self.cache_namespace, self.cascade_threshold)
+
+    @property
+    def cache_namespace(self) -> str:
+        return ",".join(sorted(str(agent.role) for agent in self.agents))
+
+    def route(self, text: str) -> str:
+        """
+        Routing decision for a query, served from the routing cache when the same
+        or a near identical first sentence was already routed.
+        Args:
+            text (str): The user query
+        Returns:
+            str: The role of the selected agent
+        """
+        return self.route_batch([text])[0]
+
+    def route_batch(self, texts: List[str]) -> List[str]:
+        """
+        Routing decisions for a batch of queries, only the routing cache misses go through the models.
+        Args:
+            texts (List[str]): The user queries
+        Returns:
+            List[str]: The role of the selected agent for each query
+        """
+        namespace = self.cache_namespace
+        first_sentences = [self.find_first_sentence(text) for text in texts]
+        roles = [None] * len(texts)
+        misses = []
+        cached = self.cache.lookup_batch(first_sentences, namespace, embed=self.embed_batch)
+        for i, (role, embedding) in enumerate(cached):
+            if role is not None:
+                self.logger.info(f"Routing cache hit for {first_sentences[i]}: {role}")
+                roles[i] = role
+            else:
+                misses.append((i, embedding))
+        if misses:
+            classified = self.classify_batch([first_sentences[i] for i, _ in misses])
+            for (i, embedding), role in zip(misses, classified):
+                roles[i] = role
+                if role is not None:
+                    self.cache.put(first_sentences[i], role, embedding, namespace)
+            self.logger.info(f"Routing cache metrics: {self.cache.get_metrics()}")
+        return roles
+
+    def resolve_agent(self, role: str) -> Agent:
+        """
+        Find the agent of this router matching a routing decision.
+        Args:
+            role (str): The role returned by the routing
+        Returns:
+            Agent: The selected agent
+        """
         for agent in self.agents:
-            if best_agent == agent.role:
+            if role == agent.role:
                 role_name = agent.role
                 pretty_print(f"Selected agent: {agent.agent_name} (roles: {role_name})", color="warning")
                 return agent
@@ -509,6 +801,114 @@ class AgentRouter:
         self.logger.error("No agent selected.")
         return None
 
+    @traced("router.select_agent")
+    def select_agent(self, text: str) -> Agent:
+        """
+        Select the appropriate agent based on the text.
+        Args:
+            text (str): The text to select the agent from
+        Returns:
+            Agent: The selected agent
+        """
+        assert len(self.agents) > 0, "No agents available."
+        if len(self.agents) == 1:
+            return self.agents[0]
+        return self.resolve_agent(self.route(text))
+
+    @traced("router.select_agent")
+    async def aselect_agent(self, text: str) -> Agent:
+        """
+        Select the appropriate agent through the routing batcher,
+        the query is routed together with the queries of other sessions arriving at the same time.
+        Args:
+            text (str): The text to select the agent from
+        Returns:
+            Agent: The selected agent
+        """
+        assert len(self.agents) > 0, "No agents available."
+        if len(self.agents) == 1:
+            return self.agents[0]
+        role = await routing_batcher.route(self, text)
+        return self.resolve_agent(role)
+
+class RoutingBatcher:
+    """
+    Micro-batching of routing requests across sessions.
+    Queries arriving within window_ms of each other are routed together with one batched forward pass per model,
+    each caller awaits its own future.
+    """
+    def __init__(self, window_ms: float = 5, max_batch: int = 16):
+        """
+        Args:
+            window_ms (float): How long the first query of a batch waits for other queries.
+            max_batch (int): Maximum number of queries in a batch.
+        """
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = None
+        self.worker = None
+        self.logger = Logger("router.log")
+
+    def ensure_worker(self) -> None:
+        """Start the batching worker on the running event loop."""
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.get_running_loop().create_task(self.run())
+
+    async def route(self, router: AgentRouter, text: str) -> str:
+        """
+        Queue a query and wait for its routing decision.
+        Args:
+            router (AgentRouter): The router of the session
+            text (str): The user query
+        Returns:
+            str: The role of the selected agent
+        """
+        self.ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((router, text, future))
+        return await future
+
+    async def collect(self) -> list:
+        """Wait for a first query then collect the queries arriving within the batching window."""
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self) -> None:
+        while True:
+            batch = await self.collect()
+            groups = {}
+            for router, text, future in batch:
+                groups.setdefault(router.batch_key, []).append((router, text, future))
+            for items in groups.values():
+                router = items[0][0]
+                try:
+                    roles = await asyncio.to_thread(router.route_batch, [text for _, text, _ in items])
+                except Exception as e:
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.logger.info(f"Routed a batch of {len(items)} queries")
+                for (_, _, future), role in zip(items, roles):
+                    if not future.done():
+                        future.set_result(role)
+
+routing_batcher = RoutingBatcher(
+    window_ms=config.getfloat('ROUTER', 'batch_window_ms', fallback=5),
+    max_batch=config.getint('ROUTER', 'batch_size', fallback=16)
+)
+
 if __name__ == "__main__":
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     agents = [
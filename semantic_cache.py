@@ -0,0 +1,226 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Tuple
+
+import numpy as np
+
+from logger import Logger
+
+class SemanticCache():
+    """
+    Two tier cache shared between sessions.
+    Lookups first try an exact match on the normalized key, then a cosine similarity match on embeddings.
+    Entries expire after ttl seconds and the least recently used entries are evicted past max_entries.
+    Entries are grouped by namespace, a semantic match never crosses namespaces.
+    Embeddings are kept as rows of a matrix, a semantic lookup is one matrix product over the entries.
+    """
+    def __init__(self, name: str, max_entries: int = 2048, ttl: float = 3600, similarity_threshold: float = 0.95):
+        """
+        Args:
+            name (str): Name of the cache, used for the log file.
+            max_entries (int): Maximum number of entries before LRU eviction.
+            ttl (float): Time to live of an entry in seconds.
+            similarity_threshold (float): Minimum cosine similarity for a semantic hit.
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict() # (namespace, key) -> (value, embedding, timestamp)
+        # semantic tier: one matrix row per entry with an embedding, grown by doubling up to max_entries rows
+        self.matrix = None
+        self.row_namespace = None # namespace id of each row, -1 for a free row
+        self.row_time = None # timestamp of each row
+        self.row_keys = [] # entry key of each row
+        self.rows = {} # entry key -> row
+        self.free_rows = []
+        self.namespace_ids = {}
+        self.lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+        self.logger = Logger(f"{name}_cache.log")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, collapse whitespaces and strip surrounding punctuation."""
+        text = ' '.join(text.lower().split())
+        return re.sub(r'^[\W_]+|[\W_]+$', '', text, flags=re.UNICODE)
+
+    def is_expired(self, timestamp: float, now: float) -> bool:
+        return now - timestamp > self.ttl
+
+    def grow_matrix(self, dimension: int) -> None:
+        """Allocate the embedding rows, or double them up to max_entries, the lock must be held."""
+        size = 0 if self.matrix is None else self.matrix.shape[0]
+        capacity = min(max(64, size * 2), max(self.max_entries, 1))
+        matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        row_namespace = np.full(capacity, -1, dtype=np.int32)
+        row_time = np.zeros(capacity, dtype=np.float64)
+        if size:
+            matrix[:size] = self.matrix
+            row_namespace[:size] = self.row_namespace
+            row_time[:size] = self.row_time
+        self.matrix, self.row_namespace, self.row_time = matrix, row_namespace, row_time
+        self.row_keys.extend([None] * (capacity - size))
+        self.free_rows.extend(range(capacity - 1, size - 1, -1))
+
+    def assign_row(self, key: tuple, embedding: np.ndarray | None, now: float) -> None:
+        """Store the embedding of an entry in the matrix, the lock must be held."""
+        if embedding is None:
+            return
+        if self.matrix is not None and embedding.shape[0] != self.matrix.shape[1]:
+            self.logger.warning(f"Embedding dimension {embedding.shape[0]} does not match the cache ({self.matrix.shape[1]}), exact match only")
+            return
+        if not self.free_rows:
+            self.grow_matrix(embedding.shape[0])
+        row = self.free_rows.pop()
+        self.matrix[row] = embedding
+        self.row_namespace[row] = self.namespace_ids.setdefault(key[0], len(self.namespace_ids))
+        self.row_time[row] = now
+        self.row_keys[row] = key
+        self.rows[key] = row
+
+    def release_row(self, key: tuple) -> None:
+        """Free the matrix row of an entry, the lock must be held."""
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        self.row_namespace[row] = -1
+        self.row_keys[row] = None
+        self.free_rows.append(row)
+
+    def remove_entry(self, key: tuple) -> None:
+        del self.entries[key]
+        self.release_row(key)
+
+    def find_similar(self, embeddings: List[np.ndarray | None], namespace: str, now: float) -> List[Any]:
+        """
+        Values of the most similar entries above the similarity threshold, the lock must be held.
+        Args:
+            embeddings (List[np.ndarray | None]): Unit embeddings of the queries, None for a query without embedding.
+            namespace (str): Entries group the lookup is restricted to.
+            now (float): Current time, expired entries never match.
+        Returns:
+            List[Any]: The value of the best match of each query, or None.
+        """
+        values = [None] * len(embeddings)
+        namespace_id = self.namespace_ids.get(namespace)
+        if self.matrix is None or namespace_id is None:
+            return values
+        queries = [i for i, embedding in enumerate(embeddings) if embedding is not None and embedding.shape[0] == self.matrix.shape[1]]
+        candidates = np.flatnonzero((self.row_namespace == namespace_id) & (now - self.row_time <= self.ttl))
+        if not queries or candidates.size == 0:
+            return values
+        scores = np.stack([embeddings[i] for i in queries]) @ self.matrix[candidates].T
+        best = scores.argmax(axis=1)
+        for i, column, score in zip(queries, best, scores[np.arange(len(queries)), best]):
+            if score >= self.similarity_threshold:
+                values[i] = self.entries[self.row_keys[candidates[column]]][0]
+        return values
+
+    def to_unit_vector(self, embedding) -> np.ndarray | None:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def lookup(self, key: str, namespace: str = "", embed: Callable[[], Any] | None = None) -> Tuple[Any, np.ndarray | None]:
+        """
+        Look up a value, exact tier first then semantic tier.
+        Args:
+            key (str): The cache key, normalized with normalize().
+            namespace (str): Entries group the lookup is restricted to.
+            embed (Callable, optional): Compute the key embedding, only called on an exact miss.
+        Returns:
+            Tuple[Any, np.ndarray | None]: The cached value or None, and the embedding if it was computed (reuse it for put).
+        """
+        embed_batch = (lambda _: [embed()]) if embed is not None else None
+        return self.lookup_batch([key], namespace, embed=embed_batch)[0]
+
+    def lookup_batch(self, keys: List[str], namespace: str = "", embed: Callable[[List[str]], Any] | None = None) -> List[Tuple[Any, np.ndarray | None]]:
+        """
+        Look up several values, the exact misses are embedded in one call and matched with one matrix product.
+        Args:
+            keys (List[str]): The cache keys, normalized with normalize().
+            namespace (str): Entries group the lookup is restricted to.
+            embed (Callable, optional): Compute the embeddings of a list of keys, only called with the exact misses.
+        Returns:
+            List[Tuple[Any, np.ndarray | None]]: For each key, the cached value or None and the embedding if it was computed.
+        """
+        now = time.time()
+        results = [(None, None)] * len(keys)
+        misses = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                entry_key = (namespace, self.normalize(key))
+                entry = self.entries.get(entry_key, None)
+                if entry is not None and not self.is_expired(entry[2], now):
+                    self.entries.move_to_end(entry_key)
+                    self.stats["exact_hits"] += 1
+                    results[i] = (entry[0], entry[1])
+                else:
+                    misses.append(i)
+        if not misses:
+            return results
+        embeddings = [None] * len(misses)
+        if embed is not None:
+            try:
+                embeddings = [self.to_unit_vector(embedding) for embedding in embed([keys[i] for i in misses])]
+            except Exception as e:
+                self.logger.warning(f"Failed to compute embedding: {str(e)}")
+        with self.lock:
+            values = self.find_similar(embeddings, namespace, now)
+            for i, embedding, value in zip(misses, embeddings, values):
+                self.stats["semantic_hits" if value is not None else "misses"] += 1
+                results[i] = (value, embedding)
+        return results
+
+    def put(self, key: str, value: Any, embedding=None, namespace: str = "") -> None:
+        """Store a value, evicting expired then least recently used entries if the cache is full."""
+        key = (namespace, self.normalize(key))
+        embedding = self.to_unit_vector(embedding)
+        now = time.time()
+        with self.lock:
+            self.release_row(key)
+            self.entries[key] = (value, embedding, now)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                expired = [k for k, (_, _, timestamp) in self.entries.items() if self.is_expired(timestamp, now)]
+                for k in expired:
+                    self.remove_entry(k)
+                while len(self.entries) > self.max_entries:
+                    self.remove_entry(next(iter(self.entries)))
+                    self.stats["evictions"] += 1
+            self.assign_row(key, embedding, now)
+
+    def invalidate(self, namespace: str | None = None, prefix: bool = False) -> int:
+        """
+        Remove the entries of a namespace, or every entry if namespace is None.
+        Args:
+            namespace (str, optional): The namespace to remove.
+            prefix (bool): Remove every namespace starting with namespace.
+        Returns:
+            int: Number of entries removed.
+        """
+        with self.lock:
+            if namespace is None:
+                keys = list(self.entries.keys())
+            else:
+                keys = [k for k in self.entries.keys() if (k[0].startswith(namespace) if prefix else k[0] == namespace)]
+            for k in keys:
+                self.remove_entry(k)
+            removed = len(keys)
+        self.logger.info(f"Invalidated {removed} entries (namespace: {namespace})")
+        return removed
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+            hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+            return {
+                **self.stats,
+                "size": len(self.entries),
+                "hit_rate": hits / lookups if lookups > 0 else 0.0
+            }
@@ -1,11 +1,15 @@
-from typing import Dict
+from typing import Dict, List, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from interaction import Interaction
-import time, logging
+import time, logging, math
 import asyncio
 from router import AgentRouter
 from logger import Logger
+from utility import get_process_tree_rss_mb
+from session_store import SessionStore, create_session_store
 from agents import CasualAgent, BrowserAgent, CoderAgent, FileAgent, PlannerAgent, ReterivalAgent
-from browser import Browser, create_driver
+from browser import Browser, create_driver, get_navigation_profile
 from llm_provider import Provider
 from dotenv import load_dotenv
 import configparser
@@ -37,6 +41,8 @@ async def initialize_system(cid: str):
     languages = config["MAIN"]["languages"].split(' ')
     
     headless = config.getboolean('BROWSER', 'headless_browser')
+    navigation_profile = config.get('BROWSER', 'navigation_profile', fallback="fast")
+    page_load_strategy = get_navigation_profile(navigation_profile)["page_load_strategy"]
     if is_running_in_docker() and not headless:
         print("\n" + "*" * 70)
         print("*** WARNING: Detected Docker environment - forcing headless_browser=True ***")
@@ -60,10 +66,12 @@ async def initialize_system(cid: str):
 
     import random
     port = random.randint(10000, 65535)
-    driver = await asyncio.to_thread(create_driver, headless=headless, stealth_mode=stealth_mode, lang=languages[0], port=port)
+    driver = await asyncio.to_thread(create_driver, headless=headless, stealth_mode=stealth_mode, lang=languages[0], port=port, page_load_strategy=page_load_strategy)
     browser = Browser(
         driver,
-        anticaptcha_manual_install=stealth_mode
+        anticaptcha_manual_install=stealth_mode,
+        prefetch_tabs=config.getint('BROWSER', 'prefetch_tabs', fallback=0),
+        navigation_profile=navigation_profile
     )
     logger.info("Browser initialized")
 
@@ -94,6 +102,11 @@ async def initialize_system(cid: str):
             provider=provider, verbose=False, browser=browser, cid=cid
         )
     ]
+    # agents opting in to a bounded conversation window, the others (e.g. the coder feedback loop) get their whole memory
+    windowed_agents = config.get('MAIN', 'context_window_agents', fallback="").split()
+    for agent in agents:
+        if agent.type in windowed_agents:
+            agent.context_window_turns = config.getint('MAIN', 'context_window_turns', fallback=None)
     logger.info("Agents initialized")
 
     interaction = Interaction(
@@ -109,37 +122,262 @@ async def initialize_system(cid: str):
 log = logging.getLogger(__name__)
 
 class SessionManager:
-    def __init__(self, session_timeout: int = 1800):
-        self.sessions: Dict[str, Interaction] = {}
+    """
+    Per conversation (cid) Interaction sessions, with a single background reaper closing
+    idle sessions, least recently used sessions past max_sessions and sessions under memory pressure.
+    Sessions serving a request or generating an answer are never evicted.
+    """
+    def __init__(self, session_timeout: int = 1800, max_sessions: int = 8, max_rss_mb: float = 0, reap_interval: float = 30,
+                 store: SessionStore | None = None):
+        """
+        Args:
+            session_timeout (int): Idle time in seconds after which a session is closed.
+            max_sessions (int): Maximum number of open sessions, least recently used ones are closed first.
+            max_rss_mb (float): Memory of the server and its browsers above which sessions are closed, 0 to disable.
+            reap_interval (float): Seconds between two reaper passes.
+            store (SessionStore, optional): External store of the session states, shared by the workers.
+        """
+        self.sessions: "OrderedDict[str, Interaction]" = OrderedDict() # least recently used first
+        self.in_use: Dict[str, int] = {}
         self.session_timeout = session_timeout
+        self.max_sessions = max_sessions
+        self.max_rss_mb = max_rss_mb
+        self.reap_interval = reap_interval
+        self.reaper_task = None
+        self.stats = {"created": 0, "reused": 0, "rehydrated": 0, "state_saves": 0, "evicted_idle": 0, "evicted_lru": 0, "evicted_memory": 0, "close_errors": 0, "refreshed": 0,
+                      "create_ms_total": 0.0, "create_ms_max": 0.0}
+        self.last_rss_mb = 0.0
+        self.store = store
+        self.creating: Dict[str, asyncio.Future] = {} # cid -> future of a session being created
         self._lock = asyncio.Lock()
 
     async def get_session(self, cid: str) -> Interaction:
-        async with self._lock:
-            if cid not in self.sessions:
-                log.info(f"Creating new session for cid: {cid}")
-                self.sessions[cid] = await initialize_system(cid)
+        """
+        Get the session of a cid, creating it if needed.
+        The browser startup and rehydration run outside the manager lock, so creating a session does not block
+        the requests of other cids; concurrent requests for the same cid wait for the same creation.
+        A reused session is rehydrated first when another worker saved a newer state.
+        """
+        while True:
+            async with self._lock:
+                interaction = self.sessions.get(cid)
+                if interaction is not None:
+                    log.info(f"Reusing existing session for cid: {cid}")
+                    self.stats["reused"] += 1
+                    self.sessions.move_to_end(cid)
+                    interaction.last_active_time = time.time()
+                    shared = self.in_use.get(cid, 0) > 1 or interaction.is_generating
+                    break
+                creating = self.creating.get(cid)
+                if creating is None:
+                    creating = asyncio.get_running_loop().create_future()
+                    self.creating[cid] = creating
+                    break
+            try:
+                await asyncio.shield(creating)
+            except asyncio.CancelledError:
+                if not creating.cancelled():
+                    raise
+                # the creating request was cancelled, try again
+            # the session is registered, or the creation failed and the next pass creates it again
+
+        if interaction is not None:
+            if not shared:
+                await self.refresh(cid, interaction)
+            return interaction
+
+        log.info(f"Creating new session for cid: {cid}")
+        start = time.perf_counter()
+        try:
+            interaction = await initialize_system(cid)
+            await self.rehydrate(cid, interaction)
+        except BaseException as e:
+            async with self._lock:
+                del self.creating[cid]
+            if isinstance(e, asyncio.CancelledError):
+                creating.cancel()
             else:
-                log.info(f"Reusing existing session for cid: {cid}")
-            
-            self.sessions[cid].last_active_time = time.time()
-            return self.sessions[cid]
+                creating.set_exception(e)
+                creating.exception() # the error is raised here, waiters retry
+            raise
+        create_ms = (time.perf_counter() - start) * 1000
+        async with self._lock:
+            del self.creating[cid]
+            self.sessions[cid] = interaction
+            self.sessions.move_to_end(cid)
+            interaction.last_active_time = time.time()
+            self.stats["created"] += 1
+            self.stats["create_ms_total"] += create_ms
+            self.stats["create_ms_max"] = max(self.stats["create_ms_max"], create_ms)
+        creating.set_result(interaction)
+        return interaction
 
-    async def cleanup_sessions(self):
-        while True:
-            await asyncio.sleep(60)
-            now = time.time()
-            
+    async def rehydrate(self, cid: str, interaction: Interaction) -> None:
+        """
+        Restore a session state saved by another worker or before an eviction.
+        Rehydration is cheap, the routing models come from the process wide registry.
+        """
+        if self.store is None:
+            return
+        try:
+            state = await asyncio.to_thread(self.store.load, cid)
+            if state:
+                await asyncio.to_thread(interaction.restore_state, state)
+                self.stats["rehydrated"] += 1
+                log.info(f"Rehydrated session for cid: {cid}")
+        except Exception as e:
+            logger.error(f"Failed to rehydrate session {cid}: {str(e)}")
+
+    async def refresh(self, cid: str, interaction: Interaction) -> None:
+        """
+        Rehydrate a live session when another worker saved a newer revision of its state,
+        so the request is not answered from stale memory and the next save does not overwrite the newer state.
+        """
+        if self.store is None:
+            return
+        try:
+            revision = await asyncio.to_thread(self.store.revision, cid)
+        except Exception as e:
+            logger.error(f"Failed to read the session revision {cid}: {str(e)}")
+            return
+        if revision is not None and revision > interaction.state_revision:
+            log.info(f"Session {cid} is stale (revision {interaction.state_revision}, stored {revision}), rehydrating")
+            self.stats["refreshed"] += 1
+            await self.rehydrate(cid, interaction)
+
+    async def save_state(self, cid: str, interaction: Interaction) -> None:
+        """Save a session state to the external store, off the event loop."""
+        if self.store is None:
+            return
+        try:
+            state = await asyncio.to_thread(interaction.export_state)
+            await asyncio.to_thread(self.store.save, cid, state)
+            interaction.state_revision = state["revision"]
+            self.stats["state_saves"] += 1
+        except Exception as e:
+            logger.error(f"Failed to save session state {cid}: {str(e)}")
+
+    @asynccontextmanager
+    async def session(self, cid: str):
+        """
+        Use a session for the duration of a request, the reaper skips it until the request ends.
+        """
+        async with self._lock:
+            self.in_use[cid] = self.in_use.get(cid, 0) + 1
+        interaction = None
+        try:
+            interaction = await self.get_session(cid)
+            yield interaction
+        finally:
+            if interaction is not None:
+                await self.save_state(cid, interaction)
             async with self._lock:
-                inactive_sessions = [
-                    cid for cid, session in self.sessions.items()
-                    if now - session.last_active_time > self.session_timeout
-                ]
-                
-                for cid in inactive_sessions:
-                    log.info(f"Closing inactive session for cid: {cid}")
-                    if cid in self.sessions:
-                        self.sessions[cid].close()
-                        del self.sessions[cid]
-
-session_manager = SessionManager()
\ No newline at end of file
+                self.in_use[cid] -= 1
+                if self.in_use[cid] <= 0:
+                    del self.in_use[cid]
+                if cid in self.sessions:
+                    self.sessions[cid].last_active_time = time.time()
+
+    def is_busy(self, cid: str) -> bool:
+        return self.in_use.get(cid, 0) > 0 or getattr(self.sessions[cid], "is_generating", False)
+
+    def select_evictions(self, now: float, rss_mb: float) -> List[Tuple[str, str]]:
+        """
+        Choose the sessions to close, oldest first.
+        Args:
+            now (float): Current time.
+            rss_mb (float): Current memory of the server and its browsers.
+        Returns:
+            List[Tuple[str, str]]: (cid, reason) of the sessions to close.
+        """
+        candidates = [cid for cid in self.sessions.keys() if not self.is_busy(cid)]
+        evictions = [(cid, "idle") for cid in candidates if now - self.sessions[cid].last_active_time > self.session_timeout]
+        remaining = [cid for cid in candidates if cid not in dict(evictions)]
+        excess = len(self.sessions) - len(evictions) - self.max_sessions
+        while excess > 0 and remaining:
+            evictions.append((remaining.pop(0), "lru"))
+            excess -= 1
+        if self.max_rss_mb and rss_mb > self.max_rss_mb and remaining:
+            open_sessions = len(self.sessions) - len(evictions)
+            per_session_mb = rss_mb / max(open_sessions, 1)
+            needed = max(1, math.ceil((rss_mb - self.max_rss_mb) / per_session_mb))
+            while needed > 0 and remaining:
+                evictions.append((remaining.pop(0), "memory"))
+                needed -= 1
+        return evictions
+
+    async def sample_rss(self) -> float:
+        """Measure the RSS of the worker and its browser processes, off the event loop."""
+        self.last_rss_mb = await asyncio.to_thread(get_process_tree_rss_mb)
+        return self.last_rss_mb
+
+    async def reap(self) -> int:
+        """
+        One reaper pass, browsers are closed off the event loop.
+        Returns:
+            int: Number of sessions closed.
+        """
+        await self.sample_rss()
+        async with self._lock:
+            evictions = self.select_evictions(time.time(), self.last_rss_mb)
+            closing = [(cid, reason, self.sessions.pop(cid)) for cid, reason in evictions]
+        for cid, reason, interaction in closing:
+            log.info(f"Closing session for cid: {cid} ({reason})")
+            self.stats[f"evicted_{reason}"] += 1
+            await self.save_state(cid, interaction)
+            try:
+                await asyncio.to_thread(interaction.close)
+            except Exception as e:
+                self.stats["close_errors"] += 1
+                logger.error(f"Failed to close session {cid}: {str(e)}")
+        return len(closing)
+
+    async def run_reaper(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Session reaper pass failed: {str(e)}")
+
+    def start_reaper(self) -> None:
+        """Start the background reaper, once, on the running event loop."""
+        if self.reaper_task is None or self.reaper_task.done():
+            self.reaper_task = asyncio.get_running_loop().create_task(self.run_reaper())
+
+    async def shutdown(self) -> None:
+        """Stop the reaper and close every session."""
+        if self.reaper_task is not None:
+            self.reaper_task.cancel()
+            self.reaper_task = None
+        async with self._lock:
+            closing = list(self.sessions.items())
+            self.sessions.clear()
+        for cid, interaction in closing:
+            await self.save_state(cid, interaction)
+            try:
+                await asyncio.to_thread(interaction.close)
+            except Exception as e:
+                logger.error(f"Failed to close session on shutdown: {str(e)}")
+
+    def get_metrics(self) -> dict:
+        return {
+            **self.stats,
+            "open_sessions": len(self.sessions),
+            "busy_sessions": sum(1 for cid in self.sessions.keys() if self.is_busy(cid)),
+            "rss_mb": round(self.last_rss_mb, 1),
+            "create_ms_mean": self.stats["create_ms_total"] / self.stats["created"] if self.stats["created"] else 0.0,
+            "max_sessions": self.max_sessions,
+            "max_rss_mb": self.max_rss_mb
+        }
+
+session_manager = SessionManager(
+    session_timeout=config.getint('SESSION', 'session_timeout', fallback=1800),
+    max_sessions=config.getint('SESSION', 'max_sessions', fallback=8),
+    max_rss_mb=config.getfloat('SESSION', 'max_rss_mb', fallback=0),
+    reap_interval=config.getfloat('SESSION', 'reap_interval', fallback=30),
+    store=create_session_store(
+        config.get('SESSION', 'store', fallback="none"),
+        path=config.get('SESSION', 'store_path', fallback=".sessions")
+    )
+)
@@ -0,0 +1,113 @@
+import datetime
+import hashlib
+import json
+import os
+from abc import ABC, abstractmethod
+
+from logger import Logger
+
+class SessionStore(ABC):
+    """
+    Storage of serialized session state (see Interaction.export_state), shared by the uvicorn workers
+    so a session can be rehydrated by any worker.
+    """
+    def __init__(self):
+        self.logger = Logger("session_store.log")
+
+    @abstractmethod
+    def save(self, cid: str, state: dict) -> None:
+        pass
+
+    @abstractmethod
+    def load(self, cid: str) -> dict | None:
+        pass
+
+    @abstractmethod
+    def delete(self, cid: str) -> None:
+        pass
+
+    def revision(self, cid: str) -> int | None:
+        """Revision of the stored state of a cid (see Interaction.export_state), None if there is none."""
+        state = self.load(cid)
+        return state.get("revision", 0) if state else None
+
+class MongoSessionStore(SessionStore):
+    """
+    Session state stored in MongoDB, one document per cid.
+    """
+    def __init__(self, collection_name: str = "agent_sessions"):
+        super().__init__()
+        import config
+        from memory import get_mongo_client
+        self.collection = get_mongo_client()[config.MONGO_DB_NAME][collection_name]
+        self.collection.create_index("cid", unique=True)
+
+    def save(self, cid: str, state: dict) -> None:
+        self.collection.update_one(
+            {'cid': cid},
+            {'$set': {'state': state, 'last_update': datetime.datetime.now()}},
+            upsert=True
+        )
+        self.logger.info(f"Saved session state for cid {cid}")
+
+    def load(self, cid: str) -> dict | None:
+        document = self.collection.find_one({'cid': cid})
+        return document['state'] if document and 'state' in document else None
+
+    def revision(self, cid: str) -> int | None:
+        document = self.collection.find_one({'cid': cid}, {'state.revision': 1})
+        return document['state'].get('revision', 0) if document and 'state' in document else None
+
+    def delete(self, cid: str) -> None:
+        self.collection.delete_one({'cid': cid})
+
+class FileSessionStore(SessionStore):
+    """
+    Session state stored as one JSON file per cid, for local testing or a shared volume.
+    """
+    def __init__(self, directory: str = ".sessions"):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, cid: str) -> str:
+        return os.path.join(self.directory, f"{hashlib.sha256(cid.encode('utf-8')).hexdigest()}.json")
+
+    def save(self, cid: str, state: dict) -> None:
+        path = self.path(cid)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            json.dump({'cid': cid, 'state': state}, f, default=str)
+        os.replace(tmp_path, path)
+        self.logger.info(f"Saved session state for cid {cid}")
+
+    def load(self, cid: str) -> dict | None:
+        try:
+            with open(self.path(cid), 'r', encoding="utf-8") as f:
+                return json.load(f).get('state', None)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            self.logger.warning(f"Failed to load session state for cid {cid}: {str(e)}")
+            return None
+
+    def delete(self, cid: str) -> None:
+        try:
+            os.remove(self.path(cid))
+        except FileNotFoundError:
+            pass
+
+def create_session_store(backend: str, path: str = ".sessions") -> SessionStore | None:
+    """
+    Create the session store configured in config.ini.
+    Args:
+        backend (str): mongo, file or none.
+        path (str): Directory of the file store.
+    Returns:
+        SessionStore | None: The store, None if sessions are only kept in process.
+    """
+    if backend == "mongo":
+        return MongoSessionStore()
+    if backend == "file":
+        return FileSessionStore(path)
+    return None
@@ -1,45 +1,363 @@
+"""
+Load generator for the /agent endpoint.
+Sends a mix of queries exercising each agent (casual, retrieval, web, coder, planner) at a fixed concurrency
+(closed loop) or a Poisson arrival rate (open loop), then reports throughput, latency and time to first byte
+percentiles per query type, the session creation time and the RSS per session read from /metrics/sessions.
+With --baseline the run is compared to a saved report and the script exits with status 1 on a regression.
+
+Stubbed external services, so runs are offline and reproducible:
+    python test/mock_llm_server.py --port 8000 --seed 1       # LLM, see [PROVIDER] base_url in config.ini
+    python test/concurrency.py --stub-port 8900 ...           # Brave search API and result pages
+and start the API with
+    BRAVE_SEARCH_URL=http://127.0.0.1:8900/res/v1/web/search DEEPINFRA_OPENAI_URL=http://127.0.0.1:8000/v1 python api.py
+MongoDB, Postgres and AstraDB are still required (local instances).
+Each uvicorn worker has its own sessions, /metrics/sessions reports the worker answering the poll.
+
+Usage (from the repository root):
+    python test/concurrency.py --concurrency 8 --requests 200 --mix casual=3,retrieval=2,web=1,coder=1,planner=1
+    python test/concurrency.py --rate 2 --duration 120 --save-baseline test/load_baseline.json
+    python test/concurrency.py --rate 2 --duration 120 --baseline test/load_baseline.json --tolerance 0.2
+"""
+
+import argparse
 import asyncio
-import httpx
 import json
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+QUERIES = {
+    "casual": [
+        "Hi, how are you today?",
+        "Tell me a fun fact about octopuses.",
+        "What do you think about rainy days?",
+    ],
+    "retrieval": [
+        "According to our documentation, what is the refund policy?",
+        "What does the knowledge base say about onboarding new employees?",
+        "Summarize the product specifications from the uploaded files.",
+    ],
+    "web": [
+        "Search the web for the latest news about renewable energy.",
+        "Find the current weather forecast for Paris online.",
+        "Look up reviews of the newest electric cars on the internet.",
+    ],
+    "coder": [
+        "Write a python script that prints the first 10 fibonacci numbers.",
+        "Write a python function that checks if a string is a palindrome and test it.",
+        "Write a bash command that counts the lines of every python file.",
+    ],
+    "planner": [
+        "Make a plan to research AI startups in Osaka and Tokyo, then write a report file.",
+        "Plan a trip to Japan: find flights, compare hotels and write an itinerary.",
+        "Research three competitors online, then write a python script comparing their prices.",
+    ],
+}
+
+# (report key, True when higher is better)
+GATED_METRICS = [
+    ("throughput_rps", True),
+    ("success_rate", True),
+    ("latency_p95_ms", False),
+    ("ttfb_p95_ms", False),
+    ("session_create_ms", False),
+    ("rss_per_session_mb", False),
+]
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    """Brave search API stand-in, results point to pages served by the same server."""
+    results = 5
 
-async def make_request(client, query):
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, content_type: str, body: str) -> None:
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        host = f"http://{self.headers.get('Host')}"
+        if self.path.startswith("/res/v1/web/search"):
+            results = [
+                {"title": f"Stub result {i}", "description": f"Description of stub result {i}.", "url": f"{host}/page/{i}"}
+                for i in range(self.results)
+            ]
+            self.send_body("application/json", json.dumps({"web": {"results": results}}))
+        elif self.path.startswith("/page/"):
+            paragraphs = "".join(f"<p>Paragraph {i} of a stub page with enough text to be kept by the extractors.</p>" for i in range(40))
+            self.send_body("text/html", f"<html><head><title>Stub page</title></head><body><article><h1>Stub page</h1>{paragraphs}</article></body></html>")
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+def start_stub_search(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubSearchHandler)
+    threading.Thread(target=server.serve_forever, name="stub-search", daemon=True).start()
+    print(f"Stub search API on http://127.0.0.1:{port}/res/v1/web/search")
+    return server
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in QUERIES:
+            raise ValueError(f"Unknown query type {name}, expected one of {', '.join(QUERIES)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def parse_events(body: str) -> list:
+    """The endpoint streams concatenated JSON objects without separators."""
+    decoder = json.JSONDecoder()
+    events, index = [], 0
+    while index < len(body):
+        while index < len(body) and body[index].isspace():
+            index += 1
+        if index >= len(body):
+            break
+        try:
+            event, index = decoder.raw_decode(body, index)
+        except json.JSONDecodeError:
+            break
+        events.append(event)
+    return events
+
+def percentile(values: list, q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+class LoadTest():
     """
-    Makes a POST request to the /agent endpoint.
+    Sends the requests and collects one sample per request.
     """
-    response = await client.post(
-        "http://localhost:8844/agent",
-        json={
-            "query": query,
-            "bot_key": "test_key",
-            "org": "test_org",
-            "uid": "test_uid"
-        },
-        timeout=120  # Set a longer timeout to allow the server to process
-    )
-    return response
-
-async def main():
+    def __init__(self, args):
+        self.args = args
+        self.mix = parse_mix(args.mix)
+        self.random = random.Random(args.seed)
+        self.samples = []
+        self.session_polls = []
+        self.cids = []
+        self.stop = False
+
+    def next_request(self) -> tuple:
+        """Query type, query and cid, a share of the requests follow up on an existing conversation."""
+        kind = self.random.choices(list(self.mix.keys()), weights=list(self.mix.values()))[0]
+        query = self.random.choice(QUERIES[kind])
+        if self.cids and self.random.random() < self.args.followup:
+            cid = self.random.choice(self.cids)
+        else:
+            cid = str(uuid.uuid4())
+            self.cids.append(cid)
+        return kind, query, cid
+
+    async def send(self, client: httpx.AsyncClient, kind: str, query: str, cid: str) -> None:
+        sample = {"kind": kind, "cid": cid, "status": "ERROR", "ttfb_ms": None, "latency_ms": None, "agent": None}
+        start = time.perf_counter()
+        body = ""
+        try:
+            async with client.stream("POST", f"{self.args.url}/agent", json={
+                "query": query,
+                "bot_key": self.args.bot_key,
+                "org": self.args.org,
+                "uid": self.args.uid,
+                "cid": cid
+            }, timeout=self.args.timeout) as response:
+                async for chunk in response.aiter_text():
+                    if sample["ttfb_ms"] is None:
+                        sample["ttfb_ms"] = (time.perf_counter() - start) * 1000
+                    body += chunk
+                sample["http_status"] = response.status_code
+            events = parse_events(body)
+            final = events[-1] if events else {}
+            sample["status"] = final.get("status", "ERROR")
+            sample["agent"] = final.get("agent")
+        except httpx.HTTPError as e:
+            sample["error"] = str(e)
+        sample["latency_ms"] = (time.perf_counter() - start) * 1000
+        self.samples.append(sample)
+
+    async def poll_sessions(self, client: httpx.AsyncClient) -> None:
+        while not self.stop:
+            try:
+                response = await client.get(f"{self.args.url}/metrics/sessions", timeout=10)
+                self.session_polls.append(response.json())
+            except (httpx.HTTPError, ValueError):
+                pass
+            await asyncio.sleep(self.args.poll_interval)
+
+    async def closed_loop(self, client: httpx.AsyncClient, deadline: float) -> None:
+        sent = 0
+
+        async def user():
+            nonlocal sent
+            while sent < self.args.requests and time.monotonic() < deadline:
+                sent += 1
+                await self.send(client, *self.next_request())
+
+        await asyncio.gather(*(user() for _ in range(self.args.concurrency)))
+
+    async def open_loop(self, client: httpx.AsyncClient, deadline: float) -> None:
+        """Poisson arrivals, at most --concurrency requests in flight."""
+        limit = asyncio.Semaphore(self.args.concurrency)
+        tasks = []
+
+        async def limited(kind, query, cid):
+            async with limit:
+                await self.send(client, kind, query, cid)
+
+        while len(tasks) < self.args.requests and time.monotonic() < deadline:
+            tasks.append(asyncio.create_task(limited(*self.next_request())))
+            await asyncio.sleep(self.random.expovariate(self.args.rate))
+        await asyncio.gather(*tasks)
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(max_connections=self.args.concurrency + 2)
+        async with httpx.AsyncClient(limits=limits) as client:
+            before = await self.fetch_sessions(client)
+            poller = asyncio.create_task(self.poll_sessions(client))
+            start = time.monotonic()
+            deadline = start + self.args.duration if self.args.duration else float("inf")
+            if self.args.rate > 0:
+                await self.open_loop(client, deadline)
+            else:
+                await self.closed_loop(client, deadline)
+            elapsed = time.monotonic() - start
+            self.stop = True
+            await poller
+            after = await self.fetch_sessions(client)
+        return self.report(elapsed, before, after)
+
+    async def fetch_sessions(self, client: httpx.AsyncClient) -> dict:
+        try:
+            response = await client.get(f"{self.args.url}/metrics/sessions", timeout=10)
+            return response.json()
+        except (httpx.HTTPError, ValueError):
+            return {}
+
+    def summarize(self, samples: list) -> dict:
+        ok = [sample for sample in samples if sample["status"] == "SUCCESS"]
+        latencies = [sample["latency_ms"] for sample in ok]
+        ttfbs = [sample["ttfb_ms"] for sample in ok if sample["ttfb_ms"] is not None]
+        return {
+            "requests": len(samples),
+            "success_rate": len(ok) / len(samples) if samples else 0.0,
+            "latency_p50_ms": percentile(latencies, 0.5),
+            "latency_p95_ms": percentile(latencies, 0.95),
+            "latency_p99_ms": percentile(latencies, 0.99),
+            "ttfb_p50_ms": percentile(ttfbs, 0.5),
+            "ttfb_p95_ms": percentile(ttfbs, 0.95),
+            "ttfb_p99_ms": percentile(ttfbs, 0.99),
+            "latency_mean_ms": statistics.mean(latencies) if latencies else None,
+            "agents": {agent: sum(1 for sample in ok if sample["agent"] == agent) for agent in {sample["agent"] for sample in ok}}
+        }
+
+    def report(self, elapsed: float, before: dict, after: dict) -> dict:
+        created = after.get("created", 0) - before.get("created", 0)
+        create_ms = after.get("create_ms_total", 0.0) - before.get("create_ms_total", 0.0)
+        peak = max(self.session_polls, key=lambda poll: poll.get("rss_mb", 0), default={})
+        open_sessions = peak.get("open_sessions", 0)
+        report = {
+            **self.summarize(self.samples),
+            "duration_s": elapsed,
+            "throughput_rps": len([sample for sample in self.samples if sample["status"] == "SUCCESS"]) / elapsed if elapsed else 0.0,
+            "sessions_created": created,
+            "session_create_ms": create_ms / created if created > 0 else None,
+            "session_create_max_ms": after.get("create_ms_max"),
+            "peak_rss_mb": peak.get("rss_mb"),
+            "peak_open_sessions": open_sessions,
+            "rss_per_session_mb": peak.get("rss_mb", 0) / open_sessions if open_sessions else None,
+            "per_kind": {kind: self.summarize([sample for sample in self.samples if sample["kind"] == kind]) for kind in self.mix},
+            "settings": {key: value for key, value in vars(self.args).items() if key not in ("baseline", "save_baseline")}
+        }
+        return report
+
+def format_ms(value) -> str:
+    return f"{value:.0f}" if value is not None else "-"
+
+def print_report(report: dict) -> None:
+    print(f"{report['requests']} requests in {report['duration_s']:.1f}s, {report['throughput_rps']:.2f} successful req/s, "
+          f"success rate {report['success_rate']:.1%}")
+    print(f"{'type':>10} {'n':>5} {'ok':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttfb p50':>9} {'ttfb p95':>9}  agents")
+    rows = list(report["per_kind"].items()) + [("all", report)]
+    for kind, summary in rows:
+        print(f"{kind:>10} {summary['requests']:>5} {summary['success_rate']:>6.1%} {format_ms(summary['latency_p50_ms']):>8} "
+              f"{format_ms(summary['latency_p95_ms']):>8} {format_ms(summary['latency_p99_ms']):>8} "
+              f"{format_ms(summary['ttfb_p50_ms']):>9} {format_ms(summary['ttfb_p95_ms']):>9}  {summary['agents']}")
+    print(f"sessions created: {report['sessions_created']}, mean creation {format_ms(report['session_create_ms'])} ms, "
+          f"max {format_ms(report['session_create_max_ms'])} ms")
+    rss_per_session = report["rss_per_session_mb"]
+    print(f"peak RSS {report['peak_rss_mb']} MB for {report['peak_open_sessions']} open sessions"
+          + (f", {rss_per_session:.0f} MB per session" if rss_per_session else ""))
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
     """
-    Sends two concurrent requests to the server.
+    Regressions of the gated metrics beyond the tolerance.
+    Returns:
+        list: One message per regression, empty when the run passes.
     """
-    async with httpx.AsyncClient() as client:
-        tasks = [
-            make_request(client, "What is the capital of France?"),
-            make_request(client, "What is the highest mountain in the world?")
-        ]
-        responses = await asyncio.gather(*tasks)
-
-        for response in responses:
-            print(f"Status Code: {response.status_code}")
-            async for chunk in response.aiter_bytes():
-                try:
-                    # The response is a stream of JSON objects
-                    data = json.loads(chunk)
-                    print(data)
-                except json.JSONDecodeError:
-                    # Handle cases where a chunk is not a complete JSON object
-                    print(f"Received a partial chunk: {chunk}")
-            print("-" * 20)
+    regressions = []
+    for key, higher_is_better in GATED_METRICS:
+        current, reference = report.get(key), baseline.get(key)
+        if current is None or not reference:
+            continue
+        change = (current - reference) / reference
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        status = "REGRESSION" if regressed else "ok"
+        print(f"{key:>20}: {reference:>10.2f} -> {current:>10.2f} ({change:+.1%}) {status}")
+        if regressed:
+            regressions.append(f"{key} {change:+.1%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the /agent endpoint.")
+    parser.add_argument("--url", default="http://localhost:8844")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent users (closed loop) or maximum in flight requests (open loop).")
+    parser.add_argument("--rate", type=float, default=0, help="Arrival rate in requests per second, 0 for a closed loop.")
+    parser.add_argument("--requests", type=int, default=40, help="Maximum number of requests.")
+    parser.add_argument("--duration", type=float, default=0, help="Maximum duration in seconds, 0 for no limit.")
+    parser.add_argument("--mix", default="casual=3,retrieval=2,web=1,coder=1,planner=1", help="Query types and weights.")
+    parser.add_argument("--followup", type=float, default=0.3, help="Share of requests continuing an existing conversation.")
+    parser.add_argument("--bot-key", default="test_key")
+    parser.add_argument("--org", default="test_org")
+    parser.add_argument("--uid", default="test_uid")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--poll-interval", type=float, default=2, help="Seconds between two /metrics/sessions polls.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stub-port", type=int, default=0, help="Start the stub search API on this port.")
+    parser.add_argument("--output", default="", help="Write the report as JSON.")
+    parser.add_argument("--save-baseline", default="", help="Save the report as the baseline.")
+    parser.add_argument("--baseline", default="", help="Compare to a baseline report, exit with status 1 on a regression.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression of the gated metrics.")
+    args = parser.parse_args()
+
+    if args.stub_port:
+        start_stub_search(args.stub_port)
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {path}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"Performance regression: {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regression against the baseline.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
@@ -0,0 +1,140 @@
+"""
+OpenAI compatible mock LLM server, for load and latency testing of the /agent pipeline without a real provider.
+Serves POST /v1/chat/completions (plain and streamed) and GET /v1/models with the scripted answers,
+latency distribution, token rate and error injection of mock_llm.MockLLM.
+The agent of each request is recognized from its system prompt.
+
+Usage (from the repository root):
+    python test/mock_llm_server.py --port 8000 --ttft-ms 400 --tokens-per-second 60 --error-rate 0.02 --seed 1
+Then point the provider at it in config.ini:
+    [MAIN] provider_name = openai
+    [PROVIDER] base_url = http://127.0.0.1:8000/v1
+(the OPENAI_API_KEY of .env can be any value). Use provider_name = mock instead to simulate the LLM in process.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_llm import MockLLM, MockLLMError, load_scripts
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    mock_llm: MockLLM = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        messages = request.get("messages", [])
+        model = request.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        try:
+            chunks = self.mock_llm.stream(messages)
+            # the latency and the injected errors happen before the first chunk, errors keep their status code
+            first = next(chunks, "")
+            if request.get("stream"):
+                self.stream_response(first, chunks, completion_id, created, model)
+                return
+            text = first + "".join(chunks)
+        except MockLLMError as e:
+            self.send_json(e.status_code, {"error": {"message": str(e), "type": "mock_error", "code": e.status_code}})
+            return
+        except TimeoutError as e:
+            self.send_json(504, {"error": {"message": str(e), "type": "mock_error", "code": 504}})
+            return
+        prompt_tokens, completion_tokens = MockLLM.count_tokens(messages, text)
+        self.send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+    def stream_response(self, first: str, chunks, completion_id: str, created: int, model: str) -> None:
+        """Server sent events in the OpenAI chunk format."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: dict, finish_reason=None) -> None:
+            body = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(body)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": first})
+        for chunk in chunks:
+            event({"content": chunk})
+        event({}, finish_reason="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI compatible mock LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", default="lognormal", choices=["fixed", "uniform", "exponential", "lognormal"],
+                        help="Distribution of the time to first token.")
+    parser.add_argument("--ttft-ms", type=float, default=400, help="Median time to first token.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--errors", nargs="+", default=["429", "503", "timeout"])
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds an injected timeout hangs.")
+    parser.add_argument("--scripts", default="", help="JSON file of scripted answers per agent.")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    MockLLMHandler.mock_llm = MockLLM(
+        latency=args.latency,
+        ttft_ms=args.ttft_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        errors=args.errors,
+        scripts=load_scripts(args.scripts),
+        seed=args.seed,
+        timeout=args.timeout
+    )
+    server = ThreadingHTTPServer((args.host, args.port), MockLLMHandler)
+    print(f"Mock LLM server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
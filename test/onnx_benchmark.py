@@ -0,0 +1,94 @@
+"""
+Compare the torch and the int8 ONNX Runtime routing backends.
+Loads the routing models with each backend, then reports load memory (RSS),
+routing and translation latency, and agreement of the ONNX routing decisions with torch.
+
+Usage (from the repository root, requires optimum[onnxruntime]):
+    python test/onnx_benchmark.py --dataset test/routing_eval_queries.json --limit 200
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import AgentRouter
+from router_cascade_eval import AGENTS, EVAL_QUERIES_PATH, load_dataset
+
+TRANSLATION_SAMPLES = [
+    ("fr", "Peux-tu chercher les meilleurs restaurants à Lyon ?"),
+    ("fr", "Écris un script python qui trie une liste de fichiers par date."),
+    ("fr", "Quelle est la capitale de l'Australie ?"),
+    ("zh", "帮我找一下巴黎的天气预报"),
+    ("zh", "写一个计算斐波那契数列的函数"),
+]
+
+def get_rss_mb() -> float:
+    with open("/proc/self/statm", "r") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+def bench_backend(backend: str, examples: list, languages: list) -> dict:
+    gc.collect()
+    rss_before = get_rss_mb()
+    start = time.perf_counter()
+    router = AgentRouter(AGENTS, supported_language=languages, inference_backend=backend)
+    load_s = time.perf_counter() - start
+    rss_after = get_rss_mb()
+    router.cascade_threshold = None # always run BART so the backends are compared on the full vote
+
+    roles, route_ms = [], []
+    for text, _ in examples:
+        start = time.perf_counter()
+        roles.append(router.classify(router.find_first_sentence(text)))
+        route_ms.append((time.perf_counter() - start) * 1000)
+
+    translations, translate_ms = [], []
+    for lang, text in TRANSLATION_SAMPLES:
+        if lang not in languages:
+            continue
+        start = time.perf_counter()
+        translations.append(router.lang_analysis.translate(text, lang))
+        translate_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "backend": router.inference_backend,
+        "load_s": load_s,
+        "rss_mb": rss_after - rss_before,
+        "roles": roles,
+        "translations": translations,
+        "route_mean_ms": statistics.mean(route_ms),
+        "route_p95_ms": percentile(route_ms, 0.95),
+        "translate_mean_ms": statistics.mean(translate_ms) if translate_ms else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark torch vs int8 ONNX Runtime routing models.")
+    parser.add_argument("--dataset", default=EVAL_QUERIES_PATH, help="Role-labelled queries, or examples in the llm_router/examples.json layout.")
+    parser.add_argument("--limit", type=int, default=200, help="Only route the first N examples.")
+    parser.add_argument("--languages", nargs="+", default=["en", "fr", "zh"])
+    args = parser.parse_args()
+
+    examples = load_dataset(args.dataset)[:args.limit]
+    results = [bench_backend(backend, examples, args.languages) for backend in ["torch", "onnx"]]
+    torch_result = results[0]
+
+    print(f"{len(examples)} routing examples, {len(TRANSLATION_SAMPLES)} translation samples")
+    print(f"{'backend':>8} {'load s':>7} {'rss MB':>8} {'route ms':>9} {'p95 ms':>8} {'translate ms':>13} {'agreement':>10} {'same translation':>17}")
+    for result in results:
+        agreement = sum(a == b for a, b in zip(result["roles"], torch_result["roles"])) / len(examples)
+        same_translation = sum(a == b for a, b in zip(result["translations"], torch_result["translations"]))
+        print(f"{result['backend']:>8} {result['load_s']:>7.1f} {result['rss_mb']:>8.0f} {result['route_mean_ms']:>9.1f} "
+              f"{result['route_p95_ms']:>8.1f} {result['translate_mean_ms']:>13.1f} {agreement:>10.3f} "
+              f"{same_translation:>10}/{len(result['translations'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Offline evaluation of the cascade routing mode.
+For each cascade threshold, route role-labelled queries through the agent vote and report accuracy,
+agreement with the full BART + LLM-router ensemble (no cascade), BART invocation rate and latency.
+
+By default the queries are test/routing_eval_queries.json, role-labelled queries held out from the router few-shot sets,
+use it to choose a threshold: cascade_threshold is unset (cascade off) by default in config.ini.
+With --few-shots the router's own role few-shot set (AgentRouter.few_shots_tasks) is routed instead, the LLM router
+was trained on it so its accuracy and confidence are optimistic.
+
+Usage (from the repository root):
+    python test/router_cascade_eval.py --thresholds 0.5 0.6 0.7 0.8 0.9
+    python test/router_cascade_eval.py --few-shots
+    python test/router_cascade_eval.py --dataset queries.json
+
+A dataset is a JSON list of {"text": ..., "role": ...} where role is an agent role (talk, web, code, files, retrive, mcp).
+The llm_router/examples.json layout ({label: [{"text": ..., "label": ...}, ...]}) is also read, its labels are complexity labels.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import AgentRouter
+
+# role-labelled queries held out from the router few-shot sets
+EVAL_QUERIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_eval_queries.json")
+
+AGENTS = [
+    SimpleNamespace(agent_name="jarvis", role="talk", type="casual_agent"),
+    SimpleNamespace(agent_name="coder", role="code", type="code_agent"),
+    SimpleNamespace(agent_name="file", role="files", type="file_agent"),
+    SimpleNamespace(agent_name="retrieval", role="retrive", type="retrival_agent"),
+    SimpleNamespace(agent_name="Browser", role="web", type="browser_agent"),
+    SimpleNamespace(agent_name="mcp", role="mcp", type="mcp_agent"),
+]
+# labels of the few-shot set named differently from the agent roles
+FEW_SHOT_ROLES = {"coding": "code", "retrieval": "retrive"}
+
+def load_few_shots(router: AgentRouter) -> list:
+    """(text, role) pairs of the router role few-shot set, restricted to the evaluated roles."""
+    roles = {agent.role for agent in AGENTS}
+    examples = [(text, FEW_SHOT_ROLES.get(label, label)) for text, label in router.few_shots_tasks()]
+    return [(text, role) for text, role in examples if role in roles]
+
+def load_dataset(path: str) -> list:
+    """(text, label) pairs of a role-labelled list, or of a dataset in the llm_router/examples.json layout."""
+    with open(path, 'r', encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return [(entry["text"], entry.get("label", label)) for label, entries in data.items() for entry in entries]
+    return [(entry["text"], entry["role"]) for entry in data]
+
+def evaluate(router: AgentRouter, examples: list, threshold: float | None, batch_size: int) -> dict:
+    """Route the examples by batches with the agent vote, the complexity estimation (planner) is not evaluated."""
+    router.cascade_threshold = threshold
+    router.vote_stats = {"bart_calls": 0, "bart_skipped": 0}
+    labels = [agent.role for agent in AGENTS]
+    texts = [router.find_first_sentence(text) for text, _ in examples]
+    roles, latencies = [], []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        begin = time.perf_counter()
+        roles.extend(router.router_vote_batch(batch, labels))
+        latencies.append((time.perf_counter() - begin) * 1000 / len(batch))
+    votes = router.vote_stats["bart_calls"] + router.vote_stats["bart_skipped"]
+    return {
+        "threshold": threshold,
+        "roles": roles,
+        "accuracy": sum(role == label for (_, label), role in zip(examples, roles)) / len(examples),
+        "bart_rate": router.vote_stats["bart_calls"] / votes if votes > 0 else 0.0,
+        "mean_ms": statistics.mean(latencies),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate routing accuracy vs latency of the cascade mode.")
+    parser.add_argument("--dataset", default=EVAL_QUERIES_PATH, help="Role-labelled queries.")
+    parser.add_argument("--few-shots", action="store_true", help="Route the router role few-shot set instead of the dataset.")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9])
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this path.")
+    args = parser.parse_args()
+
+    router = AgentRouter(AGENTS)
+    examples = load_few_shots(router) if args.few_shots else load_dataset(args.dataset)
+    baseline = evaluate(router, examples, None, args.batch_size)
+    results = [baseline] + [evaluate(router, examples, threshold, args.batch_size) for threshold in args.thresholds]
+
+    print(f"{len(examples)} role-labelled queries from {'AgentRouter.few_shots_tasks' if args.few_shots else args.dataset}")
+    print(f"{'threshold':>10} {'accuracy':>9} {'agreement':>10} {'bart rate':>10} {'ms/query':>9}")
+    for result in results:
+        # agreement with the BART + LLM-router ensemble, the routing without cascade
+        result["agreement"] = sum(a == b for a, b in zip(result["roles"], baseline["roles"])) / len(examples)
+        name = "ensemble" if result["threshold"] is None else f"{result['threshold']:.2f}"
+        print(f"{name:>10} {result['accuracy']:>9.3f} {result['agreement']:>10.3f} {result['bart_rate']:>10.3f} {result['mean_ms']:>9.1f}")
+    if args.output:
+        with open(args.output, 'w', encoding="utf-8") as f:
+            json.dump([{k: v for k, v in r.items() if k != "roles"} for r in results], f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Micro-benchmarks of the pure Python code run on every turn, with pytest-benchmark: code block extraction, block removal,
+search result and navigation answer parsing, page text extraction and passage ranking, plan parsing and the bash safety check.
+The page text paths (Browser.get_text, PassageRanker.select, BrowserAgent.get_page_text) run on a saved web page,
+test/fixtures/article.html, split in text blocks the way web_scripts/dom_snapshot.js does in the browser.
+The other fixtures are generated from a fixed seed (long LLM answers, long plans), so runs are comparable over time.
+Regressions are gated with the pytest-benchmark saved runs: --benchmark-autosave then --benchmark-compare-fail.
+
+Requires pytest and pytest-benchmark (pip install pytest pytest-benchmark).
+
+Usage (from the repository root):
+    python -m pytest test/test_benchmarks.py
+    python -m pytest test/test_benchmarks.py -k "get_text or ranker"
+    python -m pytest test/test_benchmarks.py --benchmark-autosave
+    python -m pytest test/test_benchmarks.py --benchmark-compare --benchmark-compare-fail=median:25%
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+from html.parser import HTMLParser
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logger import Logger
+from tools.tools import Tools
+from tools.safety import is_unsafe
+from agents.agent import Agent
+from agents.browser_agent import BrowserAgent, NavigationState
+from agents.planner_agent import PlannerAgent
+from browser import Browser
+from passage_ranker import PassageRanker
+
+PAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "article.html")
+PAGE_QUERY = "best laptop for machine learning with enough VRAM to fine-tune a language model"
+# below the size of the fixture page, so the passages are ranked instead of returned as is
+PAGE_TOKEN_BUDGET = 512
+
+WORDS = ("the agent reads page results and writes a short answer with code data file search query plan task "
+         "link python value list error output user request model time city startup report").split()
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def make_llm_answer(rng: random.Random, blocks: int = 20, tag: str = "python") -> str:
+    """A long answer alternating prose and code blocks, some indented and some with a save path."""
+    parts = []
+    for i in range(blocks):
+        parts.append(" ".join(sentence(rng, 14) for _ in range(4)))
+        code = "\n".join(f"    value_{j} = compute({j}, '{rng.choice(WORDS)}')" for j in range(25))
+        header = f"```{tag}:script_{i}.py" if i % 3 == 0 else f"```{tag}"
+        indent = "  " if i % 4 == 0 else ""
+        block = f"{header}\ndef step_{i}():\n{code}\n    return value_0\n```"
+        parts.append("\n".join(indent + line for line in block.split("\n")))
+    return "\n\n".join(parts)
+
+def make_search_results(rng: random.Random, results: int = 16) -> str:
+    """Search tool output, as parsed by BrowserAgent.jsonify_search_results."""
+    return "\n\n".join(
+        f"Title:{sentence(rng, 6)}\nSnippet:{sentence(rng, 40)}\nLink:https://www.example{i}.com/{rng.choice(WORDS)}/{i}?q={rng.choice(WORDS)}"
+        for i in range(results)
+    )
+
+def make_navigation_answer(rng: random.Random, lines: int = 60) -> str:
+    """A navigation answer with notes and links, as parsed by BrowserAgent.parse_answer."""
+    out = ["Note: " + sentence(rng, 30)]
+    for i in range(lines):
+        if i % 5 == 0:
+            out.append("")
+            out.append(f"Action: I will navigate to https://docs.example{i}.org/page/{i}.")
+        elif i % 7 == 0:
+            out.append("Notes: " + sentence(rng, 20))
+        else:
+            out.append(f"{sentence(rng, 12)} See www.site{i}.com/path/{i}, or https://example.net/{i}).")
+    return "\n".join(out)
+
+class PageBlocks(HTMLParser):
+    """
+    Text blocks of an HTML page, as web_scripts/dom_snapshot.js extracts them from the DOM:
+    outermost block elements only, headings prefixed with their markdown level and list items with a bullet.
+    """
+    BLOCK_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "pre", "blockquote", "td", "th", "dt", "dd", "figcaption", "caption"}
+    SKIPPED_TAGS = {"head", "script", "style", "noscript"}
+
+    def __init__(self):
+        super().__init__()
+        self.blocks = []
+        self.block_tag = None
+        self.depth = 0
+        self.skipped = 0
+        self.text = []
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag in self.SKIPPED_TAGS:
+            self.skipped += 1
+        elif tag == "br" and self.block_tag is not None:
+            self.text.append("\n")
+        elif tag in self.BLOCK_TAGS and self.block_tag is None:
+            self.block_tag, self.depth, self.text = tag, 1, []
+        elif tag == self.block_tag:
+            self.depth += 1
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.SKIPPED_TAGS:
+            self.skipped -= 1
+        elif tag == self.block_tag:
+            self.depth -= 1
+            if self.depth == 0:
+                self.add_block()
+
+    def handle_data(self, data: str) -> None:
+        if self.block_tag is not None and self.skipped == 0:
+            self.text.append(data)
+
+    def add_block(self) -> None:
+        text = "".join(self.text)
+        if self.block_tag == "pre":
+            text = text.strip()
+        else:
+            text = "\n".join(" ".join(line.split()) for line in text.split("\n")).strip()
+        if text:
+            if self.block_tag[0] == "h" and self.block_tag[1:].isdigit():
+                text = "#" * int(self.block_tag[1:]) + " " + text
+            elif self.block_tag == "li":
+                text = "• " + text
+            self.blocks.append(text)
+        self.block_tag = None
+
+def load_page_blocks(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        parser = PageBlocks()
+        parser.feed(f.read())
+    return parser.blocks
+
+def make_plan(rng: random.Random, tasks: int = 30) -> str:
+    """A planner answer with task titles and a long JSON plan."""
+    agents = ["Web", "Coder", "Casual"]
+    plan = [
+        {"agent": agents[i % 3], "id": str(i + 1), "need": [str(i)] if i else None, "task": sentence(rng, 45)}
+        for i in range(tasks)
+    ]
+    titles = "\n".join(f"## Task {i + 1}: {sentence(rng, 8)}" for i in range(tasks))
+    return f"{titles}\n\n```json\n{json.dumps({'plan': plan}, indent=2)}\n```"
+
+def make_commands(rng: random.Random, commands: int = 200) -> list:
+    safe = ["ls -la", "python3 main.py", "cat notes.txt | grep todo", "mkdir -p build && cd build", "echo hello > out.txt"]
+    unsafe = ["rm -rf /", "sudo reboot", "dd if=/dev/zero of=/dev/sda"]
+    return [rng.choice(unsafe) if i % 10 == 0 else rng.choice(safe) + " " + " ".join(rng.choice(WORDS) for _ in range(5))
+            for i in range(commands)]
+
+def make_browser_agent() -> BrowserAgent:
+    """BrowserAgent with only the state used by the parsing methods, no provider nor browser."""
+    agent = BrowserAgent.__new__(BrowserAgent)
+    agent.logger = Logger("benchmarks.log")
+    agent.state = NavigationState("benchmark")
+    return agent
+
+def make_planner_agent() -> PlannerAgent:
+    """PlannerAgent with only the state used by parse_agent_tasks."""
+    agent = PlannerAgent.__new__(PlannerAgent)
+    agent.logger = Logger("benchmarks.log")
+    agent.tools = {"json": Tools()}
+    agent.tools["json"].tag = "json"
+    agent.agents = {"coder": None, "web": None, "casual": None}
+    return agent
+
+def make_browser(blocks: list) -> Browser:
+    """Browser with a preloaded DOM snapshot, no WebDriver."""
+    browser = Browser.__new__(Browser)
+    browser.logger = Logger("benchmarks.log")
+    browser.driver_lock = threading.RLock()
+    browser.pending_url = None
+    browser.snapshot = {"blocks": blocks}
+    return browser
+
+def make_page_agent(browser: Browser) -> BrowserAgent:
+    """BrowserAgent with only the state used by get_page_text, no provider nor memory."""
+    agent = make_browser_agent()
+    agent.browser = browser
+    agent.ranker = PassageRanker()
+    agent.page_token_budget = PAGE_TOKEN_BUDGET
+    return agent
+
+RNG = random.Random(42)
+LLM_ANSWER = make_llm_answer(RNG)
+SEARCH_RESULTS = make_search_results(RNG)
+NAVIGATION_ANSWER = make_navigation_answer(RNG)
+PLAN = make_plan(RNG)
+COMMANDS = make_commands(RNG)
+PAGE_BLOCKS = load_page_blocks(PAGE_PATH)
+PAGE_LINES = [line.strip() for block in PAGE_BLOCKS for line in block.splitlines() if line.strip()]
+
+def test_load_exec_block(benchmark):
+    python_tool = Tools()
+    python_tool.tag = "python"
+    blocks, _ = benchmark(python_tool.load_exec_block, LLM_ANSWER)
+    assert len(blocks) == 20
+
+def test_remove_blocks(benchmark):
+    assert "```" not in benchmark(Agent.remove_blocks, None, LLM_ANSWER)
+
+def test_jsonify_search_results(benchmark):
+    assert len(benchmark(make_browser_agent().jsonify_search_results, SEARCH_RESULTS)) == 16
+
+def test_parse_answer(benchmark):
+    agent = make_browser_agent()
+
+    def parse_answer():
+        agent.state = NavigationState("benchmark")
+        return agent.parse_answer(NAVIGATION_ANSWER)
+
+    assert benchmark(parse_answer)
+
+def test_extract_links(benchmark):
+    assert benchmark(make_browser_agent().extract_links, NAVIGATION_ANSWER)
+
+def test_is_sentence(benchmark):
+    browser = make_browser(PAGE_BLOCKS)
+    assert any(benchmark(lambda: [browser.is_sentence(line) for line in PAGE_LINES]))
+
+def test_get_text(benchmark):
+    text = benchmark(make_browser(PAGE_BLOCKS).get_text)
+    assert "RTX 4090 laptop GPU" in text
+    assert "Login" not in text
+
+def test_passage_ranker_select(benchmark):
+    page_text = make_browser(PAGE_BLOCKS).get_text()
+    ranker = PassageRanker()
+    selected = benchmark(ranker.select, PAGE_QUERY, page_text, PAGE_TOKEN_BUDGET)
+    assert ranker.estimate_tokens(selected) <= PAGE_TOKEN_BUDGET
+    assert "VRAM" in selected
+
+def test_get_page_text(benchmark):
+    agent = make_page_agent(make_browser(PAGE_BLOCKS))
+    assert "[End of page]" in benchmark(agent.get_page_text, query=PAGE_QUERY)
+
+def test_parse_agent_tasks(benchmark):
+    assert len(benchmark(make_planner_agent().parse_agent_tasks, PLAN)) == 30
+
+def test_is_unsafe(benchmark):
+    assert any(benchmark(lambda: [is_unsafe(command) for command in COMMANDS]))
@@ -0,0 +1,148 @@
+"""
+Tests of the session lifecycle of SessionManager: evicted sessions quit their browser,
+and session creation does not hold the manager lock.
+
+Usage (from the repository root):
+    python -m pytest test/test_session_manager.py
+    python test/test_session_manager.py
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import session_manager
+from browser import Browser
+from interaction import Interaction
+from logger import Logger
+from session_manager import SessionManager
+from session_store import SessionStore
+
+class FakeDriver():
+    """WebDriver recording the calls of Browser.close."""
+    def __init__(self):
+        self.quit_calls = 0
+        self.window_handles = ["main"]
+        self.current_window_handle = "main"
+
+    def quit(self):
+        self.quit_calls += 1
+
+def make_browser(driver: FakeDriver) -> Browser:
+    """Browser around a fake driver, without starting Chrome."""
+    browser = Browser.__new__(Browser)
+    browser.driver = driver
+    browser.logger = Logger("test_session_manager.log")
+    browser.driver_lock = threading.RLock()
+    browser.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+    browser.prefetched = {}
+    browser.prefetch_cache = {}
+    browser.pending_url = None
+    browser.snapshot = None
+    return browser
+
+def make_interaction(browser: Browser, last_active_time: float) -> Interaction:
+    interaction = Interaction.__new__(Interaction)
+    interaction.browser_agent = SimpleNamespace(browser=browser)
+    interaction.is_generating = False
+    interaction.last_active_time = last_active_time
+    return interaction
+
+class MemorySessionStore(SessionStore):
+    """Session states kept in a dict, as another worker would leave them in the shared store."""
+    def __init__(self):
+        super().__init__()
+        self.states = {}
+
+    def save(self, cid: str, state: dict) -> None:
+        self.states[cid] = state
+
+    def load(self, cid: str) -> dict | None:
+        return self.states.get(cid)
+
+    def delete(self, cid: str) -> None:
+        self.states.pop(cid, None)
+
+class RecordingInteraction():
+    """Live session recording the states it is rehydrated from."""
+    def __init__(self, revision: int):
+        self.state_revision = revision
+        self.is_generating = False
+        self.last_active_time = time.time()
+        self.restored = []
+
+    def restore_state(self, state: dict) -> None:
+        self.restored.append(state)
+        self.state_revision = state["revision"]
+
+class TestSessionManager(unittest.TestCase):
+    def test_reap_quits_browser(self):
+        driver = FakeDriver()
+        browser = make_browser(driver)
+        manager = SessionManager(session_timeout=60, max_sessions=8)
+        manager.sessions["idle"] = make_interaction(browser, time.time() - 3600)
+
+        closed = asyncio.run(manager.reap())
+
+        self.assertEqual(closed, 1)
+        self.assertEqual(driver.quit_calls, 1)
+        self.assertNotIn("idle", manager.sessions)
+        self.assertEqual(manager.stats["evicted_idle"], 1)
+        self.assertEqual(manager.stats["close_errors"], 0)
+        self.assertTrue(browser.prefetch_executor._shutdown)
+
+    def test_creation_outside_lock(self):
+        started = {}
+
+        async def slow_initialize_system(cid: str):
+            started[cid] = started.get(cid, 0) + 1
+            await asyncio.sleep(0.2)
+            return make_interaction(make_browser(FakeDriver()), time.time())
+
+        async def run():
+            manager = SessionManager()
+            start = time.perf_counter()
+            sessions = await asyncio.gather(manager.get_session("a"), manager.get_session("a"), manager.get_session("b"))
+            return manager, sessions, time.perf_counter() - start
+
+        original = session_manager.initialize_system
+        session_manager.initialize_system = slow_initialize_system
+        try:
+            manager, sessions, elapsed = asyncio.run(run())
+        finally:
+            session_manager.initialize_system = original
+
+        # both cids are created concurrently, the second request of "a" waits for the first creation
+        self.assertLess(elapsed, 0.35)
+        self.assertEqual(started, {"a": 1, "b": 1})
+        self.assertIs(sessions[0], sessions[1])
+        self.assertEqual(manager.stats["created"], 2)
+        self.assertEqual(manager.creating, {})
+
+    def test_reuse_rehydrates_stale_session(self):
+        store = MemorySessionStore()
+        manager = SessionManager(store=store)
+        interaction = RecordingInteraction(revision=3)
+        manager.sessions["cid"] = interaction
+
+        # up to date with the store, reused as is
+        store.save("cid", {"revision": 3, "last_query": "old"})
+        self.assertIs(asyncio.run(manager.get_session("cid")), interaction)
+        self.assertEqual(interaction.restored, [])
+
+        # another worker saved a later turn
+        store.save("cid", {"revision": 4, "last_query": "new"})
+        asyncio.run(manager.get_session("cid"))
+        self.assertEqual([state["last_query"] for state in interaction.restored], ["new"])
+        self.assertEqual(interaction.state_revision, 4)
+        self.assertEqual(manager.stats["refreshed"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
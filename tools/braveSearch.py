@@ -18,7 +18,7 @@ class braveSearch(Tools):
         self.name = "braveSearch"
         self.description = "A tool for searching the Brave Search API for web search"
         self.api_key = os.getenv("BRAVE_API_KEY") or api_key
-        self.base_url = "https://api.search.brave.com/res/v1/web/search"
+        self.base_url = os.getenv("BRAVE_SEARCH_URL", "https://api.search.brave.com/res/v1/web/search")
         if not self.api_key:
             raise ValueError("Brave Search API key must be provided either as an argument or via the BRAVE_API_KEY environment variable.")
 
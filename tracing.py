@@ -0,0 +1,187 @@
+import configparser
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+from logger import Logger
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# span of the running code, propagated to asyncio tasks, asyncio.to_thread and copy_context().run
+current_span = contextvars.ContextVar("current_span", default=None)
+# trace of the running request, derived from its cid
+current_trace_id = contextvars.ContextVar("current_trace_id", default=None)
+
+def trace_id_from_cid(cid: str) -> str:
+    """128 bit trace id of a conversation: the cid itself when it is an uuid, a hash of it otherwise."""
+    try:
+        return uuid.UUID(str(cid)).hex
+    except ValueError:
+        return hashlib.sha256(str(cid).encode("utf-8")).hexdigest()[:32]
+
+class Span():
+    """
+    A timed operation of a request, exported in the OpenTelemetry span layout.
+    """
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "OK"
+        self.error = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: BaseException | None = None) -> None:
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.status = "ERROR"
+            self.error = f"{type(error).__name__}: {str(error)}"
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns else None,
+            "attributes": {key: value if isinstance(value, (str, int, float, bool)) else str(value) for key, value in self.attributes.items()},
+            "status": {"code": self.status, "message": self.error or ""}
+        }
+
+class Tracer():
+    """
+    Lightweight request tracer.
+    Spans are kept in context variables so nested calls (router, agents, tools, provider, I/O) become child spans
+    of the request, and are appended as OpenTelemetry style JSON lines to a local file when they end.
+    """
+    def __init__(self, path: str = ".logs/traces.jsonl", enabled: bool = True):
+        """
+        Args:
+            path (str): JSON lines file the spans are appended to.
+            enabled (bool): When False spans are not recorded.
+        """
+        self.path = path
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.exported = 0
+        self.logger = Logger("tracing.log")
+        if self.enabled and os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict())
+        try:
+            with self.lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                self.exported += 1
+        except OSError as e:
+            self.logger.error(f"Failed to export span {span.name}: {str(e)}")
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Record a span around a block, as a child of the current span.
+        Args:
+            name (str): Name of the operation.
+            **attributes: Attributes of the span.
+        """
+        if not self.enabled:
+            yield None
+            return
+        parent = current_span.get()
+        trace_id = parent.trace_id if parent is not None else (current_trace_id.get() or uuid.uuid4().hex)
+        span = Span(name, trace_id, parent.span_id if parent is not None else None, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        else:
+            span.end()
+        finally:
+            current_span.reset(token)
+            self.export(span)
+
+    @contextmanager
+    def trace(self, cid: str, name: str = "request", **attributes):
+        """
+        Root span of a request, its trace id is derived from the cid so every request of a conversation can be found.
+        Args:
+            cid (str): The conversation id.
+            name (str): Name of the root span.
+            **attributes: Attributes of the root span.
+        """
+        token = current_trace_id.set(trace_id_from_cid(cid))
+        try:
+            with self.span(name, cid=cid, **attributes) as span:
+                yield span
+        finally:
+            current_trace_id.reset(token)
+
+tracer = Tracer(
+    path=config.get('TRACING', 'path', fallback=".logs/traces.jsonl"),
+    enabled=config.getboolean('TRACING', 'enabled', fallback=True)
+)
+
+def span(name: str, **attributes):
+    """Record a span around a block with the process tracer."""
+    return tracer.span(name, **attributes)
+
+def traced(name: str = None, record: Iterable[str] = ()) -> Callable:
+    """
+    Decorator recording a span around each call of a function or coroutine function.
+    Args:
+        name (str): Name of the span, the qualified name of the function by default.
+        record (Iterable[str]): Names of arguments recorded as span attributes.
+    """
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        signature = inspect.signature(fn)
+        recorded = tuple(record)
+
+        def call_attributes(args, kwargs) -> dict:
+            if not recorded:
+                return {}
+            bound = signature.bind_partial(*args, **kwargs)
+            return {key: bound.arguments[key] for key in recorded if key in bound.arguments}
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name, **call_attributes(args, kwargs)):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name, **call_attributes(args, kwargs)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def run_with_context(fn: Callable, *args, **kwargs) -> Callable:
+    """
+    Bind a callable to a copy of the current context, for executors that do not propagate context variables
+    (loop.run_in_executor, ThreadPoolExecutor.submit), so spans in the worker thread join the request trace.
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn, *args, **kwargs)
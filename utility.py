@@ -134,6 +134,37 @@ async def get_table_names(orgn, kbs, uid="") -> list[str]:
         for kb in kbs
     ])
 
+def get_process_tree_rss_mb(pid: int = None) -> float:
+    """
+    Resident memory of a process and all its descendants (e.g. chromedriver and chrome), in MB.
+    Reads /proc, returns 0 on platforms without it.
+    """
+    import os
+    pid = pid or os.getpid()
+    try:
+        children = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", "r") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+        total_pages, stack = 0, [pid]
+        while stack:
+            current = stack.pop()
+            try:
+                with open(f"/proc/{current}/statm", "r") as f:
+                    total_pages += int(f.read().split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            stack.extend(children.get(current, []))
+        return total_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return 0.0
+
 if __name__ == "__main__":
     import time
     pretty_print("starting imaginary task", "success")
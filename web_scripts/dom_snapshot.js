@@ -0,0 +1,97 @@
+// Snapshot of the page content in a single call: links, text blocks and form inputs.
+// Filtering and formatting is done on the python side (Browser.get_snapshot).
+const BLOCK_SELECTOR = 'h1, h2, h3, h4, h5, h6, p, li, pre, blockquote, td, th, dt, dd, figcaption, caption';
+
+function isElementDisplayed(element) {
+    const style = window.getComputedStyle(element);
+    if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0') {
+        return false;
+    }
+    return element.getClientRects().length > 0;
+}
+
+// function to get the XPath of an element
+function getXPath(element) {
+    if (!element) return '';
+    if (element.id !== '') return '//*[@id="' + element.id + '"]';
+    if (element === document.body) return '/html/body';
+
+    let ix = 0;
+    const siblings = element.parentNode ? element.parentNode.childNodes : [];
+    for (let i = 0; i < siblings.length; i++) {
+        const sibling = siblings[i];
+        if (sibling === element) {
+            return getXPath(element.parentNode) + '/' + element.tagName.toLowerCase() + '[' + (ix + 1) + ']';
+        }
+        if (sibling.nodeType === 1 && sibling.tagName === element.tagName) {
+            ix++;
+        }
+    }
+    return '';
+}
+
+function findInputs(element, result = []) {
+    element.querySelectorAll('input').forEach(input => {
+        result.push({
+            tagName: input.tagName,
+            text: input.name || '',
+            id: input.id || '',
+            type: input.type || '',
+            class: input.className || '',
+            xpath: getXPath(input),
+            displayed: isElementDisplayed(input),
+            checked: !!input.checked
+        });
+    });
+    element.querySelectorAll('*').forEach(el => {
+        if (el.shadowRoot) {
+            findInputs(el.shadowRoot, result);
+        }
+    });
+    return result;
+}
+
+function findLinks() {
+    const links = [];
+    document.querySelectorAll('a[href]').forEach(a => {
+        links.push({
+            url: a.href,
+            text: (a.innerText || '').trim().slice(0, 200),
+            displayed: isElementDisplayed(a)
+        });
+    });
+    return links;
+}
+
+function findTextBlocks() {
+    const blocks = [];
+    if (!document.body) return blocks;
+    document.body.querySelectorAll(BLOCK_SELECTOR).forEach(el => {
+        // nested blocks (eg: <p> inside <li>) are already part of their parent text
+        if (el.parentElement && el.parentElement.closest(BLOCK_SELECTOR)) return;
+        if (el.closest('script, style, noscript')) return;
+        const text = (el.innerText || '').trim();
+        if (!text) return;
+        const tag = el.tagName.toLowerCase();
+        if (/^h[1-6]$/.test(tag)) {
+            blocks.push('#'.repeat(parseInt(tag[1])) + ' ' + text);
+        } else if (tag === 'li') {
+            blocks.push('• ' + text);
+        } else {
+            blocks.push(text);
+        }
+    });
+    // pages built with bare <div> and <span> have no block elements, fallback to the rendered text
+    if (blocks.join('').length < 200) {
+        return (document.body.innerText || '').split('\n');
+    }
+    return blocks;
+}
+
+return {
+    url: window.location.href,
+    title: document.title,
+    links: findLinks(),
+    blocks: findTextBlocks(),
+    inputs: document.body ? findInputs(document.body) : []
+};
@@ -0,0 +1,21 @@
+// Report page readiness and bot-check state in a single call, avoiding a full page_source transfer.
+const keywords = ['checking your browser', 'captcha', 'verify you are human', 'are you a robot'];
+const body = document.body ? document.body.innerText.slice(0, 4000) : '';
+const text = ((document.title || '') + ' ' + body).toLowerCase();
+// only a visible challenge counts: the invisible reCAPTCHA badge loads anchor/bframe iframes on many pages
+const isVisible = frame => {
+    const rect = frame.getBoundingClientRect();
+    const style = window.getComputedStyle(frame);
+    return rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+};
+const isChallenge = src =>
+    (/recaptcha\/(api2|enterprise)\/(bframe|anchor)/.test(src) && !/size=invisible/.test(src)) ||
+    /hcaptcha|challenges\.cloudflare\.com/.test(src);
+const challengeFrame = Array.from(document.querySelectorAll('iframe')).some(frame =>
+    isChallenge(frame.src || '') && isVisible(frame)
+);
+return {
+    readyState: document.readyState,
+    resources: performance.getEntriesByType('resource').length,
+    captcha: challengeFrame || keywords.some(keyword => text.includes(keyword))
+};